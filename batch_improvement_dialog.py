@@ -0,0 +1,302 @@
+"""Диалог пакетного улучшения промтов из библиотеки"""
+import logging
+import threading
+from typing import Dict, List, Optional
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
+    QComboBox, QListWidget, QMessageBox, QProgressBar, QGroupBox,
+    QRadioButton, QSpinBox
+)
+from PyQt5.QtCore import QThread, pyqtSignal
+from models import Model, ModelRegistry
+from prompt_assistant import PromptAssistant
+from prompt_cache import PromptCache
+
+logger = logging.getLogger(__name__)
+
+# Количество одновременных запросов по умолчанию
+DEFAULT_CONCURRENCY = 4
+
+
+class BatchImprovementThread(QThread):
+    """Поток для пакетного улучшения промтов (в БД не пишет — это делает диалог)"""
+    item_finished = pyqtSignal(int, dict)
+    finished = pyqtSignal(dict)
+
+    def __init__(self, assistant: PromptAssistant, prompts: List[Dict], model: Model,
+                 max_concurrency: int = DEFAULT_CONCURRENCY):
+        super().__init__()
+        self.assistant = assistant
+        self.prompts = prompts
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Не отправлять новые запросы (уже отправленные завершатся)"""
+        self._stop.set()
+
+    def run(self):
+        """Выполнить пакетное улучшение"""
+        processed = 0
+        try:
+            processed = self.assistant.improve_batch(
+                self.prompts,
+                self.model,
+                self.max_concurrency,
+                on_result=self.item_finished.emit,
+                should_stop=self._stop.is_set
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при пакетном улучшении промтов: {str(e)}")
+        self.finished.emit({'processed': processed, 'stopped': self._stop.is_set()})
+
+
+class BatchImprovementDialog(QDialog):
+    """
+    Диалог пакетного улучшения промтов
+
+    Улучшенный промт сохраняется новой версией исходного (prompts.parent_id).
+    Ход работы хранится в БД (improvement_jobs), поэтому остановленное или
+    прерванное задание можно продолжить с необработанных промтов.
+    """
+
+    def __init__(self, parent=None, db=None, prompt_ids: Optional[List[int]] = None):
+        super().__init__(parent)
+        self.db = db
+        self.prompt_ids = prompt_ids or []
+        self.models = ModelRegistry.for_database(db).active_models()
+        self.assistant = PromptAssistant(cache=PromptCache.for_database(db))
+        self.batch_thread = None
+        self.job_id = None
+        # Диалог закрывается, когда остановится поток (см. reject)
+        self.closing = False
+        self.pending_tags: Dict[int, Optional[str]] = {}
+
+        self.setWindowTitle("Пакетное улучшение промтов")
+        self.setMinimumSize(700, 500)
+        self.init_ui()
+        self.load_jobs()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+
+        # Какие промты улучшать
+        source_group = QGroupBox("Промты")
+        source_layout = QVBoxLayout()
+
+        self.selected_radio = QRadioButton(f"Выбранные промты ({len(self.prompt_ids)})")
+        self.selected_radio.setEnabled(bool(self.prompt_ids))
+        source_layout.addWidget(self.selected_radio)
+
+        tag_layout = QHBoxLayout()
+        self.tag_radio = QRadioButton("Все промты с тегом:")
+        tag_layout.addWidget(self.tag_radio)
+        self.tag_edit = QLineEdit()
+        self.tag_edit.textEdited.connect(lambda: self.tag_radio.setChecked(True))
+        tag_layout.addWidget(self.tag_edit)
+        source_layout.addLayout(tag_layout)
+
+        resume_layout = QHBoxLayout()
+        self.resume_radio = QRadioButton("Продолжить задание:")
+        resume_layout.addWidget(self.resume_radio)
+        self.jobs_combo = QComboBox()
+        resume_layout.addWidget(self.jobs_combo, 1)
+        source_layout.addLayout(resume_layout)
+
+        if self.prompt_ids:
+            self.selected_radio.setChecked(True)
+        else:
+            self.tag_radio.setChecked(True)
+
+        source_group.setLayout(source_layout)
+        layout.addWidget(source_group)
+
+        # Модель и число одновременных запросов
+        model_layout = QHBoxLayout()
+        model_layout.addWidget(QLabel("Модель для улучшения:"))
+        self.model_combo = QComboBox()
+        for model in self.models:
+            self.model_combo.addItem(model.name, model)
+        model_layout.addWidget(self.model_combo, 1)
+
+        model_layout.addWidget(QLabel("Одновременных запросов:"))
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, 16)
+        self.concurrency_spin.setValue(DEFAULT_CONCURRENCY)
+        model_layout.addWidget(self.concurrency_spin)
+        layout.addLayout(model_layout)
+
+        # Прогресс
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setFormat("%v из %m")
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
+
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+
+        layout.addWidget(QLabel("Ошибки:"))
+        self.errors_list = QListWidget()
+        layout.addWidget(self.errors_list)
+
+        # Кнопки
+        buttons_layout = QHBoxLayout()
+
+        self.start_button = QPushButton("Начать")
+        self.start_button.clicked.connect(self.on_start)
+        buttons_layout.addWidget(self.start_button)
+
+        self.stop_button = QPushButton("Остановить")
+        self.stop_button.clicked.connect(self.on_stop)
+        self.stop_button.setEnabled(False)
+        buttons_layout.addWidget(self.stop_button)
+
+        buttons_layout.addStretch()
+
+        close_button = QPushButton("Закрыть")
+        close_button.clicked.connect(self.reject)
+        buttons_layout.addWidget(close_button)
+
+        layout.addLayout(buttons_layout)
+        self.setLayout(layout)
+
+    def load_jobs(self):
+        """Загрузить незавершенные задания"""
+        self.jobs_combo.clear()
+        for job in self.db.get_unfinished_improvement_jobs():
+            processed = job['done'] + job['failed']
+            self.jobs_combo.addItem(
+                f"#{job['id']} от {job['created_at']}: {processed} из {job['total']} ({job['model_name']})",
+                job['id']
+            )
+        self.resume_radio.setEnabled(self.jobs_combo.count() > 0)
+        self.jobs_combo.setEnabled(self.jobs_combo.count() > 0)
+
+    def on_start(self):
+        """Обработчик кнопки 'Начать'"""
+        if self.resume_radio.isChecked():
+            job_id = self.jobs_combo.currentData()
+            job = self.db.get_improvement_job(job_id) if job_id is not None else None
+            if not job:
+                QMessageBox.warning(self, "Ошибка", "Выберите задание!")
+                return
+            index = self.model_combo.findText(job['model_name'])
+            if index < 0:
+                QMessageBox.warning(self, "Ошибка",
+                                    f"Модель задания \"{job['model_name']}\" недоступна!")
+                return
+            self.model_combo.setCurrentIndex(index)
+        else:
+            model = self.model_combo.currentData()
+            if not model:
+                QMessageBox.warning(self, "Ошибка", "Нет доступных моделей!")
+                return
+
+            if self.selected_radio.isChecked():
+                prompt_ids = self.prompt_ids
+            else:
+                tag = self.tag_edit.text().strip()
+                if not tag:
+                    QMessageBox.warning(self, "Ошибка", "Введите тег!")
+                    return
+                prompt_ids = [prompt['id'] for prompt in self.db.get_prompts_by_tag(tag)]
+
+            if not prompt_ids:
+                QMessageBox.warning(self, "Ошибка", "Нет промтов для улучшения!")
+                return
+            job_id = self.db.create_improvement_job(
+                prompt_ids, model.name, {'max_concurrency': self.concurrency_spin.value()}
+            )
+
+        self.start_job(job_id)
+
+    def start_job(self, job_id: int):
+        """Запустить (или продолжить) обработку необработанных промтов задания"""
+        self.job_id = job_id
+        self.db.set_improvement_job_status(job_id, 'running')
+
+        pending = self.db.get_pending_job_prompts(job_id)
+        job = self.db.get_improvement_job(job_id)
+        # Продолжение задания — с числом запросов, заданным при его создании
+        max_concurrency = job['options'].get('max_concurrency', self.concurrency_spin.value())
+        self.concurrency_spin.setValue(max_concurrency)
+        self.pending_tags = {prompt['id']: prompt.get('tags') for prompt in pending}
+
+        self.progress_bar.setRange(0, job['total'])
+        self.progress_bar.setValue(job['total'] - len(pending))
+        self.errors_list.clear()
+        self.status_label.setText(f"Задание #{job_id}: осталось {len(pending)}")
+        self.start_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
+
+        self.batch_thread = BatchImprovementThread(
+            self.assistant,
+            pending,
+            self.model_combo.currentData(),
+            max_concurrency
+        )
+        self.batch_thread.item_finished.connect(self.on_item_finished)
+        self.batch_thread.finished.connect(self.on_batch_finished)
+        self.batch_thread.start()
+
+    def on_item_finished(self, prompt_id: int, result: dict):
+        """Сохранить улучшенный промт новой версией исходного"""
+        improved = result.get('improved_prompt')
+        if result.get('success') and improved:
+            version_id = self.db.create_prompt(improved, self.pending_tags.get(prompt_id),
+                                               parent_id=prompt_id)
+            self.db.finish_improvement_job_item(self.job_id, prompt_id, result_prompt_id=version_id)
+        else:
+            error = result.get('error') or 'Пустой ответ модели'
+            self.db.finish_improvement_job_item(self.job_id, prompt_id, error=error)
+            self.errors_list.addItem(f"Промт #{prompt_id}: {error}")
+        self.progress_bar.setValue(self.progress_bar.value() + 1)
+
+    def on_batch_finished(self, summary: dict):
+        """Обработчик завершения (или остановки) пакетного улучшения"""
+        job = self.db.get_improvement_job(self.job_id)
+        complete = job['done'] + job['failed'] >= job['total']
+        self.db.set_improvement_job_status(self.job_id, 'done' if complete else 'paused')
+
+        self.start_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        # Сигнал отправлен в конце run(): поток завершается и его можно отпустить
+        self.batch_thread.wait()
+        self.batch_thread = None
+        if self.closing:
+            super().reject()
+            return
+        self.load_jobs()
+
+        if complete:
+            self.status_label.setText(
+                f"Задание #{job['id']} завершено: улучшено {job['done']}, ошибок {job['failed']}"
+            )
+        else:
+            self.status_label.setText(
+                f"Задание #{job['id']} остановлено: обработано {job['done'] + job['failed']} "
+                f"из {job['total']}. Его можно продолжить позже."
+            )
+
+    def on_stop(self):
+        """Остановить задание после завершения уже отправленных запросов"""
+        if self.batch_thread:
+            self.batch_thread.stop()
+            self.stop_button.setEnabled(False)
+            self.status_label.setText("Остановка: ожидание отправленных запросов...")
+
+    def reject(self):
+        """
+        Закрыть диалог, остановив задание (его можно будет продолжить)
+
+        Интерфейс не ждет поток: диалог блокируется и закрывается в
+        on_batch_finished, когда завершатся отправленные запросы и их
+        результаты будут сохранены.
+        """
+        if self.batch_thread:
+            self.closing = True
+            self.on_stop()
+            self.setEnabled(False)
+            return
+        super().reject()
@@ -0,0 +1,5 @@
+"""Нагрузочные тесты и замеры производительности ChatList
+
+Запуск из корня проекта, например:
+    python -m benchmarks.bench_network --quick
+"""
@@ -0,0 +1,234 @@
+"""Бенчмарк масштабирования Database на большой истории
+
+Для каждого размера истории генерируется (или переиспользуется) синтетическая
+БД, после чего замеряются get_prompts, get_results с поиском и сортировкой,
+save_results, а с флагом --gui — загрузка диалогов и экспорт из ResultsDialog
+(в offscreen-режиме Qt).
+
+Запуск:
+    python -m benchmarks.bench_db --quick
+    python -m benchmarks.bench_db --sizes 10000 100000 1000000 --gui
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import (
+    RESULTS_DIR, compare_results, latency_summary, load_results, measure_peak_memory,
+    print_table, report_comparison, write_results
+)
+from benchmarks.synthetic_data import SyntheticHistory, generate, stored_params
+from db import Database
+
+CASE_KEY = ['operation', 'size']
+METRICS = {'time_p50': 'lower', 'peak_memory_kb': 'lower'}
+
+# Каталог для переиспользуемых синтетических БД
+DATA_DIR = os.path.join(RESULTS_DIR, "data")
+
+
+def prepare_database(size: int, args) -> str:
+    """Вернуть путь к синтетической БД нужного размера, сгенерировав ее при необходимости"""
+    history = SyntheticHistory(
+        prompts=max(1, size // args.results_per_prompt),
+        results_per_prompt=args.results_per_prompt,
+        models=args.model_count,
+        median_response_chars=args.median_chars,
+        seed=args.seed
+    )
+    os.makedirs(DATA_DIR, exist_ok=True)
+    db_name = os.path.join(DATA_DIR, f"synthetic-{size}.db")
+
+    if args.regenerate or stored_params(db_name) != history.params():
+        print(f"Генерация синтетической БД на {size} результатов: {db_name}")
+        summary = generate(db_name, history)
+        print(f"  {summary}")
+    return db_name
+
+
+def measure(operation: str, size: int, func: Callable[[], object], repeat: int,
+            cleanup: Optional[Callable[[], None]] = None) -> Dict:
+    """
+    Замерить операцию: время по нескольким повторам и пиковую память
+
+    Память замеряется отдельным прогоном, так как tracemalloc заметно
+    замедляет выполнение и исказил бы время.
+    """
+    times = []
+    returned = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = func()
+        times.append(time.perf_counter() - started)
+        returned = len(value) if isinstance(value, (list, tuple)) else value
+        if cleanup:
+            cleanup()
+
+    with measure_peak_memory() as memory:
+        func()
+    if cleanup:
+        cleanup()
+
+    case = {'operation': operation, 'size': size, 'repeat': repeat, 'returned': returned}
+    case.update(latency_summary(times, "time"))
+    case.update(memory)
+    return case
+
+
+def _synthetic_results(db: Database, count: int) -> List[Dict]:
+    """Результаты в том виде, в каком их сохраняет главное окно"""
+    prompt = db.get_prompt_by_id(1) or {'id': None, 'prompt': 'Промт'}
+    response = "Ответ модели. " * 100
+    return [{
+        'prompt_id': prompt['id'],
+        'model_id': None,
+        'prompt_text': prompt['prompt'],
+        'model_name': f"Synthetic {i}",
+        'response_text': response,
+        'metadata': {'latency': 1.0, 'total_tokens': 300}
+    } for i in range(count)]
+
+
+def db_cases(db: Database, size: int, repeat: int) -> List[Dict]:
+    """Замеры методов Database"""
+    last_id = db.conn.execute("SELECT MAX(id) FROM results").fetchone()[0] or 0
+    middle_prompt = max(1, size // 10)
+
+    def remove_saved():
+        db.conn.execute("DELETE FROM results WHERE id > ?", (last_id,))
+        db.conn.commit()
+
+    batch = _synthetic_results(db, 20)
+    operations = [
+        ('get_prompts', lambda: db.get_prompts()),
+        ('get_prompts_search', lambda: db.get_prompts(search="SQLite")),
+        ('get_prompts_sort_prompt', lambda: db.get_prompts(order_by="prompt", order_dir="ASC")),
+        ('get_results', lambda: db.get_results()),
+        ('get_results_search', lambda: db.get_results(search="кэширование")),
+        ('get_results_sort_model', lambda: db.get_results(order_by="model_name")),
+        ('get_results_prompt', lambda: db.get_results(prompt_id=middle_prompt)),
+        ('get_results_model', lambda: db.get_results(model_id=1)),
+        ('get_active_models', lambda: db.get_active_models()),
+    ]
+
+    cases = []
+    for name, func in operations:
+        cases.append(measure(name, size, func, repeat))
+        _report(cases[-1])
+
+    cases.append(measure('save_results_20', size, lambda: db.save_results(batch),
+                         repeat, cleanup=remove_saved))
+    _report(cases[-1])
+    return cases
+
+
+def gui_cases(db: Database, size: int, repeat: int, export_rows: int) -> List[Dict]:
+    """Замеры загрузки диалогов и экспорта из ResultsDialog"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtCore import QItemSelectionModel
+    from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox
+    from dialogs import PromptsManageDialog, ResultsDialog
+
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    def open_dialog(dialog_class):
+        dialog = dialog_class(db=db)
+        app.processEvents()
+        dialog.deleteLater()
+        return dialog
+
+    cases = []
+    for name, dialog_class in (('dialog_prompts_load', PromptsManageDialog),
+                               ('dialog_results_load', ResultsDialog)):
+        cases.append(measure(name, size, lambda: open_dialog(dialog_class) and None, repeat))
+        _report(cases[-1])
+
+    # Экспорт выбранных строк: модальные окна выбора файла и сообщений подменяются
+    dialog = ResultsDialog(db=db)
+    selection = dialog.table.selectionModel()
+    for row in range(min(export_rows, dialog.table.rowCount())):
+        selection.select(dialog.table.model().index(row, 0),
+                         QItemSelectionModel.Select | QItemSelectionModel.Rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, method, filename in (
+                ('export_markdown', dialog.export_to_markdown, 'export.md'),
+                ('export_json', dialog.export_to_json, 'export.json')):
+            path = os.path.join(tmp, filename)
+            with mock.patch.object(QFileDialog, 'getSaveFileName', return_value=(path, '')), \
+                    mock.patch.object(QMessageBox, 'information'), \
+                    mock.patch.object(QMessageBox, 'critical'):
+                case = measure(f"{name}_{export_rows}", size, method, repeat)
+            case['file_kb'] = round(os.path.getsize(path) / 1024, 1) if os.path.exists(path) else None
+            cases.append(case)
+            _report(case)
+    dialog.deleteLater()
+    return cases
+
+
+def _report(case: Dict):
+    print(f"  {case['operation']}: p50={case['time_p50']} s, max={case['time_max']} s, "
+          f"память={case['peak_memory_kb']} КБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк базы данных ChatList")
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000, 1000000],
+                        help='Размеры истории (количество результатов)')
+    parser.add_argument('--results-per-prompt', type=int, default=5)
+    parser.add_argument('--model-count', type=int, default=20)
+    parser.add_argument('--median-chars', type=int, default=1500)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--regenerate', action='store_true',
+                        help='Сгенерировать БД заново, даже если подходящая уже есть')
+    parser.add_argument('--gui', action='store_true',
+                        help='Замерить загрузку диалогов и экспорт (offscreen Qt)')
+    parser.add_argument('--gui-max-size', type=int, default=100000,
+                        help='Не замерять диалоги на историях больше этого размера')
+    parser.add_argument('--export-rows', type=int, default=20,
+                        help='Сколько строк выбирать в ResultsDialog для экспорта')
+    parser.add_argument('--quick', action='store_true', help='Короткий прогон на 10000 результатов')
+    parser.add_argument('--output', help='Файл для сохранения результатов (JSON)')
+    parser.add_argument('--baseline', help='JSON с базовыми результатами для сравнения')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Относительное ухудшение, считающееся регрессией')
+    args = parser.parse_args()
+
+    if args.quick:
+        args.sizes, args.repeat = [10000], 2
+
+    cases = []
+    for size in args.sizes:
+        db_name = prepare_database(size, args)
+        print(f"История {size} результатов ({os.path.getsize(db_name) / 1024 / 1024:.1f} МБ):")
+        db = Database(db_name)
+        try:
+            cases.extend(db_cases(db, size, args.repeat))
+            if args.gui and size <= args.gui_max_size:
+                cases.extend(gui_cases(db, size, args.repeat, args.export_rows))
+        finally:
+            db.close()
+
+    print()
+    print_table(cases, CASE_KEY + ['returned', 'time_p50', 'time_max', 'peak_memory_kb'])
+
+    path = write_results('db', cases, args.output, vars(args))
+    print(f"\nРезультаты сохранены: {path}")
+
+    if args.baseline:
+        print("\nСравнение с базовыми результатами:")
+        comparisons = compare_results(cases, load_results(args.baseline)['cases'],
+                                      CASE_KEY, METRICS, args.threshold)
+        if report_comparison(comparisons):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""Бенчмарк отзывчивости интерфейса: зависания цикла событий в основных сценариях
+
+Главное окно запускается в offscreen-режиме Qt на синтетической БД
+(см. bench_db.py), модели направляются на локальный тестовый сервер, после
+чего сценарий по шагам выполняет основные действия пользователя. Для каждого
+шага StallMonitor фиксирует зависания цикла событий и слоты, которые их вызвали.
+
+Запуск:
+    python -m benchmarks.bench_gui --quick
+    python -m benchmarks.bench_gui --sizes 10000 100000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+from unittest import mock
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QItemSelectionModel, QTimer
+from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox
+
+from benchmarks.bench_db import prepare_database
+from benchmarks.common import (
+    compare_results, load_results, print_table, report_comparison, write_results
+)
+from db import Database
+from dialogs import ResultsDialog
+from main import MainWindow
+from mock_server import MockServer, point_models_to_server
+from stall_monitor import StallMonitor
+
+CASE_KEY = ['step', 'size']
+METRICS = {'wall_ms': 'lower', 'stall_total_ms': 'lower', 'stall_max_ms': 'lower'}
+
+_BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class Step:
+    """Шаг сценария: действие и условие его завершения"""
+
+    def __init__(self, name: str, action: Callable[[], None],
+                 done: Optional[Callable[[], bool]] = None, timeout: float = 120):
+        self.name = name
+        self.action = action
+        self.done = done or (lambda: True)
+        self.timeout = timeout
+
+
+class ScenarioRunner:
+    """Выполняет шаги внутри цикла событий и собирает зависания по каждому шагу"""
+
+    def __init__(self, app: QApplication, monitor: StallMonitor, steps: List[Step], size: int):
+        self.app = app
+        self.monitor = monitor
+        self.steps = steps
+        self.size = size
+        self.cases: List[Dict] = []
+        self._index = -1
+        self._started = 0.0
+
+    def run(self) -> List[Dict]:
+        QTimer.singleShot(0, self._next)
+        self.app.exec_()
+        return self.cases
+
+    def _next(self):
+        self._index += 1
+        if self._index >= len(self.steps):
+            self.app.quit()
+            return
+        step = self.steps[self._index]
+        self.monitor.reset()
+        self._started = time.perf_counter()
+        step.action()
+        self._wait()
+
+    def _wait(self):
+        step = self.steps[self._index]
+        elapsed = time.perf_counter() - self._started
+        if not step.done() and elapsed < step.timeout:
+            QTimer.singleShot(5, self._wait)
+            return
+        # Даем пульсу монитора зафиксировать последнее зависание шага
+        QTimer.singleShot(2 * int(self.monitor.interval * 1000) + 5,
+                          lambda: self._finish(step, elapsed))
+
+    def _finish(self, step: Step, elapsed: float):
+        stalls = self.monitor.stalls
+        slots = self.monitor.summary()
+        case = {
+            'step': step.name,
+            'size': self.size,
+            'wall_ms': round(elapsed * 1000, 1),
+            'stalls': len(stalls),
+            'stall_total_ms': round(sum(s['duration_ms'] for s in stalls), 1),
+            'stall_max_ms': max((s['duration_ms'] for s in stalls), default=0),
+            'top_slot': slots[0]['slot'] if slots else None,
+            'top_hotspot': slots[0]['hotspot'] if slots else None,
+            'slots': slots,
+            'timed_out': not step.done()
+        }
+        self.cases.append(case)
+        print(f"  {step.name}: {case['wall_ms']} мс, зависаний {case['stalls']}, "
+              f"максимум {case['stall_max_ms']} мс, {case['top_slot'] or '-'}")
+        QTimer.singleShot(0, self._next)
+
+
+def _close_modal(accept: bool = False):
+    """Закрыть модальный диалог, как только он появится"""
+    def close():
+        widget = QApplication.activeModalWidget()
+        if widget is None:
+            QTimer.singleShot(10, close)
+        elif accept:
+            widget.accept()
+        else:
+            widget.reject()
+    QTimer.singleShot(0, close)
+
+
+def build_steps(state: Dict, db: Database, export_dir: str, export_rows: int) -> List[Step]:
+    """Основные сценарии пользователя"""
+    def window():
+        return state['window']
+
+    def startup():
+        state['window'] = MainWindow(db)
+        state['window'].show()
+
+    def select_prompt():
+        combo = window().prompt_combo
+        combo.setCurrentIndex(combo.count() // 2)
+
+    def send():
+        window().send_button.click()
+
+    def send_done():
+        return window().send_button.isEnabled() and bool(window().temp_results)
+
+    def save_selected():
+        window().results_model.set_all_checked(True)
+        window().save_button.click()
+
+    def modal(handler: Callable[[], None], accept: bool = False) -> Callable[[], None]:
+        def run():
+            _close_modal(accept)
+            handler()
+        return run
+
+    def open_results_dialog():
+        dialog = ResultsDialog(window(), db)
+        dialog.show()
+        state['results_dialog'] = dialog
+
+    def type_search():
+        # Каждое нажатие — отдельное событие, как при вводе с клавиатуры
+        dialog = state['results_dialog']
+        text = "кэш"
+        state['typed'] = False
+
+        def type_char(i):
+            dialog.search_edit.setText(text[:i])
+            if i < len(text):
+                QTimer.singleShot(0, lambda: type_char(i + 1))
+            else:
+                state['typed'] = True
+        type_char(1)
+
+    def export(method_name: str, filename: str) -> Callable[[], None]:
+        def run():
+            dialog = state['results_dialog']
+            selection = dialog.table.selectionModel()
+            for row in range(min(export_rows, dialog.table.rowCount())):
+                selection.select(dialog.table.model().index(row, 0),
+                                 QItemSelectionModel.Select | QItemSelectionModel.Rows)
+            path = os.path.join(export_dir, filename)
+            with mock.patch.object(QFileDialog, 'getSaveFileName', return_value=(path, '')):
+                getattr(dialog, method_name)()
+        return run
+
+    def close_results_dialog():
+        state['results_dialog'].close()
+        state['results_dialog'].deleteLater()
+
+    return [
+        Step('startup', startup),
+        Step('select_prompt', select_prompt),
+        Step('send', send, send_done),
+        Step('save_selected', save_selected),
+        Step('view_results', modal(lambda: window().on_view_results())),
+        Step('open_results_dialog', open_results_dialog),
+        Step('search_results_typing', type_search, lambda: state.get('typed', False)),
+        Step('clear_search', lambda: state['results_dialog'].search_edit.clear()),
+        Step(f'export_markdown_{export_rows}', export('export_to_markdown', 'export.md')),
+        Step(f'export_json_{export_rows}', export('export_to_json', 'export.json')),
+        Step('close_results_dialog', close_results_dialog),
+        Step('manage_prompts', modal(lambda: window().on_manage_prompts())),
+        Step('usage_stats', modal(lambda: window().on_view_usage_stats())),
+        Step('timings_history', modal(lambda: window().on_view_timings_history())),
+        Step('settings', modal(lambda: window().on_settings(), accept=True)),
+    ]
+
+
+def run_size(app: QApplication, size: int, args) -> List[Dict]:
+    """Прогнать сценарий на синтетической БД заданного размера"""
+    db_name = prepare_database(size, args)
+    db = Database(db_name)
+    last_result_id = db.conn.execute("SELECT MAX(id) FROM results").fetchone()[0] or 0
+    last_prompt_id = db.conn.execute("SELECT MAX(id) FROM prompts").fetchone()[0] or 0
+    state: Dict = {}
+
+    try:
+        with MockServer(latency=args.latency, response_tokens=args.response_tokens,
+                        seed=args.seed) as server, \
+                tempfile.TemporaryDirectory() as export_dir, \
+                mock.patch.object(QMessageBox, 'information'), \
+                mock.patch.object(QMessageBox, 'warning'), \
+                mock.patch.object(QMessageBox, 'critical'):
+            point_models_to_server(db, server.url)
+            monitor = StallMonitor(threshold_ms=args.threshold_ms,
+                                   ignore_paths=[_BENCHMARKS_DIR])
+            monitor.start()
+            steps = build_steps(state, db, export_dir, args.export_rows)
+            cases = ScenarioRunner(app, monitor, steps, size).run()
+            monitor.stop()
+    finally:
+        # Возвращаем синтетическую БД к исходному состоянию для следующих запусков
+        if 'window' in state:
+            state['window'].result_writer.flush()  # Результаты пишутся в фоне
+        db.conn.execute("DELETE FROM results WHERE id > ?", (last_result_id,))
+        db.conn.execute("DELETE FROM prompts WHERE id > ?", (last_prompt_id,))
+        db.conn.commit()
+        if 'window' in state:
+            state['window'].close()  # closeEvent закрывает и соединение с БД
+            state['window'].deleteLater()
+        db.close()
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк отзывчивости интерфейса ChatList")
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000],
+                        help='Размеры истории (количество результатов)')
+    parser.add_argument('--results-per-prompt', type=int, default=5)
+    parser.add_argument('--model-count', type=int, default=20)
+    parser.add_argument('--median-chars', type=int, default=1500)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--regenerate', action='store_true',
+                        help='Сгенерировать БД заново, даже если подходящая уже есть')
+    parser.add_argument('--threshold-ms', type=float, default=50,
+                        help='Минимальная задержка цикла событий, считающаяся зависанием')
+    parser.add_argument('--latency', default='fixed:0.1',
+                        help='Задержка тестового сервера (см. mock_server.parse_latency)')
+    parser.add_argument('--response-tokens', type=int, default=300)
+    parser.add_argument('--export-rows', type=int, default=20)
+    parser.add_argument('--quick', action='store_true', help='Короткий прогон на 10000 результатов')
+    parser.add_argument('--output', help='Файл для сохранения результатов (JSON)')
+    parser.add_argument('--baseline', help='JSON с базовыми результатами для сравнения')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Относительное ухудшение, считающееся регрессией')
+    args = parser.parse_args()
+
+    if args.quick:
+        args.sizes = [10000]
+
+    logging.getLogger().setLevel(logging.WARNING)
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    cases = []
+    for size in args.sizes:
+        print(f"История {size} результатов:")
+        cases.extend(run_size(app, size, args))
+
+    print()
+    print_table(cases, CASE_KEY + ['wall_ms', 'stalls', 'stall_total_ms', 'stall_max_ms',
+                                   'top_slot', 'top_hotspot'])
+
+    path = write_results('gui', cases, args.output, vars(args))
+    print(f"\nРезультаты сохранены: {path}")
+
+    if args.baseline:
+        print("\nСравнение с базовыми результатами:")
+        comparisons = compare_results(cases, load_results(args.baseline)['cases'],
+                                      CASE_KEY, METRICS, args.threshold)
+        if report_comparison(comparisons):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
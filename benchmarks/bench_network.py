@@ -0,0 +1,153 @@
+"""Бенчмарк параллельной отправки промтов через NetworkManager
+
+Запросы уходят на локальный тестовый сервер (mock_server.py), поэтому
+замеры воспроизводимы и не зависят от внешних API. Для каждого сочетания
+движка, числа моделей, числа потоков и профиля задержки измеряются
+запросы в секунду, перцентили задержки и пиковая память.
+
+Запуск:
+    python -m benchmarks.bench_network --quick
+    python -m benchmarks.bench_network --baseline benchmarks/results/network-old.json
+"""
+import argparse
+import itertools
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import (
+    compare_results, latency_summary, load_results, measure_peak_memory,
+    print_table, report_comparison, write_results
+)
+from mock_server import MockServer, MOCK_API_KEY_ENV_VAR
+from models import OpenAIModel
+from network import NetworkManager
+
+# Профили задержки тестового сервера
+LATENCY_PROFILES = {
+    'fast': 'fixed:0.02',
+    'typical': 'lognormal:0.2,0.4',
+    'long_tail': 'lognormal:0.2,1.0'
+}
+
+
+def _threadpool_engine(prompt: str, models: List, workers: int) -> List[Dict]:
+    return NetworkManager(max_workers=workers).send_to_all_models(prompt, models)
+
+
+# Движки отправки: новые реализации регистрируются здесь и сравниваются
+# с текущей на одинаковых сценариях
+ENGINES: Dict[str, Callable[[str, List, int], List[Dict]]] = {
+    'threadpool': _threadpool_engine
+}
+
+CASE_KEY = ['engine', 'models', 'workers', 'profile']
+METRICS = {'requests_per_sec': 'higher', 'latency_p95': 'lower', 'batch_p95': 'lower'}
+
+
+def run_case(engine: str, server: MockServer, model_count: int, workers: int,
+             iterations: int) -> Dict:
+    """Выполнить один сценарий и вернуть его метрики"""
+    send = ENGINES[engine]
+    models = [
+        OpenAIModel(f"Mock {i}", server.url, f"mock/model-{i}", MOCK_API_KEY_ENV_VAR)
+        for i in range(model_count)
+    ]
+
+    # Прогрев: открываем соединения, чтобы первый замер не включал их установку
+    send("warmup", models, workers)
+
+    request_latencies = []
+    batch_times = []
+    errors = 0
+
+    with measure_peak_memory() as memory:
+        started = time.perf_counter()
+        for iteration in range(iterations):
+            batch_started = time.perf_counter()
+            results = send(f"Промт для замера #{iteration}", models, workers)
+            batch_times.append(time.perf_counter() - batch_started)
+            for result in results:
+                metadata = result.get('metadata') or {}
+                if metadata.get('latency') is not None:
+                    request_latencies.append(metadata['latency'])
+                if not result.get('success'):
+                    errors += 1
+        wall_time = time.perf_counter() - started
+
+    requests_total = model_count * iterations
+    case = {
+        'engine': engine,
+        'models': model_count,
+        'workers': workers,
+        'iterations': iterations,
+        'requests': requests_total,
+        'errors': errors,
+        'wall_time': round(wall_time, 4),
+        'requests_per_sec': round(requests_total / wall_time, 2) if wall_time > 0 else None
+    }
+    case.update(latency_summary(request_latencies, "latency"))
+    case.update(latency_summary(batch_times, "batch"))
+    case.update(memory)
+    return case
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк NetworkManager")
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument('--models', nargs='+', type=int, default=[1, 5, 20])
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 5, 10])
+    parser.add_argument('--profiles', nargs='+', default=list(LATENCY_PROFILES),
+                        choices=list(LATENCY_PROFILES))
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='Доля ответов 500 от тестового сервера')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--quick', action='store_true',
+                        help='Короткий прогон: 5 моделей, 1 и 5 потоков, профиль fast')
+    parser.add_argument('--output', help='Файл для сохранения результатов (JSON)')
+    parser.add_argument('--baseline', help='JSON с базовыми результатами для сравнения')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Относительное ухудшение, считающееся регрессией')
+    args = parser.parse_args()
+
+    if args.quick:
+        args.models, args.workers, args.profiles, args.iterations = [5], [1, 5], ['fast'], 3
+
+    logging.getLogger().setLevel(logging.WARNING)
+    os.environ.setdefault(MOCK_API_KEY_ENV_VAR, "mock-key")
+
+    cases = []
+    for profile in args.profiles:
+        error_rates = {500: args.error_rate} if args.error_rate else None
+        with MockServer(latency=LATENCY_PROFILES[profile], error_rates=error_rates,
+                        seed=args.seed) as server:
+            for engine, model_count, workers in itertools.product(
+                    args.engines, args.models, args.workers):
+                case = run_case(engine, server, model_count, workers, args.iterations)
+                case['profile'] = profile
+                cases.append(case)
+                print(f"{engine} models={model_count} workers={workers} profile={profile}: "
+                      f"{case['requests_per_sec']} req/s, p95={case['latency_p95']} s")
+
+    print()
+    print_table(cases, CASE_KEY + ['requests_per_sec', 'latency_p50', 'latency_p95',
+                                   'latency_p99', 'batch_p95', 'errors', 'peak_memory_kb'])
+
+    path = write_results('network', cases, args.output, vars(args))
+    print(f"\nРезультаты сохранены: {path}")
+
+    if args.baseline:
+        print("\nСравнение с базовыми результатами:")
+        comparisons = compare_results(cases, load_results(args.baseline)['cases'],
+                                      CASE_KEY, METRICS, args.threshold)
+        if report_comparison(comparisons):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
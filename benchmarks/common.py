@@ -0,0 +1,196 @@
+"""Общие функции бенчмарков: перцентили, память, сохранение и сравнение результатов"""
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Каталог для JSON-файлов с результатами
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def percentile(values: Sequence[float], percent: float) -> Optional[float]:
+    """Перцентиль с линейной интерполяцией (None для пустого списка)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def latency_summary(values: Sequence[float], prefix: str = "latency") -> Dict:
+    """Сводка p50/p95/p99/max по списку времен в секундах"""
+    return {
+        f"{prefix}_p50": _round(percentile(values, 50)),
+        f"{prefix}_p95": _round(percentile(values, 95)),
+        f"{prefix}_p99": _round(percentile(values, 99)),
+        f"{prefix}_max": _round(max(values) if values else None)
+    }
+
+
+def _round(value: Optional[float], digits: int = 4) -> Optional[float]:
+    return round(value, digits) if value is not None else None
+
+
+@contextmanager
+def measure_peak_memory():
+    """
+    Замерить пиковое потребление памяти Python-объектами внутри блока
+
+    Возвращает словарь, в который после выхода из блока записывается
+    ключ 'peak_memory_kb'.
+    """
+    stats = {}
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        yield stats
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        stats['peak_memory_kb'] = round(peak / 1024, 1)
+        if not was_tracing:
+            tracemalloc.stop()
+
+
+def timed(func: Callable, *args, **kwargs) -> Tuple[float, object]:
+    """Выполнить функцию и вернуть (время в секундах, результат)"""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def environment_info() -> Dict:
+    """Сведения об окружении для сравнения результатов между машинами"""
+    import sqlite3
+    return {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'sqlite': sqlite3.sqlite_version
+    }
+
+
+def write_results(name: str, cases: List[Dict], output: Optional[str] = None,
+                  params: Optional[Dict] = None) -> str:
+    """
+    Сохранить результаты бенчмарка в JSON
+
+    Args:
+        name: Название бенчмарка (network, db, gui)
+        cases: Список результатов отдельных замеров
+        output: Путь к файлу (по умолчанию benchmarks/results/<name>-<время>.json)
+        params: Параметры запуска
+
+    Returns:
+        Путь к сохраненному файлу
+    """
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{name}-{stamp}.json")
+
+    data = {
+        'benchmark': name,
+        'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'environment': environment_info(),
+        'params': params or {},
+        'cases': cases
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return output
+
+
+def load_results(path: str) -> Dict:
+    """Загрузить сохраненные результаты"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_results(current: List[Dict], baseline: List[Dict], key_fields: Iterable[str],
+                    metrics: Dict[str, str], threshold: float = 0.1) -> List[Dict]:
+    """
+    Сравнить результаты с базовыми
+
+    Args:
+        current: Текущие замеры
+        baseline: Базовые замеры
+        key_fields: Поля, по которым сопоставляются замеры
+        metrics: Метрики и их направление: 'higher' (больше — лучше) или 'lower'
+        threshold: Относительное ухудшение, считающееся регрессией (0.1 = 10%)
+
+    Returns:
+        Список сравнений; у регрессий поле 'regression' равно True
+    """
+    key_fields = list(key_fields)
+    baseline_by_key = {tuple(case.get(k) for k in key_fields): case for case in baseline}
+    comparisons = []
+
+    for case in current:
+        key = tuple(case.get(k) for k in key_fields)
+        base = baseline_by_key.get(key)
+        if not base:
+            continue
+        for metric, direction in metrics.items():
+            new_value, old_value = case.get(metric), base.get(metric)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            worse = -change if direction == 'higher' else change
+            comparisons.append({
+                'case': dict(zip(key_fields, key)),
+                'metric': metric,
+                'baseline': old_value,
+                'current': new_value,
+                'change': round(change, 4),
+                'regression': worse > threshold
+            })
+    return comparisons
+
+
+def print_table(rows: List[Dict], columns: List[str]):
+    """Вывести результаты в виде текстовой таблицы"""
+    if not rows:
+        print("Нет данных")
+        return
+
+    def fmt(value):
+        if isinstance(value, float):
+            return f"{value:.4g}"
+        return "" if value is None else str(value)
+
+    widths = {c: max(len(c), *(len(fmt(row.get(c))) for row in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    print("  ".join("-" * widths[c] for c in columns))
+    for row in rows:
+        print("  ".join(fmt(row.get(c)).ljust(widths[c]) for c in columns))
+
+
+def report_comparison(comparisons: List[Dict]) -> bool:
+    """Вывести сравнение с базовыми результатами; True, если есть регрессии"""
+    if not comparisons:
+        print("Нет совпадающих замеров для сравнения")
+        return False
+
+    rows = []
+    for item in comparisons:
+        rows.append(dict(
+            item['case'],
+            metric=item['metric'],
+            baseline=item['baseline'],
+            current=item['current'],
+            change=f"{item['change'] * 100:+.1f}%",
+            status="РЕГРЕССИЯ" if item['regression'] else "ok"
+        ))
+    print_table(rows, list(comparisons[0]['case'].keys()) +
+                ['metric', 'baseline', 'current', 'change', 'status'])
+    return any(item['regression'] for item in comparisons)
@@ -0,0 +1,315 @@
+"""Генератор синтетической истории промтов и результатов
+
+Заполняет БД реалистичными данными: промты с тегами, по несколько
+результатов от разных моделей на каждый промт, длинные ответы в Markdown
+(длина распределена логнормально, с длинным хвостом) и метаданные в том
+же формате, что сохраняет приложение. Даты равномерно распределены по
+заданному периоду в порядке возрастания.
+
+Запуск:
+    python -m benchmarks.synthetic_data --db big.db --results 1000000
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Database, content_hash
+
+# Ключ настройки, в котором сохраняются параметры генерации
+PARAMS_SETTING_KEY = "synthetic_params"
+
+_TOPICS = [
+    "Python", "SQLite", "PyQt5", "асинхронность", "нейросети", "кэширование",
+    "регулярные выражения", "REST API", "тестирование", "рефакторинг",
+    "Docker", "алгоритмы сортировки", "многопоточность", "Markdown", "JSON"
+]
+_TASKS = [
+    "Объясни, как работает {topic}, с примерами кода",
+    "Сравни подходы к теме «{topic}» и перечисли плюсы и минусы",
+    "Напиши краткую инструкцию по теме «{topic}» для начинающих",
+    "Какие типичные ошибки допускают при работе с {topic}?",
+    "Составь план изучения темы «{topic}» на месяц",
+    "Оптимизируй этот фрагмент, используя {topic}: {snippet}"
+]
+_TAGS = ["код", "обучение", "работа", "статья", "идеи", "перевод", "анализ", "тест"]
+_WORDS = (
+    "модель данные запрос ответ функция значение список поток сеть время кэш "
+    "строка таблица индекс поиск результат пример метод класс объект ошибка "
+    "проверка память скорость задержка соединение файл формат параметр"
+).split()
+_PROVIDERS = ["openrouter", "openai", "deepseek", "groq"]
+
+
+def _paragraph(rng: random.Random) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(30, 90))]
+    words[0] = words[0].capitalize()
+    return " ".join(words) + "."
+
+
+def _build_blocks(rng: random.Random, count: int = 300) -> List[str]:
+    """Заготовки фрагментов Markdown, из которых собираются ответы"""
+    blocks = []
+    for i in range(count):
+        kind = i % 6
+        if kind == 0:
+            blocks.append(f"## {rng.choice(_TOPICS)}: {rng.choice(_WORDS)}")
+        elif kind == 1:
+            items = "\n".join(f"- {_paragraph(rng)[:80]}" for _ in range(rng.randint(3, 6)))
+            blocks.append(items)
+        elif kind == 2:
+            lines = "\n".join(
+                f"    {rng.choice(_WORDS)}_{j} = {rng.choice(_WORDS)}({rng.randint(0, 99)})"
+                for j in range(rng.randint(3, 10))
+            )
+            blocks.append(f"```python\ndef {rng.choice(_WORDS)}():\n{lines}\n```")
+        elif kind == 3:
+            rows = "\n".join(
+                f"| {rng.choice(_WORDS)} | {rng.randint(1, 1000)} | {rng.choice(_WORDS)} |"
+                for _ in range(rng.randint(2, 6))
+            )
+            blocks.append(f"| Поле | Значение | Комментарий |\n|---|---|---|\n{rows}")
+        else:
+            blocks.append(_paragraph(rng))
+    return blocks
+
+
+class SyntheticHistory:
+    """Генератор строк для таблиц prompts, models и results"""
+
+    def __init__(self, prompts: int, results_per_prompt: int = 5, models: int = 20,
+                 median_response_chars: int = 1500, days: int = 365, seed: int = 42):
+        """
+        Args:
+            prompts: Количество промтов
+            results_per_prompt: Среднее число результатов на промт
+            models: Количество моделей
+            median_response_chars: Медианная длина ответа в символах
+            days: Период истории в днях (до текущего момента)
+            seed: Зерно генератора для воспроизводимости
+        """
+        self.prompts = prompts
+        self.results_per_prompt = results_per_prompt
+        self.models = models
+        self.median_response_chars = median_response_chars
+        self.days = days
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._blocks = _build_blocks(self._rng)
+        self._start = datetime.now() - timedelta(days=days)
+
+    def params(self) -> Dict:
+        """Параметры генерации (для проверки, что БД можно переиспользовать)"""
+        return {
+            'prompts': self.prompts,
+            'results_per_prompt': self.results_per_prompt,
+            'models': self.models,
+            'median_response_chars': self.median_response_chars,
+            'days': self.days,
+            'seed': self.seed
+        }
+
+    def model_rows(self) -> List[Tuple]:
+        """Строки таблицы models"""
+        created_at = self._start.strftime("%Y-%m-%d %H:%M:%S")
+        rows = []
+        for i in range(self.models):
+            provider = _PROVIDERS[i % len(_PROVIDERS)]
+            rows.append((
+                f"Synthetic {provider} {i}", "http://127.0.0.1/v1/chat/completions",
+                f"{provider}/model-{i}", "SYNTHETIC_API_KEY", provider,
+                1 if i % 4 else 0, created_at
+            ))
+        return rows
+
+    def _date(self, index: int) -> str:
+        offset = self.days * 86400 * index / max(1, self.prompts)
+        return (self._start + timedelta(seconds=offset)).strftime("%Y-%m-%d %H:%M:%S")
+
+    def _prompt_text(self) -> str:
+        rng = self._rng
+        task = rng.choice(_TASKS)
+        snippet = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(5, 60)))
+        return task.format(topic=rng.choice(_TOPICS), snippet=snippet)
+
+    def _response_text(self) -> str:
+        rng = self._rng
+        target = int(rng.lognormvariate(math.log(self.median_response_chars), 0.8))
+        parts = [f"Ответ на вопрос ({rng.randint(0, 10 ** 9)}):"]
+        length = len(parts[0])
+        while length < target:
+            block = rng.choice(self._blocks)
+            parts.append(block)
+            length += len(block) + 2
+        return "\n\n".join(parts)
+
+    def _metadata(self, provider: str, api_id: str, response: str) -> str:
+        rng = self._rng
+        latency = round(rng.lognormvariate(math.log(2.0), 0.6), 3)
+        prompt_tokens = rng.randint(10, 400)
+        completion_tokens = max(1, len(response) // 4)
+        return json.dumps({
+            'provider': provider,
+            'api_id': api_id,
+            'status_code': 200,
+            'latency': latency,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'tokens_per_second': round(completion_tokens / latency, 2),
+            'cost': round(completion_tokens * 2e-6, 6)
+        })
+
+    def iter_batches(self, models: List[Tuple[int, str, str, str]],
+                     batch_size: int = 1000) -> Iterator[Tuple[List[Tuple], List[Tuple]]]:
+        """
+        Выдавать пакеты строк (prompts, results)
+
+        Args:
+            models: Список (id, name, provider, api_id) моделей из БД
+            batch_size: Количество промтов в пакете
+
+        Yields:
+            Кортеж (строки prompts с явными id, строки results)
+        """
+        rng = self._rng
+        for start in range(0, self.prompts, batch_size):
+            prompt_rows = []
+            result_rows = []
+            for index in range(start, min(start + batch_size, self.prompts)):
+                prompt_id = index + 1
+                date = self._date(index)
+                text = self._prompt_text()
+                tags = ", ".join(rng.sample(_TAGS, rng.randint(0, 3))) or None
+                prompt_rows.append((prompt_id, date, text, tags))
+
+                count = max(1, round(rng.gauss(self.results_per_prompt, 1)))
+                for model_id, name, provider, api_id in rng.sample(models, min(count, len(models))):
+                    response = self._response_text()
+                    result_rows.append((
+                        prompt_id, model_id, text, name, response, date,
+                        self._metadata(provider, api_id, response)
+                    ))
+            yield prompt_rows, result_rows
+
+
+def generate(db_name: str, history: SyntheticHistory, batch_size: int = 1000,
+             progress: bool = True) -> Dict:
+    """
+    Заполнить БД синтетической историей
+
+    Существующие промты, результаты и модели в БД удаляются.
+
+    Returns:
+        Словарь с количеством созданных строк и временем генерации
+    """
+    started = time.perf_counter()
+    db = Database(db_name)
+    try:
+        conn = db.conn
+        # Данные генерируются заново, поэтому надежность записи не важна
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("DELETE FROM results")
+        conn.execute("DELETE FROM prompts")
+        conn.execute("DELETE FROM models")
+        conn.executemany("""
+            INSERT INTO models (name, api_url, api_id, api_key_env_var, model_type,
+                                is_active, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, history.model_rows())
+        models = [
+            (row['id'], row['name'], row['model_type'], row['api_id'])
+            for row in conn.execute("SELECT id, name, model_type, api_id FROM models")
+        ]
+        conn.commit()
+
+        prompts_total = results_total = 0
+        for prompt_rows, result_rows in history.iter_batches(models, batch_size):
+            conn.executemany(
+                "INSERT INTO prompts (id, date, prompt, tags) VALUES (?, ?, ?, ?)",
+                prompt_rows
+            )
+            # Тексты ответов хранятся в response_blobs, результаты ссылаются на них по хэшу
+            blob_rows = []
+            rows = []
+            for prompt_id, model_id, text, name, response, date, metadata in result_rows:
+                response_hash = content_hash(response)
+                blob_rows.append((response_hash, response))
+                rows.append((prompt_id, model_id, text, name, response_hash, date, metadata))
+            conn.executemany(
+                "INSERT OR IGNORE INTO response_blobs (hash, body) VALUES (?, ?)", blob_rows
+            )
+            conn.executemany("""
+                INSERT INTO results (prompt_id, model_id, prompt_text, model_name,
+                                     response_hash, created_at, metadata)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+            prompts_total += len(prompt_rows)
+            results_total += len(result_rows)
+            if progress:
+                print(f"\r  промтов: {prompts_total}, результатов: {results_total}",
+                      end="", flush=True)
+        if progress:
+            print()
+
+        db.set_setting(PARAMS_SETTING_KEY, json.dumps(history.params(), sort_keys=True))
+        conn.execute("PRAGMA synchronous = FULL")
+    finally:
+        db.close()
+
+    return {
+        'prompts': prompts_total,
+        'results': results_total,
+        'models': len(models),
+        'generation_time': round(time.perf_counter() - started, 2),
+        'db_size_mb': round(os.path.getsize(db_name) / 1024 / 1024, 1)
+    }
+
+
+def stored_params(db_name: str) -> Optional[Dict]:
+    """Параметры, с которыми была сгенерирована БД (None, если БД не синтетическая)"""
+    if not os.path.exists(db_name):
+        return None
+    db = Database(db_name)
+    try:
+        value = db.get_setting(PARAMS_SETTING_KEY)
+    finally:
+        db.close()
+    return json.loads(value) if value else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетической истории для ChatList")
+    parser.add_argument('--db', required=True, help='Файл БД (данные в нем будут заменены)')
+    parser.add_argument('--results', type=int, default=100000,
+                        help='Примерное количество результатов')
+    parser.add_argument('--results-per-prompt', type=int, default=5)
+    parser.add_argument('--models', type=int, default=20)
+    parser.add_argument('--median-chars', type=int, default=1500,
+                        help='Медианная длина ответа в символах')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    history = SyntheticHistory(
+        prompts=max(1, args.results // args.results_per_prompt),
+        results_per_prompt=args.results_per_prompt,
+        models=args.models,
+        median_response_chars=args.median_chars,
+        days=args.days,
+        seed=args.seed
+    )
+    summary = generate(args.db, history)
+    print(f"Готово: {summary}")
+
+
+if __name__ == "__main__":
+    main()
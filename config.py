@@ -1,9 +1,8 @@
 """Модуль конфигурации и загрузки переменных окружения"""
 import os
-from dotenv import load_dotenv
 
-# Загружаем переменные окружения из .env файла
-load_dotenv()
+# Файл .env читается при первом обращении к переменным окружения, а не при импорте
+_env_loaded = False
 
 # Настройки базы данных
 DB_NAME = "chatlist.db"
@@ -11,8 +10,17 @@ DB_NAME = "chatlist.db"
 # Настройки по умолчанию
 DEFAULT_TIMEOUT = 30  # секунды
 
+def load_env():
+    """Загрузить переменные окружения из .env файла (один раз)"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
 def get_env_var(var_name: str, default: str = None) -> str:
     """Получить переменную окружения"""
+    load_env()
     value = os.getenv(var_name, default)
     if value is None:
         raise ValueError(f"Переменная окружения {var_name} не установлена")
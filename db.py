@@ -1,37 +1,259 @@
 """Модуль работы с базой данных SQLite"""
+import hashlib
+import logging
+import os
 import sqlite3
 import json
-from datetime import datetime
-from typing import List, Dict, Optional, Any
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Any, Callable, Iterator, Tuple
 from config import DB_NAME
 
+logger = logging.getLogger(__name__)
+
+
+# Версия схемы БД (хранится в PRAGMA user_version). Увеличивается при каждом
+# изменении схемы: если версия БД совпадает, создание таблиц при запуске пропускается
+SCHEMA_VERSION = 6
+
+# Тексты ответов (одинаковые ответы хранятся один раз)
+_RESPONSE_BLOBS_TABLE = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        hash TEXT PRIMARY KEY,
+        body TEXT NOT NULL,
+        refcount INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+# Таблица результатов (текст ответа хранится в response_blobs)
+_RESULTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        prompt_id INTEGER,
+        model_id INTEGER,
+        prompt_text TEXT NOT NULL,
+        model_name TEXT NOT NULL,
+        response_hash TEXT NOT NULL REFERENCES response_blobs(hash),
+        created_at TEXT NOT NULL,
+        metadata TEXT,
+        FOREIGN KEY (prompt_id) REFERENCES prompts(id) ON DELETE SET NULL,
+        FOREIGN KEY (model_id) REFERENCES models(id) ON DELETE SET NULL
+    )
+"""
+
+# Колонки результата с текстом ответа (для запросов с JOIN response_blobs)
+_RESULT_COLUMNS = """
+    r.id, r.prompt_id, r.model_id, r.prompt_text, r.model_name,
+    b.body AS response_text, r.created_at, r.metadata
+"""
+
+# Колонки таблицы results (для переноса строк в архив)
+_RESULTS_TABLE_COLUMNS = ("id, prompt_id, model_id, prompt_text, model_name, "
+                          "response_hash, created_at, metadata")
+
+# Имя, под которым файл архива подключается к соединению (ATTACH)
+_ARCHIVE_SCHEMA = "archive"
+
+# Ошибка элемента задания пакетного улучшения, промт которого удален
+JOB_ITEM_PROMPT_DELETED = "Промт удален"
+
+# Сколько ID передавать в одном запросе get_results_by_ids (лимит параметров SQLite)
+RESULT_IDS_CHUNK = 500
+
+
+# Сколько ждать снятия блокировки БД другим соединением (сек)
+CONNECTION_TIMEOUT = 5
+
+# Значение PRAGMA auto_vacuum для режима INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Сколько свободных страниц возвращать файловой системе за одно обслуживание
+MAINTENANCE_VACUUM_PAGES = 2000
+
+
+def content_hash(text: str) -> str:
+    """Ключ текста ответа в response_blobs (SHA-256 от UTF-8)"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class _ThreadConnection:
+    """Соединение в локальных данных потока: закрывается вместе с ними при завершении потока"""
+    
+    def __init__(self, manager: 'ConnectionManager', conn: sqlite3.Connection):
+        self.conn = conn
+        self._manager = weakref.ref(manager)
+    
+    def close(self):
+        manager = self._manager()
+        if manager is not None:
+            manager._owners.discard(self)
+        self.conn.close()
+    
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionManager:
+    """
+    Соединения с файлом БД, по одному на поток
+    
+    Соединение sqlite3 нельзя использовать из нескольких потоков, поэтому
+    каждый поток получает собственное, настроенное одинаково. Соединение
+    хранится в локальных данных потока (threading.local) и закрывается,
+    когда поток завершается, — в том числе для QThread, который threading
+    не отслеживает. release() закрывает соединение потока раньше.
+    """
+    
+    def __init__(self, db_name: str, read_only: bool = False):
+        """
+        Args:
+            db_name: Файл БД
+            read_only: Открывать соединения только для чтения
+        """
+        self.db_name = db_name
+        self.read_only = read_only
+        self._local = threading.local()
+        # Открытые соединения всех потоков (для len и отладки)
+        self._owners: 'weakref.WeakSet[_ThreadConnection]' = weakref.WeakSet()
+        self._closed = False
+    
+    def connection(self) -> sqlite3.Connection:
+        """
+        Соединение текущего потока (открывается при первом обращении)
+        
+        Raises:
+            sqlite3.ProgrammingError: Если вызван close()
+        """
+        if self._closed:
+            # Соединение потока, еще не закрытое, больше не понадобится
+            self.release()
+            raise sqlite3.ProgrammingError("База данных закрыта")
+        owner = getattr(self._local, 'owner', None)
+        if owner is None:
+            owner = _ThreadConnection(self, self._open())
+            self._local.owner = owner
+            self._owners.add(owner)
+        return owner.conn
+    
+    def release(self):
+        """Закрыть соединение текущего потока"""
+        owner = getattr(self._local, 'owner', None)
+        if owner is not None:
+            del self._local.owner
+            owner.close()
+    
+    def close(self):
+        """
+        Закрыть соединение текущего потока и запретить открытие новых
+        
+        Соединения других потоков не закрываются, пока потоки ими пользуются:
+        они закрываются при завершении потоков или при следующем обращении.
+        """
+        self._closed = True
+        self.release()
+    
+    def __len__(self) -> int:
+        return len(self._owners)
+    
+    def _open(self) -> sqlite3.Connection:
+        # Соединение закрывается при очистке локальных данных потока, которая
+        # может идти не в самом потоке, поэтому проверка потока отключена;
+        # пользуется соединением только поток-владелец
+        if self.read_only:
+            uri = Path(self.db_name).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=CONNECTION_TIMEOUT,
+                                   check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_name, timeout=CONNECTION_TIMEOUT,
+                                   check_same_thread=False)
+            # WAL: чтение не блокируется записью из других соединений (ResultWriter)
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row  # Возвращать результаты как словари
+        return conn
+
 
 class Database:
     """Класс для работы с базой данных SQLite"""
     
-    def __init__(self, db_name: str = DB_NAME):
-        """Инициализация подключения к БД"""
+    def __init__(self, db_name: str = DB_NAME, read_only: bool = False):
+        """
+        Инициализация подключения к БД
+        
+        Args:
+            db_name: Файл БД
+            read_only: Только чтение (для рабочих потоков, выполняющих запросы);
+                       схема не создается и не обновляется, запись вызывает
+                       sqlite3.OperationalError
+        """
         self.db_name = db_name
-        self.conn = None
-        self._connect()
-        self._init_database()
+        self.read_only = read_only
+        # Архив старых результатов: по файлу на месяц (results-YYYY-MM.db)
+        self.archive_dir = os.path.splitext(db_name)[0] + "_archive"
+        # Экземпляр можно использовать из любого потока: у каждого потока свое соединение
+        self._connections = ConnectionManager(db_name, read_only)
+        self._local = threading.local()
+        # Кэш настроек: загружается целиком при первом обращении и обновляется
+        # при каждой записи через set_setting
+        self._settings: Optional[Dict[str, str]] = None
+        self._settings_listeners: List[Callable[[str, str], None]] = []
+        # Счетчик изменений таблицы models: кэши моделей (ModelRegistry)
+        # сравнивают его с запомненным значением вместо запроса к БД
+        self.models_version = 0
+        if not read_only:
+            self._init_database()
+    
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Соединение с БД текущего потока"""
+        return self._connections.connection()
     
-    def _connect(self):
-        """Установить соединение с БД"""
-        self.conn = sqlite3.connect(self.db_name)
-        self.conn.row_factory = sqlite3.Row  # Возвращать результаты как словари
+    @property
+    def _batch_depth(self) -> int:
+        """Глубина вложенности batch() в текущем потоке (внутри пакета commit не выполняется)"""
+        return getattr(self._local, 'batch_depth', 0)
+    
+    @_batch_depth.setter
+    def _batch_depth(self, value: int):
+        self._local.batch_depth = value
+    
+    @property
+    def _pending_settings(self) -> List[Tuple[str, str]]:
+        """Настройки, записанные внутри batch() текущего потока и еще не зафиксированные"""
+        pending = getattr(self._local, 'pending_settings', None)
+        if pending is None:
+            pending = self._local.pending_settings = []
+        return pending
     
     def _init_database(self):
-        """Создать таблицы при первом запуске"""
+        """Создать таблицы при первом запуске или после обновления программы"""
         cursor = self.conn.cursor()
         
+        # Схема актуальна: DDL и проверки миграций не нужны
+        if cursor.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+            return
+        
+        # В новой БД режим освобождения страниц задается до создания таблиц;
+        # файл уже создан PRAGMA journal_mode, но VACUUM пустой БД мгновенный.
+        # Существующую БД переводит в этот режим enable_incremental_vacuum()
+        if cursor.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0:
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
+        
         # Таблица промтов
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS prompts (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 date TEXT NOT NULL,
                 prompt TEXT NOT NULL,
-                tags TEXT
+                tags TEXT,
+                parent_id INTEGER REFERENCES prompts(id) ON DELETE SET NULL
             )
         """)
         
@@ -49,60 +271,278 @@ class Database:
                 model_type TEXT NOT NULL,
                 is_active INTEGER NOT NULL DEFAULT 1,
                 created_at TEXT NOT NULL,
-                updated_at TEXT
+                updated_at TEXT,
+                prompt_price REAL,
+                completion_price REAL
             )
         """)
         
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_models_active ON models(is_active)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_models_type ON models(model_type)")
         
+        # Тексты ответов: одинаковые ответы хранятся один раз, refcount —
+        # количество ссылающихся результатов (поддерживается триггерами)
+        cursor.execute(_RESPONSE_BLOBS_TABLE.format(name="response_blobs"))
+        
         # Таблица результатов
+        cursor.execute(_RESULTS_TABLE.format(name="results"))
+        
+        # Таблица настроек
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        
+        # Суточная статистика использования моделей (токены, задержка, стоимость)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS usage_stats (
+                day TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                provider TEXT,
+                requests INTEGER NOT NULL DEFAULT 0,
+                errors INTEGER NOT NULL DEFAULT 0,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                total_latency REAL NOT NULL DEFAULT 0,
+                cost REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, model_name)
+            )
+        """)
+        
+        # Замеры времени запросов к моделям (история задержек)
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS results (
+            CREATE TABLE IF NOT EXISTS request_timings (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at TEXT NOT NULL,
                 prompt_id INTEGER,
-                model_id INTEGER,
-                prompt_text TEXT NOT NULL,
                 model_name TEXT NOT NULL,
-                response_text TEXT NOT NULL,
+                success INTEGER NOT NULL,
+                status_code INTEGER,
+                connect_time REAL,
+                tls_time REAL,
+                ttfb REAL,
+                ttft REAL,
+                total_time REAL,
+                bytes_sent INTEGER,
+                bytes_received INTEGER,
+                reused_connection INTEGER
+            )
+        """)
+        
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_request_timings_created_at ON request_timings(created_at)")
+        
+        # Кэш ответов AI-ассистента (второй уровень кэша prompt_cache.PromptCache)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS assistant_cache (
+                key TEXT PRIMARY KEY,
+                operation TEXT NOT NULL,
+                model_api_id TEXT NOT NULL,
+                value TEXT NOT NULL,
                 created_at TEXT NOT NULL,
-                metadata TEXT,
-                FOREIGN KEY (prompt_id) REFERENCES prompts(id) ON DELETE SET NULL,
-                FOREIGN KEY (model_id) REFERENCES models(id) ON DELETE SET NULL
+                last_used_at TEXT NOT NULL
             )
         """)
         
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_assistant_cache_last_used ON assistant_cache(last_used_at)")
+        
+        # Задания пакетного улучшения промтов и их элементы (по одному на промт)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS improvement_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                options TEXT,
+                status TEXT NOT NULL DEFAULT 'running',
+                total INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS improvement_job_items (
+                job_id INTEGER NOT NULL REFERENCES improvement_jobs(id) ON DELETE CASCADE,
+                prompt_id INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                result_prompt_id INTEGER,
+                error TEXT,
+                PRIMARY KEY (job_id, prompt_id)
+            )
+        """)
+        
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_improvement_jobs_status ON improvement_jobs(status)")
+        
+        self._migrate(cursor)
+        
+        # Индексы и триггеры результатов создаются после миграции: при переходе
+        # на версию 5 таблица results пересоздается
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_results_prompt_id ON results(prompt_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_results_model_id ON results(model_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_results_created_at ON results(created_at)")
         
-        # Таблица настроек
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS settings (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL,
-                updated_at TEXT NOT NULL
-            )
+            CREATE TRIGGER IF NOT EXISTS results_blob_ref AFTER INSERT ON results
+            BEGIN
+                UPDATE response_blobs SET refcount = refcount + 1 WHERE hash = NEW.response_hash;
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS results_blob_unref AFTER DELETE ON results
+            BEGIN
+                UPDATE response_blobs SET refcount = refcount - 1 WHERE hash = OLD.response_hash;
+                DELETE FROM response_blobs WHERE hash = OLD.response_hash AND refcount <= 0;
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS results_blob_reref
+            AFTER UPDATE OF response_hash ON results
+            WHEN OLD.response_hash != NEW.response_hash
+            BEGIN
+                UPDATE response_blobs SET refcount = refcount + 1 WHERE hash = NEW.response_hash;
+                UPDATE response_blobs SET refcount = refcount - 1 WHERE hash = OLD.response_hash;
+                DELETE FROM response_blobs WHERE hash = OLD.response_hash AND refcount <= 0;
+            END
         """)
+        self.conn.commit()
+    
+    def incremental_vacuum_enabled(self) -> bool:
+        """БД работает в режиме auto_vacuum=INCREMENTAL"""
+        # Прагма возвращает значение, запомненное соединением при последнем
+        # чтении заголовка файла; после VACUUM в другом соединении оно
+        # обновляется только при следующем чтении
+        self.conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        return self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL
+    
+    def enable_incremental_vacuum(self):
+        """
+        Перевести существующую БД в режим auto_vacuum=INCREMENTAL
         
+        Выполняет VACUUM: файл БД переписывается целиком, и все это время
+        запись из других соединений невозможна. Поэтому перевод выполняется
+        только по явному действию пользователя, а запись через ResultWriter
+        на это время приостанавливается (ResultWriter.paused()).
+        """
+        if self._batch_depth:
+            raise RuntimeError("enable_incremental_vacuum нельзя вызывать внутри batch()")
+        if self.incremental_vacuum_enabled():
+            return
         self.conn.commit()
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.conn.execute("VACUUM")
+    
+    def _migrate(self, cursor):
+        """Обновить схему БД, созданную предыдущими версиями программы"""
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        
+        if version < 1:
+            # Цены моделей для расчета стоимости запросов
+            self._add_column_if_missing(cursor, "models", "prompt_price", "REAL")
+            self._add_column_if_missing(cursor, "models", "completion_price", "REAL")
+        
+        if version < 4:
+            # Версии промтов: улучшенный промт ссылается на исходный
+            self._add_column_if_missing(cursor, "prompts", "parent_id",
+                                        "INTEGER REFERENCES prompts(id) ON DELETE SET NULL")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_prompts_parent_id ON prompts(parent_id)")
+        
+        if version < 5:
+            self._migrate_response_blobs(cursor)
+        
+        if version < SCHEMA_VERSION:
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    
+    def _migrate_response_blobs(self, cursor):
+        """Перенести тексты ответов из results.response_text в response_blobs"""
+        columns = [row['name'] for row in cursor.execute("PRAGMA table_info(results)")]
+        if 'response_text' not in columns:
+            return
+        
+        self.conn.create_function("content_hash", 1, content_hash, deterministic=True)
+        cursor.execute("""
+            INSERT OR IGNORE INTO response_blobs (hash, body, refcount)
+            SELECT hash, body, COUNT(*) FROM (
+                SELECT content_hash(response_text) AS hash, response_text AS body FROM results
+            ) GROUP BY hash
+        """)
+        cursor.execute(_RESULTS_TABLE.format(name="results_v5"))
+        cursor.execute("""
+            INSERT INTO results_v5 (id, prompt_id, model_id, prompt_text, model_name,
+                                    response_hash, created_at, metadata)
+            SELECT id, prompt_id, model_id, prompt_text, model_name,
+                   content_hash(response_text), created_at, metadata
+            FROM results
+        """)
+        cursor.execute("DROP TABLE results")
+        cursor.execute("ALTER TABLE results_v5 RENAME TO results")
+    
+    def _add_column_if_missing(self, cursor, table: str, column: str, column_type: str):
+        """Добавить колонку в таблицу, если ее еще нет"""
+        columns = [row['name'] for row in cursor.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+    
+    @contextmanager
+    def batch(self) -> Iterator['Database']:
+        """
+        Выполнить несколько операций записи одной транзакцией
+        
+        Методы записи внутри блока не вызывают commit: транзакция фиксируется
+        при выходе из внешнего блока и откатывается целиком при исключении.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.conn.rollback()
+                self._pending_settings.clear()
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            try:
+                self.conn.commit()
+            except BaseException:
+                self._pending_settings.clear()
+                raise
+            pending = list(self._pending_settings)
+            self._pending_settings.clear()
+            for key, value in pending:
+                self._apply_setting(key, value)
+    
+    def _commit(self):
+        """Зафиксировать изменения (внутри batch() — при выходе из блока)"""
+        if not self._batch_depth:
+            self.conn.commit()
+    
+    def release_connection(self):
+        """Закрыть соединение текущего потока (вызывается рабочим потоком перед завершением)"""
+        self._connections.release()
     
     def close(self):
-        """Закрыть соединение с БД"""
-        if self.conn:
-            self.conn.close()
+        """
+        Закрыть БД: соединение текущего потока закрывается сразу, соединения
+        других потоков — при их завершении; после этого conn вызывает
+        sqlite3.ProgrammingError
+        """
+        self._connections.close()
     
     # ========== Методы для работы с промтами ==========
     
-    def create_prompt(self, prompt: str, tags: Optional[str] = None) -> int:
-        """Создать новый промт"""
+    def create_prompt(self, prompt: str, tags: Optional[str] = None,
+                      parent_id: Optional[int] = None) -> int:
+        """Создать новый промт (parent_id — промт, новой версией которого он является)"""
         cursor = self.conn.cursor()
         date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         cursor.execute(
-            "INSERT INTO prompts (date, prompt, tags) VALUES (?, ?, ?)",
-            (date, prompt, tags)
+            "INSERT INTO prompts (date, prompt, tags, parent_id) VALUES (?, ?, ?, ?)",
+            (date, prompt, tags, parent_id)
         )
-        self.conn.commit()
+        self._commit()
         return cursor.lastrowid
     
     def get_prompts(self, search: Optional[str] = None, 
@@ -138,6 +578,24 @@ class Database:
         row = cursor.fetchone()
         return dict(row) if row else None
     
+    def get_prompts_by_tag(self, tag: str) -> List[Dict]:
+        """Получить промты, у которых среди тегов (через запятую) есть указанный"""
+        # LOWER и LIKE в SQLite не учитывают регистр только для латиницы,
+        # поэтому теги сравниваются в Python
+        tag = tag.strip().casefold()
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT * FROM prompts WHERE tags IS NOT NULL AND tags != '' ORDER BY id")
+        return [
+            dict(row) for row in cursor.fetchall()
+            if tag in (t.strip().casefold() for t in row['tags'].split(','))
+        ]
+    
+    def get_prompt_versions(self, prompt_id: int) -> List[Dict]:
+        """Получить версии промта (созданные из него улучшением), от новых к старым"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT * FROM prompts WHERE parent_id = ? ORDER BY id DESC", (prompt_id,))
+        return [dict(row) for row in cursor.fetchall()]
+    
     def update_prompt(self, prompt_id: int, prompt: str, tags: Optional[str] = None) -> bool:
         """Обновить промт"""
         cursor = self.conn.cursor()
@@ -145,30 +603,35 @@ class Database:
             "UPDATE prompts SET prompt = ?, tags = ? WHERE id = ?",
             (prompt, tags, prompt_id)
         )
-        self.conn.commit()
+        self._commit()
         return cursor.rowcount > 0
     
     def delete_prompt(self, prompt_id: int) -> bool:
         """Удалить промт"""
         cursor = self.conn.cursor()
         cursor.execute("DELETE FROM prompts WHERE id = ?", (prompt_id,))
-        self.conn.commit()
+        self._commit()
         return cursor.rowcount > 0
     
     # ========== Методы для работы с моделями ==========
     
     def create_model(self, name: str, api_url: str, api_id: str, 
                     api_key_env_var: str, model_type: str, 
-                    is_active: int = 1) -> int:
+                    is_active: int = 1,
+                    prompt_price: Optional[float] = None,
+                    completion_price: Optional[float] = None) -> int:
         """Добавить новую модель"""
         cursor = self.conn.cursor()
         created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         cursor.execute("""
             INSERT INTO models (name, api_url, api_id, api_key_env_var, 
-                              model_type, is_active, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (name, api_url, api_id, api_key_env_var, model_type, is_active, created_at))
-        self.conn.commit()
+                              model_type, is_active, created_at,
+                              prompt_price, completion_price)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (name, api_url, api_id, api_key_env_var, model_type, is_active, created_at,
+              prompt_price, completion_price))
+        self._commit()
+        self.models_version += 1
         return cursor.lastrowid
     
     def get_active_models(self) -> List[Dict]:
@@ -194,7 +657,8 @@ class Database:
     
     def update_model(self, model_id: int, name: str = None, api_url: str = None,
                     api_id: str = None, api_key_env_var: str = None,
-                    model_type: str = None, is_active: int = None) -> bool:
+                    model_type: str = None, is_active: int = None,
+                    prompt_price: float = None, completion_price: float = None) -> bool:
         """Обновить модель"""
         cursor = self.conn.cursor()
         updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -220,6 +684,12 @@ class Database:
         if is_active is not None:
             updates.append("is_active = ?")
             params.append(is_active)
+        if prompt_price is not None:
+            updates.append("prompt_price = ?")
+            params.append(prompt_price)
+        if completion_price is not None:
+            updates.append("completion_price = ?")
+            params.append(completion_price)
         
         if not updates:
             return False
@@ -230,7 +700,9 @@ class Database:
         
         query = f"UPDATE models SET {', '.join(updates)} WHERE id = ?"
         cursor.execute(query, params)
-        self.conn.commit()
+        self._commit()
+        if cursor.rowcount > 0:
+            self.models_version += 1
         return cursor.rowcount > 0
     
     def toggle_model_active(self, model_id: int) -> bool:
@@ -245,11 +717,22 @@ class Database:
         """Удалить модель"""
         cursor = self.conn.cursor()
         cursor.execute("DELETE FROM models WHERE id = ?", (model_id,))
-        self.conn.commit()
+        self._commit()
+        if cursor.rowcount > 0:
+            self.models_version += 1
         return cursor.rowcount > 0
     
     # ========== Методы для работы с результатами ==========
     
+    def _store_response(self, cursor, response_text: str) -> str:
+        """Сохранить текст ответа в response_blobs (если его еще нет) и вернуть его ключ"""
+        response_hash = content_hash(response_text)
+        cursor.execute(
+            "INSERT OR IGNORE INTO response_blobs (hash, body) VALUES (?, ?)",
+            (response_hash, response_text)
+        )
+        return response_hash
+    
     def save_result(self, prompt_id: Optional[int], model_id: Optional[int],
                    prompt_text: str, model_name: str, response_text: str,
                    metadata: Optional[Dict] = None) -> int:
@@ -257,65 +740,89 @@ class Database:
         cursor = self.conn.cursor()
         created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         metadata_json = json.dumps(metadata) if metadata else None
+        response_hash = self._store_response(cursor, response_text)
         
         cursor.execute("""
             INSERT INTO results (prompt_id, model_id, prompt_text, model_name, 
-                               response_text, created_at, metadata)
+                               response_hash, created_at, metadata)
             VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (prompt_id, model_id, prompt_text, model_name, response_text, 
+        """, (prompt_id, model_id, prompt_text, model_name, response_hash, 
               created_at, metadata_json))
-        self.conn.commit()
+        self._commit()
         return cursor.lastrowid
     
     def save_results(self, results: List[Dict]) -> int:
-        """Массовое сохранение результатов"""
+        """Массовое сохранение результатов (одинаковые ответы хранятся один раз)"""
         cursor = self.conn.cursor()
         created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         count = 0
         
         for result in results:
             metadata_json = json.dumps(result.get('metadata')) if result.get('metadata') else None
+            response_hash = self._store_response(cursor, result['response_text'])
             cursor.execute("""
                 INSERT INTO results (prompt_id, model_id, prompt_text, model_name, 
-                                   response_text, created_at, metadata)
+                                   response_hash, created_at, metadata)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
             """, (
                 result.get('prompt_id'),
                 result.get('model_id'),
                 result['prompt_text'],
                 result['model_name'],
-                result['response_text'],
+                response_hash,
                 created_at,
                 metadata_json
             ))
             count += 1
         
-        self.conn.commit()
+        self._commit()
         return count
     
     def get_results(self, prompt_id: Optional[int] = None,
                    model_id: Optional[int] = None,
                    search: Optional[str] = None,
                    order_by: str = "created_at",
-                   order_dir: str = "DESC") -> List[Dict]:
-        """Получить результаты с поиском и сортировкой"""
-        cursor = self.conn.cursor()
-        query = "SELECT * FROM results WHERE 1=1"
+                   order_dir: str = "DESC",
+                   date_from: Optional[str] = None,
+                   date_to: Optional[str] = None,
+                   include_archive: bool = False) -> List[Dict]:
+        """
+        Получить результаты с поиском и сортировкой
+        
+        Архивные месяцы (archive_results) подключаются, только если задана
+        date_from и месяц попадает в период date_from..date_to, либо явно
+        запрошен весь архив (include_archive); иначе читается только основная БД.
+        
+        Args:
+            date_from: Начальная дата (YYYY-MM-DD или YYYY-MM-DD HH:MM:SS), включительно
+            date_to: Конечная дата (YYYY-MM-DD или YYYY-MM-DD HH:MM:SS), включительно
+            include_archive: Читать архивы и без начальной даты
+        """
+        conditions = ""
         params = []
         
         if prompt_id is not None:
-            query += " AND prompt_id = ?"
+            conditions += " AND r.prompt_id = ?"
             params.append(prompt_id)
         
         if model_id is not None:
-            query += " AND model_id = ?"
+            conditions += " AND r.model_id = ?"
             params.append(model_id)
         
         if search:
-            query += " AND (prompt_text LIKE ? OR model_name LIKE ? OR response_text LIKE ?)"
+            conditions += " AND (r.prompt_text LIKE ? OR r.model_name LIKE ? OR b.body LIKE ?)"
             search_pattern = f"%{search}%"
             params.extend([search_pattern, search_pattern, search_pattern])
         
+        if date_from:
+            conditions += " AND r.created_at >= ?"
+            params.append(date_from)
+        
+        if date_to:
+            conditions += " AND r.created_at <= ?"
+            # Дата без времени включает весь день
+            params.append(date_to + " 23:59:59" if len(date_to) == 10 else date_to)
+        
         # Валидация порядка сортировки
         valid_columns = ["created_at", "model_name", "prompt_text"]
         if order_by not in valid_columns:
@@ -323,45 +830,657 @@ class Database:
         if order_dir.upper() not in ["ASC", "DESC"]:
             order_dir = "DESC"
         
-        query += f" ORDER BY {order_by} {order_dir}"
+        def query(schema: str) -> List[Dict]:
+            cursor = self.conn.cursor()
+            cursor.execute(f"""
+                SELECT {_RESULT_COLUMNS} FROM {schema}.results r
+                JOIN {schema}.response_blobs b ON b.hash = r.response_hash
+                WHERE 1=1 {conditions}
+                ORDER BY r.{order_by} {order_dir}
+            """, params)
+            return [dict(row) for row in cursor.fetchall()]
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        results = [dict(row) for row in rows]
+        results = query("main")
+        
+        months = self.get_archive_months(date_from, date_to) if date_from or include_archive else []
+        for month in months:
+            with self._attached_archive(month):
+                results.extend(query(_ARCHIVE_SCHEMA))
+        if months:
+            # Строки из разных файлов упорядочиваются так же, как ORDER BY
+            results.sort(key=lambda result: result[order_by], reverse=order_dir.upper() == "DESC")
+        
+        return self._parse_metadata(results)
+    
+    def get_results_by_ids(self, result_ids: List[int]) -> List[Dict]:
+        """
+        Получить результаты по списку ID (в порядке списка)
+        
+        Основная БД читается одним запросом на RESULT_IDS_CHUNK ID; архивы
+        подключаются, только если часть ID в основной БД не найдена.
+        """
+        result_ids = list(dict.fromkeys(result_ids))
+        found: Dict[int, Dict] = {}
+        
+        def query(schema: str, ids: List[int]):
+            cursor = self.conn.cursor()
+            for start in range(0, len(ids), RESULT_IDS_CHUNK):
+                chunk = ids[start:start + RESULT_IDS_CHUNK]
+                cursor.execute(f"""
+                    SELECT {_RESULT_COLUMNS} FROM {schema}.results r
+                    JOIN {schema}.response_blobs b ON b.hash = r.response_hash
+                    WHERE r.id IN ({", ".join("?" * len(chunk))})
+                """, chunk)
+                for row in cursor.fetchall():
+                    found[row['id']] = dict(row)
         
-        # Парсим metadata из JSON
+        query("main", result_ids)
+        for month in self.get_archive_months():
+            missing = [result_id for result_id in result_ids if result_id not in found]
+            if not missing:
+                break
+            with self._attached_archive(month):
+                query(_ARCHIVE_SCHEMA, missing)
+        
+        return self._parse_metadata([found[result_id] for result_id in result_ids
+                                     if result_id in found])
+    
+    def _parse_metadata(self, results: List[Dict]) -> List[Dict]:
+        """Разобрать metadata результатов из JSON"""
         for result in results:
             if result.get('metadata'):
                 try:
                     result['metadata'] = json.loads(result['metadata'])
                 except:
                     result['metadata'] = None
-        
         return results
     
     def delete_result(self, result_id: int) -> bool:
-        """Удалить результат"""
+        """Удалить результат (текст ответа удаляется триггером, если на него больше нет ссылок)"""
         cursor = self.conn.cursor()
         cursor.execute("DELETE FROM results WHERE id = ?", (result_id,))
+        self._commit()
+        if cursor.rowcount > 0:
+            return True
+        
+        # Результат мог быть перенесен в архив
+        for month in self.get_archive_months():
+            with self._attached_archive(month):
+                row = cursor.execute(f"SELECT response_hash FROM {_ARCHIVE_SCHEMA}.results "
+                                     f"WHERE id = ?", (result_id,)).fetchone()
+                if row is None:
+                    continue
+                cursor.execute(f"DELETE FROM {_ARCHIVE_SCHEMA}.results WHERE id = ?", (result_id,))
+                cursor.execute(f"UPDATE {_ARCHIVE_SCHEMA}.response_blobs SET refcount = refcount - 1 "
+                               f"WHERE hash = ?", (row['response_hash'],))
+                cursor.execute(f"""
+                    DELETE FROM {_ARCHIVE_SCHEMA}.response_blobs WHERE hash = ? AND NOT EXISTS (
+                        SELECT 1 FROM {_ARCHIVE_SCHEMA}.results WHERE response_hash = ?
+                    )
+                """, (row['response_hash'], row['response_hash']))
+                self.conn.commit()
+                return True
+        return False
+    
+    # ========== Методы для работы с архивом результатов ==========
+    
+    def archive_path(self, month: str) -> str:
+        """Файл архива результатов за месяц (YYYY-MM)"""
+        return os.path.join(self.archive_dir, f"results-{month}.db")
+    
+    def get_archive_months(self, date_from: Optional[str] = None,
+                           date_to: Optional[str] = None) -> List[str]:
+        """Месяцы (YYYY-MM), архивы которых попадают в период date_from..date_to"""
+        if not os.path.isdir(self.archive_dir):
+            return []
+        months = []
+        for filename in sorted(os.listdir(self.archive_dir)):
+            if not (filename.startswith("results-") and filename.endswith(".db")):
+                continue
+            month = filename[len("results-"):-len(".db")]
+            if date_from and month < date_from[:7]:
+                continue
+            if date_to and month > date_to[:7]:
+                continue
+            months.append(month)
+        return months
+    
+    @contextmanager
+    def _attached_archive(self, month: str) -> Iterator[None]:
+        """Подключить архив за месяц к соединению текущего потока под именем archive"""
+        # ATTACH и DETACH нельзя выполнять внутри транзакции: commit здесь
+        # зафиксировал бы незавершенный пакет
+        if self._batch_depth:
+            raise RuntimeError("Архив нельзя подключать внутри batch()")
         self.conn.commit()
+        self.conn.execute(f"ATTACH DATABASE ? AS {_ARCHIVE_SCHEMA}", (self.archive_path(month),))
+        try:
+            yield
+        finally:
+            self.conn.commit()
+            self.conn.execute(f"DETACH DATABASE {_ARCHIVE_SCHEMA}")
+    
+    def archive_results(self, older_than_days: int) -> int:
+        """
+        Перенести результаты старше заданного числа дней в помесячные архивы
+        
+        Архив — отдельный файл SQLite на месяц с теми же таблицами results
+        и response_blobs; get_results подключает его, когда период запроса
+        затрагивает этот месяц. Вызывается вне batch(): каждый месяц
+        переносится своей транзакцией.
+        
+        Returns:
+            Количество перенесенных результатов
+        """
+        if self._batch_depth:
+            raise RuntimeError("archive_results нельзя вызывать внутри batch()")
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime("%Y-%m-%d %H:%M:%S")
+        cursor = self.conn.cursor()
+        months = [row[0] for row in cursor.execute(
+            "SELECT DISTINCT substr(created_at, 1, 7) FROM results WHERE created_at < ?", (cutoff,)
+        )]
+        if not months:
+            return 0
+        
+        os.makedirs(self.archive_dir, exist_ok=True)
+        archived = 0
+        for month in months:
+            month_rows = "FROM results WHERE substr(created_at, 1, 7) = ? AND created_at < ?"
+            with self._attached_archive(month):
+                cursor.execute(_RESPONSE_BLOBS_TABLE.format(name=f"{_ARCHIVE_SCHEMA}.response_blobs"))
+                cursor.execute(_RESULTS_TABLE.format(name=f"{_ARCHIVE_SCHEMA}.results"))
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {_ARCHIVE_SCHEMA}.idx_results_created_at "
+                               f"ON results(created_at)")
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {_ARCHIVE_SCHEMA}.idx_results_response_hash "
+                               f"ON results(response_hash)")
+                try:
+                    # OR REPLACE: с WAL транзакция атомарна для каждого файла по
+                    # отдельности, и после сбоя строки переносятся повторно
+                    cursor.execute(f"""
+                        INSERT OR REPLACE INTO {_ARCHIVE_SCHEMA}.results ({_RESULTS_TABLE_COLUMNS})
+                        SELECT {_RESULTS_TABLE_COLUMNS} {month_rows}
+                    """, (month, cutoff))
+                    cursor.execute(f"""
+                        INSERT OR IGNORE INTO {_ARCHIVE_SCHEMA}.response_blobs (hash, body, refcount)
+                        SELECT DISTINCT b.hash, b.body, 0 FROM response_blobs b
+                        JOIN results r ON r.response_hash = b.hash
+                        WHERE substr(r.created_at, 1, 7) = ? AND r.created_at < ?
+                    """, (month, cutoff))
+                    # Счетчик ссылок пересчитывается по строкам архива, поэтому
+                    # повторный перенос тех же строк его не увеличивает
+                    cursor.execute(f"""
+                        UPDATE {_ARCHIVE_SCHEMA}.response_blobs SET refcount = (
+                            SELECT COUNT(*) FROM {_ARCHIVE_SCHEMA}.results
+                            WHERE response_hash = {_ARCHIVE_SCHEMA}.response_blobs.hash
+                        )
+                        WHERE hash IN (SELECT response_hash {month_rows})
+                    """, (month, cutoff))
+                    cursor.execute(f"DELETE {month_rows}", (month, cutoff))
+                    archived += cursor.rowcount
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
+        return archived
+    
+    def prune_results(self, keep_last: int = 0, max_age_days: int = 0) -> int:
+        """
+        Удалить результаты по правилам хранения
+        
+        Ограничение по возрасту применяется и к архивам: месяцы целиком
+        старше границы удаляются вместе с файлом. Вызывается вне batch().
+        
+        Args:
+            keep_last: Сколько последних результатов хранить для каждой пары
+                       промт + модель (0 — без ограничения)
+            max_age_days: Удалять результаты старше стольких дней (0 — не удалять)
+            
+        Returns:
+            Количество удаленных результатов
+        """
+        if self._batch_depth:
+            raise RuntimeError("prune_results нельзя вызывать внутри batch()")
+        cursor = self.conn.cursor()
+        deleted = 0
+        
+        if max_age_days > 0:
+            cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+            cursor.execute("DELETE FROM results WHERE created_at < ?", (cutoff,))
+            deleted += cursor.rowcount
+            deleted += self._prune_archives(cutoff)
+        
+        if keep_last > 0:
+            # Результаты без ссылки на промт группируются по тексту промта
+            cursor.execute("""
+                DELETE FROM results WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, ROW_NUMBER() OVER (
+                            PARTITION BY COALESCE(prompt_id, prompt_text), model_name
+                            ORDER BY id DESC
+                        ) AS position
+                        FROM results
+                    ) WHERE position > ?
+                )
+            """, (keep_last,))
+            deleted += cursor.rowcount
+        
+        self._commit()
+        return deleted
+    
+    def _prune_archives(self, cutoff: str) -> int:
+        """Удалить из архивов результаты старше cutoff (опустевшие архивы — вместе с файлом)"""
+        cursor = self.conn.cursor()
+        deleted = 0
+        for month in self.get_archive_months(date_to=cutoff):
+            with self._attached_archive(month):
+                cursor.execute(f"DELETE FROM {_ARCHIVE_SCHEMA}.results WHERE created_at < ?",
+                               (cutoff,))
+                deleted += cursor.rowcount
+                cursor.execute(f"""
+                    DELETE FROM {_ARCHIVE_SCHEMA}.response_blobs WHERE hash NOT IN (
+                        SELECT response_hash FROM {_ARCHIVE_SCHEMA}.results
+                    )
+                """)
+                remaining = cursor.execute(
+                    f"SELECT COUNT(*) FROM {_ARCHIVE_SCHEMA}.results").fetchone()[0]
+            if not remaining:
+                try:
+                    os.remove(self.archive_path(month))
+                except OSError as e:
+                    # Пустой архив не мешает чтению: удалится при следующей очистке
+                    logger.warning(f"Не удалось удалить архив {month}: {str(e)}")
+        return deleted
+    
+    # ========== Методы для работы со статистикой использования ==========
+    
+    def record_usage(self, results: List[Dict]) -> int:
+        """
+        Добавить результаты запросов в суточную статистику по моделям
+        
+        Args:
+            results: Результаты NetworkManager (метаданные берутся из 'metadata')
+            
+        Returns:
+            Количество учтенных запросов
+        """
+        cursor = self.conn.cursor()
+        day = datetime.now().strftime("%Y-%m-%d")
+        count = 0
+        
+        for result in results:
+            metadata = result.get('metadata') or {}
+            if metadata.get('coalesced'):
+                # Объединенный запрос не уходил в сеть и уже учтен у ведущего
+                continue
+            cursor.execute("""
+                INSERT INTO usage_stats (day, model_name, provider, requests, errors,
+                                         prompt_tokens, completion_tokens,
+                                         total_latency, cost)
+                VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?)
+                ON CONFLICT(day, model_name) DO UPDATE SET
+                    provider = excluded.provider,
+                    requests = requests + 1,
+                    errors = errors + excluded.errors,
+                    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                    completion_tokens = completion_tokens + excluded.completion_tokens,
+                    total_latency = total_latency + excluded.total_latency,
+                    cost = cost + excluded.cost
+            """, (
+                day,
+                result.get('model_name', 'Unknown'),
+                metadata.get('provider'),
+                0 if result.get('success') else 1,
+                metadata.get('prompt_tokens') or 0,
+                metadata.get('completion_tokens') or 0,
+                metadata.get('latency') or 0,
+                metadata.get('cost') or 0
+            ))
+            count += 1
+        
+        self._commit()
+        return count
+    
+    def get_usage_stats(self, date_from: Optional[str] = None,
+                        date_to: Optional[str] = None,
+                        model_name: Optional[str] = None) -> List[Dict]:
+        """
+        Получить суточную статистику использования
+        
+        Args:
+            date_from: Начальная дата (YYYY-MM-DD), включительно
+            date_to: Конечная дата (YYYY-MM-DD), включительно
+            model_name: Название модели
+            
+        Returns:
+            Список словарей с добавленным полем tokens_per_second
+        """
+        cursor = self.conn.cursor()
+        query = "SELECT * FROM usage_stats WHERE 1=1"
+        params = []
+        
+        if date_from:
+            query += " AND day >= ?"
+            params.append(date_from)
+        if date_to:
+            query += " AND day <= ?"
+            params.append(date_to)
+        if model_name:
+            query += " AND model_name = ?"
+            params.append(model_name)
+        
+        query += " ORDER BY day DESC, model_name"
+        
+        cursor.execute(query, params)
+        stats = [dict(row) for row in cursor.fetchall()]
+        for row in stats:
+            latency = row['total_latency']
+            row['tokens_per_second'] = row['completion_tokens'] / latency if latency > 0 else None
+        return stats
+    
+    def record_timings(self, results: List[Dict], prompt_id: Optional[int] = None) -> int:
+        """
+        Сохранить замеры времени запросов в историю
+        
+        Args:
+            results: Результаты NetworkManager (замер берется из metadata['timing'])
+            prompt_id: ID промта, к которому относятся запросы
+            
+        Returns:
+            Количество сохраненных замеров
+        """
+        cursor = self.conn.cursor()
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        count = 0
+        
+        for result in results:
+            metadata = result.get('metadata') or {}
+            timing = metadata.get('timing')
+            if not timing or metadata.get('coalesced'):
+                continue
+            cursor.execute("""
+                INSERT INTO request_timings (created_at, prompt_id, model_name, success,
+                                             status_code, connect_time, tls_time, ttfb, ttft,
+                                             total_time, bytes_sent, bytes_received,
+                                             reused_connection)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                created_at,
+                prompt_id,
+                result.get('model_name', 'Unknown'),
+                1 if result.get('success') else 0,
+                metadata.get('status_code'),
+                timing.get('connect_time'),
+                timing.get('tls_time'),
+                timing.get('ttfb'),
+                timing.get('ttft'),
+                timing.get('total_time'),
+                timing.get('bytes_sent'),
+                timing.get('bytes_received'),
+                1 if timing.get('reused_connection') else 0
+            ))
+            count += 1
+        
+        self._commit()
+        return count
+    
+    def get_request_timings(self, model_name: Optional[str] = None,
+                            limit: int = 1000) -> List[Dict]:
+        """Получить историю замеров времени запросов (сначала новые)"""
+        cursor = self.conn.cursor()
+        query = "SELECT * FROM request_timings"
+        params = []
+        
+        if model_name:
+            query += " WHERE model_name = ?"
+            params.append(model_name)
+        
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        
+        cursor.execute(query, params)
+        return [dict(row) for row in cursor.fetchall()]
+    
+    # ========== Методы для пакетного улучшения промтов ==========
+    
+    def create_improvement_job(self, prompt_ids: List[int], model_name: str,
+                               options: Optional[Dict] = None) -> int:
+        """Создать задание пакетного улучшения для списка промтов"""
+        cursor = self.conn.cursor()
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        prompt_ids = list(dict.fromkeys(prompt_ids))
+        cursor.execute("""
+            INSERT INTO improvement_jobs (created_at, updated_at, model_name, options, total)
+            VALUES (?, ?, ?, ?, ?)
+        """, (now, now, model_name, json.dumps(options) if options else None, len(prompt_ids)))
+        job_id = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO improvement_job_items (job_id, prompt_id) VALUES (?, ?)",
+            [(job_id, prompt_id) for prompt_id in prompt_ids]
+        )
+        self._commit()
+        return job_id
+    
+    def get_improvement_job(self, job_id: int) -> Optional[Dict]:
+        """Получить задание пакетного улучшения"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT * FROM improvement_jobs WHERE id = ?", (job_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        job = dict(row)
+        job['options'] = json.loads(job['options']) if job['options'] else {}
+        return job
+    
+    def get_unfinished_improvement_jobs(self) -> List[Dict]:
+        """Получить незавершенные задания (прерванные или остановленные), от новых к старым"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id FROM improvement_jobs WHERE status != 'done' ORDER BY id DESC")
+        return [self.get_improvement_job(row['id']) for row in cursor.fetchall()]
+    
+    def get_pending_job_prompts(self, job_id: int) -> List[Dict]:
+        """
+        Получить промты задания, которые еще не обработаны
+        
+        Промты, удаленные после создания задания, отмечаются ошибочными,
+        чтобы задание могло завершиться (done + failed == total).
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            UPDATE improvement_job_items SET status = 'failed', error = ?
+            WHERE job_id = ? AND status = 'pending'
+              AND prompt_id NOT IN (SELECT id FROM prompts)
+        """, (JOB_ITEM_PROMPT_DELETED, job_id))
+        if cursor.rowcount > 0:
+            cursor.execute("""
+                UPDATE improvement_jobs SET failed = failed + ?, updated_at = ? WHERE id = ?
+            """, (cursor.rowcount, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), job_id))
+            self._commit()
+        
+        cursor.execute("""
+            SELECT p.* FROM improvement_job_items i
+            JOIN prompts p ON p.id = i.prompt_id
+            WHERE i.job_id = ? AND i.status = 'pending'
+            ORDER BY p.id
+        """, (job_id,))
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def finish_improvement_job_item(self, job_id: int, prompt_id: int,
+                                    result_prompt_id: Optional[int] = None,
+                                    error: Optional[str] = None) -> bool:
+        """Отметить промт задания обработанным (успешно, если передан result_prompt_id)"""
+        cursor = self.conn.cursor()
+        status = 'done' if result_prompt_id is not None else 'failed'
+        cursor.execute("""
+            UPDATE improvement_job_items SET status = ?, result_prompt_id = ?, error = ?
+            WHERE job_id = ? AND prompt_id = ? AND status = 'pending'
+        """, (status, result_prompt_id, error, job_id, prompt_id))
+        if cursor.rowcount == 0:
+            self._commit()
+            return False
+        counter = 'done' if status == 'done' else 'failed'
+        cursor.execute(f"""
+            UPDATE improvement_jobs SET {counter} = {counter} + 1, updated_at = ?
+            WHERE id = ?
+        """, (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), job_id))
+        self._commit()
+        return True
+    
+    def set_improvement_job_status(self, job_id: int, status: str) -> bool:
+        """Изменить статус задания ('running', 'paused', 'done')"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "UPDATE improvement_jobs SET status = ?, updated_at = ? WHERE id = ?",
+            (status, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), job_id)
+        )
+        self._commit()
         return cursor.rowcount > 0
     
+    # ========== Обслуживание БД ==========
+    
+    def run_maintenance(self, vacuum_pages: int = MAINTENANCE_VACUUM_PAGES) -> Dict[str, Any]:
+        """
+        Обслуживание БД: удаление текстов ответов без ссылок, обновление
+        статистики планировщика (ANALYZE / PRAGMA optimize), возврат свободных
+        страниц (incremental_vacuum) и перенос WAL в основной файл
+        
+        Вызывается вне batch(); длительность шагов записывается в лог.
+        
+        Args:
+            vacuum_pages: Сколько свободных страниц освободить за раз
+            
+        Returns:
+            Словарь: orphan_blobs, freed_pages, wal_bytes (размер WAL до
+            контрольной точки) и timings
+            (шаг -> длительность в секундах)
+        """
+        if self._batch_depth:
+            raise RuntimeError("run_maintenance нельзя вызывать внутри batch()")
+        self.conn.commit()
+        cursor = self.conn.cursor()
+        report: Dict[str, Any] = {}
+        timings: Dict[str, float] = {}
+        
+        # Тексты ответов без ссылок (триггеры не срабатывают при правке в обход программы)
+        start = time.perf_counter()
+        cursor.execute("""
+            DELETE FROM response_blobs
+            WHERE refcount <= 0 OR hash NOT IN (SELECT response_hash FROM results)
+        """)
+        report['orphan_blobs'] = cursor.rowcount
+        self.conn.commit()
+        timings['orphan_blobs'] = time.perf_counter() - start
+        
+        # Статистика для планировщика запросов: полный ANALYZE при первом
+        # обслуживании, дальше — только для изменившихся таблиц
+        start = time.perf_counter()
+        analyzed = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).fetchone()
+        cursor.execute("PRAGMA optimize" if analyzed else "ANALYZE")
+        self.conn.commit()
+        timings['optimize' if analyzed else 'analyze'] = time.perf_counter() - start
+        
+        # Возврат свободных страниц (после удаления результатов файл не уменьшается)
+        start = time.perf_counter()
+        free_before = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        if self.incremental_vacuum_enabled():
+            # Страница освобождается на каждом шаге выполнения, а execute делает
+            # для такой прагмы только один шаг; executescript выполняет ее целиком
+            cursor.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages)});")
+        else:
+            # Перевод в этот режим требует VACUUM всей БД: только по
+            # явному действию пользователя (enable_incremental_vacuum)
+            logger.info("incremental_vacuum пропущен: БД не в режиме auto_vacuum=INCREMENTAL")
+        report['freed_pages'] = free_before - cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        timings['incremental_vacuum'] = time.perf_counter() - start
+        
+        # Перенос WAL в основной файл и усечение журнала
+        start = time.perf_counter()
+        wal_path = self.db_name + "-wal"
+        report['wal_bytes'] = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+        busy = cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()[0]
+        if busy:
+            logger.info("Контрольная точка WAL выполнена не полностью: БД читается другим соединением")
+        timings['wal_checkpoint'] = time.perf_counter() - start
+        
+        report['timings'] = timings
+        logger.info("Обслуживание БД: " + ", ".join(
+            f"{step} {seconds * 1000:.1f} мс" for step, seconds in timings.items()
+        ) + f"; удалено текстов {report['orphan_blobs']}, освобождено страниц "
+            f"{report['freed_pages']}, размер WAL {report['wal_bytes']} байт")
+        return report
+    
     # ========== Методы для работы с настройками ==========
     
+    def _load_settings(self) -> Dict[str, str]:
+        """Загрузить все настройки в кэш"""
+        if self._settings is None:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT key, value FROM settings")
+            self._settings = {row['key']: row['value'] for row in cursor.fetchall()}
+        return self._settings
+    
     def get_setting(self, key: str, default: Optional[str] = None) -> Optional[str]:
-        """Получить настройку"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT value FROM settings WHERE key = ?", (key,))
-        row = cursor.fetchone()
-        return row['value'] if row else default
+        """
+        Получить настройку
+        
+        Настройки читаются из кэша в памяти; изменения, сделанные в файл БД
+        в обход этого экземпляра Database, видны только после reload_settings().
+        """
+        return self._load_settings().get(key, default)
+    
+    def get_settings(self) -> Dict[str, str]:
+        """Получить копию всех настроек"""
+        return dict(self._load_settings())
     
     def set_setting(self, key: str, value: str) -> bool:
-        """Сохранить настройку"""
+        """
+        Сохранить настройку (подписчики уведомляются, если значение изменилось)
+        
+        Внутри batch() кэш обновляется и подписчики уведомляются только после
+        фиксации внешнего блока; при откате изменение отбрасывается.
+        """
+        # Кэш загружается до записи, чтобы не прочитать в него незафиксированное значение
+        self._load_settings()
         cursor = self.conn.cursor()
         updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         cursor.execute("""
             INSERT OR REPLACE INTO settings (key, value, updated_at)
             VALUES (?, ?, ?)
         """, (key, value, updated_at))
-        self.conn.commit()
+        if self._batch_depth:
+            # Кэш и подписчики узнают о значении после фиксации пакета (batch)
+            self._pending_settings.append((key, value))
+            return True
+        self._commit()
+        self._apply_setting(key, value)
         return True
+    
+    def _apply_setting(self, key: str, value: str):
+        """Обновить кэш зафиксированным значением и уведомить подписчиков об изменении"""
+        settings = self._load_settings()
+        if settings.get(key) == value:
+            return
+        settings[key] = value
+        for listener in list(self._settings_listeners):
+            listener(key, value)
+    
+    def reload_settings(self):
+        """Перечитать настройки из БД"""
+        self._settings = None
+        self._load_settings()
+    
+    def add_settings_listener(self, listener: Callable[[str, str], None]):
+        """
+        Подписаться на изменения настроек
+        
+        Args:
+            listener: Функция (ключ, новое значение); вызывается в потоке,
+                      изменившем настройку
+        """
+        self._settings_listeners.append(listener)
+    
+    def remove_settings_listener(self, listener: Callable[[str, str], None]):
+        """Отписаться от изменений настроек"""
+        if listener in self._settings_listeners:
+            self._settings_listeners.remove(listener)
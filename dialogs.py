@@ -1,15 +1,16 @@
 """Диалоговые окна для управления данными"""
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 from PyQt5.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QTextEdit,
     QPushButton, QTableWidget, QTableWidgetItem, QDialogButtonBox,
     QAbstractItemView, QHeaderView, QComboBox, QCheckBox, QMessageBox,
-    QFileDialog, QSpinBox
+    QFileDialog, QSpinBox, QGroupBox
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5.QtGui import QFont
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
+from results_view import MIN_ROW_HEIGHT, ResponseDelegate, RowHeightFitter
 from version import __version__
 
 
@@ -49,6 +50,7 @@ class PromptsManageDialog(QDialog):
         self.table.horizontalHeader().setStretchLastSection(True)
         self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.table.setColumnWidth(0, 50)
         self.table.setColumnWidth(1, 150)
         layout.addWidget(self.table)
@@ -70,6 +72,14 @@ class PromptsManageDialog(QDialog):
         self.delete_button.setEnabled(False)
         buttons_layout.addWidget(self.delete_button)
         
+        self.batch_improve_button = QPushButton("Пакетное улучшение...")
+        self.batch_improve_button.setToolTip(
+            "Улучшить выбранные промты или все промты с тегом; "
+            "улучшенные версии сохраняются как новые промты"
+        )
+        self.batch_improve_button.clicked.connect(self.on_batch_improve)
+        buttons_layout.addWidget(self.batch_improve_button)
+        
         buttons_layout.addStretch()
         
         close_button = QPushButton("Закрыть")
@@ -142,6 +152,15 @@ class PromptsManageDialog(QDialog):
                     self.load_prompts()
                     QMessageBox.information(self, "Успех", "Промт обновлен!")
     
+    def on_batch_improve(self):
+        """Пакетное улучшение выбранных промтов или промтов с тегом"""
+        prompt_ids = [int(self.table.item(index.row(), 0).text())
+                      for index in self.table.selectionModel().selectedRows()]
+        from batch_improvement_dialog import BatchImprovementDialog
+        dialog = BatchImprovementDialog(self, self.db, prompt_ids)
+        dialog.exec_()
+        self.load_prompts()
+    
     def on_delete(self):
         """Удалить выбранный промт"""
         current_row = self.table.currentRow()
@@ -253,7 +272,9 @@ class ModelsManageDialog(QDialog):
                             api_id=data['api_id'],
                             api_key_env_var=data['api_key_env_var'],
                             model_type=data['model_type'],
-                            is_active=data['is_active']
+                            is_active=data['is_active'],
+                            prompt_price=data['prompt_price'],
+                            completion_price=data['completion_price']
                         )
                         self.load_models()
                         QMessageBox.information(self, "Успех", "Модель обновлена!")
@@ -320,6 +341,19 @@ class ResultsDialog(QDialog):
         self.sort_combo.currentTextChanged.connect(self.load_results)
         search_layout.addWidget(self.sort_combo)
         
+        # По умолчанию период ограничен: архивные месяцы читаются, только
+        # если пользователь выбрал более давний период
+        search_layout.addWidget(QLabel("Период:"))
+        # Данные пункта: (число дней или None, читать ли архив)
+        self.period_combo = QComboBox()
+        self.period_combo.addItem("Все результаты (без архива)", (None, False))
+        self.period_combo.addItem("Последние 7 дней", (7, False))
+        self.period_combo.addItem("Последние 30 дней", (30, False))
+        self.period_combo.addItem("Последний год", (365, False))
+        self.period_combo.addItem("Все время (с архивом)", (None, True))
+        self.period_combo.currentIndexChanged.connect(self.load_results)
+        search_layout.addWidget(self.period_combo)
+        
         layout.addLayout(search_layout)
         
         # Таблица результатов
@@ -333,6 +367,12 @@ class ResultsDialog(QDialog):
         self.table.setColumnWidth(1, 200)
         self.table.setColumnWidth(2, 150)
         self.table.setColumnWidth(4, 150)
+        self.table.setWordWrap(True)  # Включить перенос слов
+        # Высота строки по умолчанию; видимые строки подгоняются под текст ответа
+        self.table.verticalHeader().setDefaultSectionSize(MIN_ROW_HEIGHT)
+        response_delegate = ResponseDelegate(self.table)
+        self.table.setItemDelegateForColumn(3, response_delegate)
+        self.row_heights = RowHeightFitter(self.table, 3, response_delegate)
         layout.addWidget(self.table)
         
         # Кнопки
@@ -375,28 +415,22 @@ class ResultsDialog(QDialog):
         }
         order_by = sort_mapping.get(sort_by, "created_at")
         
-        results = self.db.get_results(search=search if search else None, order_by=order_by)
+        days, include_archive = self.period_combo.currentData()
+        date_from = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d") if days else None
+        
+        results = self.db.get_results(search=search if search else None, order_by=order_by,
+                                      date_from=date_from, include_archive=include_archive)
         
         self.table.setRowCount(len(results))
-        self.table.setWordWrap(True)  # Включить перенос слов
-        self.table.verticalHeader().setDefaultSectionSize(100)  # Высота строки по умолчанию
         
         for row, result in enumerate(results):
             self.table.setItem(row, 0, QTableWidgetItem(str(result.get('id', ''))))
             self.table.setItem(row, 1, QTableWidgetItem(result.get('prompt_text', '')[:100]))
             self.table.setItem(row, 2, QTableWidgetItem(result.get('model_name', '')))
             
-            # Ответ с многострочным отображением
-            response_text = result.get('response_text', '')
-            response_item = QTableWidgetItem(response_text)
+            # Ответ с многострочным отображением (высоту строки подбирает RowHeightFitter)
+            response_item = QTableWidgetItem(result.get('response_text', ''))
             response_item.setTextAlignment(Qt.AlignTop | Qt.AlignLeft)
-            response_item.setFlags(response_item.flags() | Qt.TextWordWrap)
-            
-            # Вычисляем высоту строки на основе длины текста
-            text_lines = len(response_text.split('\n')) + (len(response_text) // 80)
-            min_height = max(100, min(300, text_lines * 25))
-            self.table.setRowHeight(row, min_height)
-            
             self.table.setItem(row, 3, response_item)
             self.table.setItem(row, 4, QTableWidgetItem(result.get('created_at', '')))
     
@@ -415,20 +449,9 @@ class ResultsDialog(QDialog):
             QMessageBox.warning(self, "Ошибка", "Нет результатов для экспорта!")
             return
         
-        # Получаем уникальные ID результатов
-        result_ids = set()
-        for row in selected_rows:
-            result_id = int(self.table.item(row, 0).text())
-            result_ids.add(result_id)
-        
-        # Загружаем полные данные результатов
-        results = []
-        for result_id in result_ids:
-            all_results = self.db.get_results()
-            for r in all_results:
-                if r['id'] == result_id:
-                    results.append(r)
-                    break
+        # Загружаем полные данные результатов одним запросом (в порядке таблицы)
+        result_ids = [int(self.table.item(row, 0).text()) for row in sorted(set(selected_rows))]
+        results = self.db.get_results_by_ids(result_ids)
         
         if not results:
             QMessageBox.warning(self, "Ошибка", "Не удалось загрузить результаты!")
@@ -473,20 +496,9 @@ class ResultsDialog(QDialog):
             QMessageBox.warning(self, "Ошибка", "Нет результатов для экспорта!")
             return
         
-        # Получаем уникальные ID результатов
-        result_ids = set()
-        for row in selected_rows:
-            result_id = int(self.table.item(row, 0).text())
-            result_ids.add(result_id)
-        
-        # Загружаем полные данные результатов
-        results = []
-        for result_id in result_ids:
-            all_results = self.db.get_results()
-            for r in all_results:
-                if r['id'] == result_id:
-                    results.append(r)
-                    break
+        # Загружаем полные данные результатов одним запросом (в порядке таблицы)
+        result_ids = [int(self.table.item(row, 0).text()) for row in sorted(set(selected_rows))]
+        results = self.db.get_results_by_ids(result_ids)
         
         if not results:
             QMessageBox.warning(self, "Ошибка", "Не удалось загрузить результаты!")
@@ -533,12 +545,219 @@ class ResultsDialog(QDialog):
                 QMessageBox.warning(self, "Ошибка", "Не удалось удалить результат!")
 
 
+class UsageStatsDialog(QDialog):
+    """Диалог просмотра статистики использования моделей по дням"""
+    
+    def __init__(self, parent=None, db=None):
+        super().__init__(parent)
+        self.db = db
+        self.setWindowTitle("Статистика использования")
+        self.setMinimumSize(900, 500)
+        self.init_ui()
+        self.load_stats()
+    
+    def init_ui(self):
+        layout = QVBoxLayout()
+        
+        self.table = QTableWidget()
+        self.table.setColumnCount(9)
+        self.table.setHorizontalHeaderLabels([
+            "Дата", "Модель", "Провайдер", "Запросов", "Ошибок",
+            "Входных токенов", "Выходных токенов", "Токенов/с", "Стоимость, USD"
+        ])
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setColumnWidth(1, 200)
+        layout.addWidget(self.table)
+        
+        self.total_label = QLabel()
+        layout.addWidget(self.total_label)
+        
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addStretch()
+        close_button = QPushButton("Закрыть")
+        close_button.clicked.connect(self.accept)
+        buttons_layout.addWidget(close_button)
+        layout.addLayout(buttons_layout)
+        
+        self.setLayout(layout)
+    
+    def load_stats(self):
+        """Загрузить статистику из БД"""
+        if not self.db:
+            return
+        
+        stats = self.db.get_usage_stats()
+        self.table.setRowCount(len(stats))
+        for row, stat in enumerate(stats):
+            tps = stat.get('tokens_per_second')
+            values = [
+                stat['day'],
+                stat['model_name'],
+                stat.get('provider') or '',
+                str(stat['requests']),
+                str(stat['errors']),
+                str(stat['prompt_tokens']),
+                str(stat['completion_tokens']),
+                f"{tps:.1f}" if tps else '',
+                f"{stat['cost']:.4f}"
+            ]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+        
+        total_cost = sum(stat['cost'] for stat in stats)
+        total_tokens = sum(stat['prompt_tokens'] + stat['completion_tokens'] for stat in stats)
+        self.total_label.setText(f"Всего токенов: {total_tokens}, стоимость: {total_cost:.4f} USD")
+
+
+class TimingsDialog(QDialog):
+    """Диалог с замерами времени запросов: текущей отправки или истории из БД"""
+    
+    COLUMNS = [
+        ("Модель", None), ("Статус", None), ("Соединение, мс", 'connect_time'),
+        ("TLS, мс", 'tls_time'), ("Первый байт, мс", 'ttfb'),
+        ("Первый токен, мс", 'ttft'), ("Всего, мс", 'total_time'),
+        ("Отправлено, байт", 'bytes_sent'), ("Получено, байт", 'bytes_received')
+    ]
+    
+    def __init__(self, parent=None, results: Optional[List[Dict]] = None, db=None):
+        super().__init__(parent)
+        self.results = results
+        self.db = db
+        self.setWindowTitle("Замеры времени запросов" if results is not None
+                            else "История задержек")
+        self.setMinimumSize(1000, 400)
+        self.init_ui()
+        self.load_timings()
+    
+    def init_ui(self):
+        layout = QVBoxLayout()
+        
+        self.table = QTableWidget()
+        self.table.setColumnCount(len(self.COLUMNS) + (1 if self.results is None else 0))
+        headers = [title for title, _ in self.COLUMNS]
+        if self.results is None:
+            headers.insert(0, "Дата")
+        self.table.setHorizontalHeaderLabels(headers)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        layout.addWidget(self.table)
+        
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addStretch()
+        close_button = QPushButton("Закрыть")
+        close_button.clicked.connect(self.accept)
+        buttons_layout.addWidget(close_button)
+        layout.addLayout(buttons_layout)
+        
+        self.setLayout(layout)
+    
+    def load_timings(self):
+        """Заполнить таблицу замерами"""
+        if self.results is not None:
+            rows = []
+            for result in self.results:
+                metadata = result.get('metadata') or {}
+                timing = dict(metadata.get('timing') or {})
+                timing['model_name'] = result.get('model_name', 'Unknown')
+                timing['status_code'] = metadata.get('status_code')
+                timing['success'] = result.get('success')
+                rows.append(timing)
+        elif self.db:
+            rows = self.db.get_request_timings()
+        else:
+            return
+        
+        self.table.setRowCount(len(rows))
+        offset = 1 if self.results is None else 0
+        for row, timing in enumerate(rows):
+            if offset:
+                self.table.setItem(row, 0, QTableWidgetItem(timing.get('created_at', '')))
+            status = timing.get('status_code')
+            status_text = str(status) if status else ("OK" if timing.get('success') else "Ошибка")
+            self.table.setItem(row, offset, QTableWidgetItem(timing.get('model_name', '')))
+            self.table.setItem(row, offset + 1, QTableWidgetItem(status_text))
+            for column, (_, key) in enumerate(self.COLUMNS[2:], offset + 2):
+                value = timing.get(key)
+                if value is None:
+                    text = ""
+                elif key.startswith('bytes'):
+                    text = str(value)
+                else:
+                    text = f"{value * 1000:.0f}"
+                item = QTableWidgetItem(text)
+                item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
+
+
+def run_maintenance(db) -> dict:
+    """Обслужить БД и запомнить время успешного обслуживания (last_maintenance)"""
+    report = db.run_maintenance()
+    db.set_setting("last_maintenance", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    return report
+
+
+class MaintenanceThread(QThread):
+    """
+    Поток обслуживания БД (со своим соединением из Database)
+    
+    Кроме обслуживания выполняет и другие долгие операции с БД (архивирование,
+    правила хранения, перевод в auto_vacuum=INCREMENTAL), чтобы они не
+    задерживали очередь ResultWriter.
+    """
+    finished = pyqtSignal(dict)
+    
+    # Как часто (в шагах виртуальной машины SQLite) проверять отмену
+    CANCEL_CHECK_STEPS = 1000
+    
+    def __init__(self, db, task: Optional[Callable[[object], dict]] = None):
+        """
+        Args:
+            db: База данных
+            task: Функция (db) -> отчет; по умолчанию run_maintenance
+        """
+        super().__init__()
+        self.db = db
+        self.task = task or run_maintenance
+        self._cancelled = False
+    
+    def cancel(self):
+        """Прервать операцию: текущий запрос SQLite завершится ошибкой, транзакция откатится"""
+        self._cancelled = True
+    
+    def run(self):
+        conn = None
+        try:
+            conn = self.db.conn
+            # Ненулевой результат обработчика прерывает выполняемый запрос
+            conn.set_progress_handler(lambda: self._cancelled, self.CANCEL_CHECK_STEPS)
+            report = self.task(self.db)
+        except Exception as e:
+            report = {'error': str(e)}
+        finally:
+            if conn is not None:
+                conn.set_progress_handler(None, 0)
+            self.db.release_connection()
+        self.finished.emit(report)
+
+
 class SettingsDialog(QDialog):
     """Диалог настроек программы"""
     
-    def __init__(self, parent=None, db=None):
+    def __init__(self, parent=None, db=None, task_runner=None):
+        """
+        Args:
+            parent: Родительский виджет
+            db: База данных
+            task_runner: Главное окно: выполняет долгие операции с БД по одной
+                (start_db_task); без него обслуживание из настроек недоступно
+        """
         super().__init__(parent)
         self.db = db
+        self.task_runner = task_runner
+        self.own_task = False  # Идущая операция запущена из этого окна
         self.setWindowTitle("Настройки")
         self.setMinimumSize(400, 250)
         self.init_ui()
@@ -568,6 +787,77 @@ class SettingsDialog(QDialog):
         font_layout.addLayout(font_hbox)
         layout.addLayout(font_layout)
         
+        # Потоковый вывод ответов
+        self.stream_checkbox = QCheckBox("Показывать ответы по мере получения (потоковый вывод)")
+        layout.addWidget(self.stream_checkbox)
+        
+        # Сохранение результатов
+        saving_group = QGroupBox("Сохранение результатов")
+        saving_layout = QVBoxLayout()
+        
+        self.auto_save_checkbox = QCheckBox("Сохранять ответы автоматически по мере получения")
+        saving_layout.addWidget(self.auto_save_checkbox)
+        self.auto_save_errors_checkbox = QCheckBox("Сохранять и ответы с ошибками")
+        self.auto_save_checkbox.toggled.connect(self.auto_save_errors_checkbox.setEnabled)
+        saving_layout.addWidget(self.auto_save_errors_checkbox)
+        
+        saving_layout.addWidget(QLabel("Надежность сохранения:"))
+        self.durability_combo = QComboBox()
+        self.durability_combo.addItem("Быстро (без сброса на диск)", "fast")
+        self.durability_combo.addItem("Обычная (рекомендуется)", "normal")
+        self.durability_combo.addItem("Максимальная (сброс на диск при каждой записи)", "full")
+        saving_layout.addWidget(self.durability_combo)
+        
+        # Правила хранения (0 — без ограничения)
+        keep_layout = QHBoxLayout()
+        keep_layout.addWidget(QLabel("Хранить последних ответов на промт и модель (0 — все):"))
+        self.keep_last_spin = QSpinBox()
+        self.keep_last_spin.setRange(0, 100000)
+        keep_layout.addWidget(self.keep_last_spin)
+        saving_layout.addLayout(keep_layout)
+        
+        age_layout = QHBoxLayout()
+        age_layout.addWidget(QLabel("Удалять ответы старше, дней (0 — не удалять):"))
+        self.max_age_spin = QSpinBox()
+        self.max_age_spin.setRange(0, 36500)
+        age_layout.addWidget(self.max_age_spin)
+        saving_layout.addLayout(age_layout)
+        
+        archive_layout = QHBoxLayout()
+        archive_layout.addWidget(QLabel("Переносить в архив ответы старше, дней (0 — не переносить):"))
+        self.archive_after_spin = QSpinBox()
+        self.archive_after_spin.setRange(0, 36500)
+        archive_layout.addWidget(self.archive_after_spin)
+        saving_layout.addLayout(archive_layout)
+        
+        saving_group.setLayout(saving_layout)
+        layout.addWidget(saving_group)
+        
+        # Обслуживание БД (обычно выполняется автоматически раз в сутки)
+        maintenance_layout = QHBoxLayout()
+        self.maintenance_button = QPushButton("Обслужить базу данных")
+        self.maintenance_button.setToolTip(
+            "Удалить неиспользуемые тексты ответов, обновить статистику запросов, "
+            "вернуть свободное место и перенести журнал WAL в файл БД"
+        )
+        self.maintenance_button.clicked.connect(self.on_maintenance)
+        maintenance_layout.addWidget(self.maintenance_button)
+        # Перевод старой БД в режим возврата свободного места (VACUUM всей БД)
+        self.vacuum_mode_button = QPushButton("Включить возврат свободного места")
+        self.vacuum_mode_button.setToolTip(
+            "Однократно перестроить файл БД, чтобы обслуживание могло возвращать "
+            "свободное место; запись на это время приостанавливается"
+        )
+        self.vacuum_mode_button.clicked.connect(self.on_enable_incremental_vacuum)
+        maintenance_layout.addWidget(self.vacuum_mode_button)
+        self.maintenance_label = QLabel("")
+        maintenance_layout.addWidget(self.maintenance_label, 1)
+        layout.addLayout(maintenance_layout)
+        if self.task_runner is not None:
+            self.task_runner.db_task_started.connect(self.update_maintenance_buttons)
+            self.task_runner.db_task_finished.connect(self.on_maintenance_finished)
+        self.update_maintenance_buttons()
+        
         layout.addStretch()
         
         # Кнопки
@@ -578,6 +868,65 @@ class SettingsDialog(QDialog):
         
         self.setLayout(layout)
     
+    def update_maintenance_buttons(self):
+        """Кнопки обслуживания доступны, пока не выполняется другая операция с БД"""
+        available = self.db is not None and self.task_runner is not None
+        idle = available and not self.task_runner.db_task_running()
+        self.maintenance_button.setEnabled(idle)
+        self.vacuum_mode_button.setVisible(available and not self.db.incremental_vacuum_enabled())
+        self.vacuum_mode_button.setEnabled(idle)
+    
+    def on_maintenance(self):
+        """Обработчик кнопки 'Обслужить базу данных'"""
+        self._start_task(self.task_runner.start_db_task, "Обслуживание...")
+    
+    def on_enable_incremental_vacuum(self):
+        """Обработчик кнопки 'Включить возврат свободного места'"""
+        reply = QMessageBox.question(
+            self, "Подтверждение",
+            "Файл базы данных будет перестроен целиком. Для большой БД это может "
+            "занять несколько минут; сохранение результатов на это время "
+            "приостанавливается. Продолжить?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            self._start_task(self.task_runner.start_incremental_vacuum_conversion,
+                             "Перестройка базы данных...")
+    
+    def _start_task(self, start: Callable[[], bool], status: str):
+        if not start():
+            self.maintenance_label.setText("Выполняется другая операция с базой данных")
+            return
+        self.own_task = True
+        self.maintenance_label.setText(status)
+    
+    def on_maintenance_finished(self, report: dict):
+        """Показать итог операции с БД, запущенной из этого окна"""
+        self.update_maintenance_buttons()
+        if not self.own_task:
+            return
+        self.own_task = False
+        if 'error' in report:
+            self.maintenance_label.setText(f"Ошибка: {report['error']}")
+        elif 'vacuum_seconds' in report:
+            self.maintenance_label.setText(
+                f"База данных перестроена за {report['vacuum_seconds']:.1f} с"
+            )
+        else:
+            total_ms = sum(report['timings'].values()) * 1000
+            self.maintenance_label.setText(
+                f"Готово за {total_ms:.0f} мс: освобождено страниц {report['freed_pages']}, "
+                f"удалено неиспользуемых ответов {report['orphan_blobs']}"
+            )
+    
+    def done(self, result: int):
+        """Закрыть диалог; начатая операция с БД продолжается в главном окне"""
+        if self.task_runner is not None:
+            self.task_runner.db_task_started.disconnect(self.update_maintenance_buttons)
+            self.task_runner.db_task_finished.disconnect(self.on_maintenance_finished)
+            self.task_runner = None
+        super().done(result)
+    
     def load_settings(self):
         """Загрузить текущие настройки из БД"""
         if not self.db:
@@ -596,6 +945,25 @@ class SettingsDialog(QDialog):
             self.font_size_spin.setValue(int(font_size))
         except ValueError:
             self.font_size_spin.setValue(10)
+        
+        # Загружаем режим потокового вывода
+        self.stream_checkbox.setChecked(self.db.get_setting("stream_responses", "false") == "true")
+        
+        # Загружаем настройки сохранения результатов
+        self.auto_save_checkbox.setChecked(self.db.get_setting("auto_save", "false") == "true")
+        self.auto_save_errors_checkbox.setChecked(
+            self.db.get_setting("auto_save_errors", "false") == "true"
+        )
+        self.auto_save_errors_checkbox.setEnabled(self.auto_save_checkbox.isChecked())
+        index = self.durability_combo.findData(self.db.get_setting("write_durability", "normal"))
+        self.durability_combo.setCurrentIndex(max(index, 0))
+        for spin, key in ((self.keep_last_spin, "retention_keep_last"),
+                          (self.max_age_spin, "retention_max_age_days"),
+                          (self.archive_after_spin, "archive_after_days")):
+            try:
+                spin.setValue(int(self.db.get_setting(key, "0")))
+            except ValueError:
+                spin.setValue(0)
     
     def get_settings(self) -> dict:
         """Получить выбранные настройки"""
@@ -603,7 +971,14 @@ class SettingsDialog(QDialog):
         font_size = str(self.font_size_spin.value())
         return {
             "theme": theme,
-            "font_size": font_size
+            "font_size": font_size,
+            "stream_responses": "true" if self.stream_checkbox.isChecked() else "false",
+            "auto_save": "true" if self.auto_save_checkbox.isChecked() else "false",
+            "auto_save_errors": "true" if self.auto_save_errors_checkbox.isChecked() else "false",
+            "write_durability": self.durability_combo.currentData(),
+            "retention_keep_last": str(self.keep_last_spin.value()),
+            "retention_max_age_days": str(self.max_age_spin.value()),
+            "archive_after_days": str(self.archive_after_spin.value())
         }
     
     def save_settings(self):
@@ -614,6 +989,10 @@ class SettingsDialog(QDialog):
         settings = self.get_settings()
         self.db.set_setting("theme", settings["theme"])
         self.db.set_setting("font_size", settings["font_size"])
+        self.db.set_setting("stream_responses", settings["stream_responses"])
+        for key in ("auto_save", "auto_save_errors", "write_durability",
+                    "retention_keep_last", "retention_max_age_days", "archive_after_days"):
+            self.db.set_setting(key, settings[key])
 
 
 class AboutDialog(QDialog):
@@ -1,21 +1,73 @@
 """Основной модуль GUI интерфейса ChatList"""
 import sys
-from typing import List, Dict, Optional
+import startup_profile
+
+# Профилирование запуска включается до остальных импортов, чтобы замерить и их
+if '--profile-startup' in sys.argv:
+    startup_profile.install()
+
+from typing import Callable, List, Dict, Optional, TYPE_CHECKING
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QTextEdit, QComboBox, QPushButton, QTableWidget, QTableWidgetItem,
+    QTextEdit, QComboBox, QPushButton, QTableView,
     QCheckBox, QMenuBar, QMenu, QMessageBox, QDialog, QLabel,
     QLineEdit, QDialogButtonBox, QHeaderView, QAbstractItemView,
     QProgressBar
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QPoint
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QPoint, QTimer
 from PyQt5.QtGui import QFont, QColor, QIcon
 from PyQt5.QtWidgets import QApplication
 from db import Database
-from network import NetworkManager
+from result_writer import ResultWriter, DEFAULT_DURABILITY
+from results_view import (
+    COLUMN_RESPONSE, MIN_ROW_HEIGHT, ResponseDelegate, ResultsTableModel, RowHeightFitter
+)
 from version import __version__
+from datetime import datetime, timedelta
 import logging
 import os
+import time
+
+if TYPE_CHECKING:
+    from network import NetworkManager
+
+# Как часто применять правила хранения результатов (мс)
+RETENTION_INTERVAL_MS = 15 * 60 * 1000
+
+# Первое применение правил хранения — вскоре после запуска, не мешая ему (мс)
+RETENTION_STARTUP_DELAY_MS = 60 * 1000
+
+# Как часто проверять, не пора ли обслужить БД (мс)
+MAINTENANCE_CHECK_INTERVAL_MS = 30 * 60 * 1000
+
+# Первая проверка после запуска (мс)
+MAINTENANCE_STARTUP_DELAY_MS = 2 * 60 * 1000
+
+# Если идет отправка запросов, обслуживание откладывается на столько (мс)
+MAINTENANCE_RETRY_MS = 60 * 1000
+
+# Минимальный промежуток между обслуживаниями БД (часы)
+MAINTENANCE_PERIOD_HOURS = 24
+
+
+def result_record(result: Dict, prompt_id: Optional[int], model_id: Optional[int],
+                  prompt_text: str) -> Dict:
+    """Запись для Database.save_results из результата NetworkManager"""
+    metadata = result.get('metadata')
+    if result.get('success'):
+        response_text = result.get('response') or ''
+    else:
+        # Ошибочный ответ: текст ошибки сохраняется вместо ответа
+        response_text = result.get('error') or ''
+        metadata = dict(metadata or {}, error=response_text)
+    return {
+        'prompt_id': prompt_id,
+        'model_id': model_id,
+        'prompt_text': prompt_text,
+        'model_name': result.get('model_name', 'Unknown'),
+        'response_text': response_text,
+        'metadata': metadata
+    }
 
 
 class SendRequestThread(QThread):
@@ -23,19 +75,25 @@ class SendRequestThread(QThread):
     finished = pyqtSignal(list)
     progress = pyqtSignal(str)
     error = pyqtSignal(str)
+    delta = pyqtSignal(int, str)  # Индекс модели и фрагмент потокового ответа
     
-    def __init__(self, network_manager: NetworkManager, prompt: str, models: List):
+    def __init__(self, network_manager: 'NetworkManager', prompt: str, models: List,
+                 stream: bool = False, on_result: Optional[Callable[[Dict], None]] = None):
         super().__init__()
         self.network_manager = network_manager
         self.prompt = prompt
         self.models = models
+        self.stream = stream
+        self.on_result = on_result  # Вызывается в этом потоке с каждым полученным результатом
     
     def run(self):
         """Выполнить запросы в отдельном потоке"""
         try:
             self.progress.emit("Отправка запросов...")
             logging.info(f"Отправка промта в {len(self.models)} моделей")
-            results = self.network_manager.send_to_all_models(self.prompt, self.models)
+            on_delta = self.delta.emit if self.stream else None
+            results = self.network_manager.send_to_all_models(self.prompt, self.models, on_delta,
+                                                              self.on_result)
             logging.info(f"Получено {len(results)} результатов")
             self.finished.emit(results)
         except Exception as e:
@@ -134,6 +192,15 @@ class ModelDialog(QDialog):
         self.model_type_edit = QLineEdit()
         layout.addWidget(self.model_type_edit)
         
+        # Цены для расчета стоимости запросов
+        layout.addWidget(QLabel("Цена за 1M входных токенов, USD (необязательно):"))
+        self.prompt_price_edit = QLineEdit()
+        layout.addWidget(self.prompt_price_edit)
+        
+        layout.addWidget(QLabel("Цена за 1M выходных токенов, USD (необязательно):"))
+        self.completion_price_edit = QLineEdit()
+        layout.addWidget(self.completion_price_edit)
+        
         # Активна
         self.is_active_checkbox = QCheckBox("Активна")
         self.is_active_checkbox.setChecked(True)
@@ -156,6 +223,10 @@ class ModelDialog(QDialog):
             self.api_key_env_var_edit.setText(self.model_data.get('api_key_env_var', ''))
             self.model_type_edit.setText(self.model_data.get('model_type', ''))
             self.is_active_checkbox.setChecked(bool(self.model_data.get('is_active', 1)))
+            for edit, key in ((self.prompt_price_edit, 'prompt_price'),
+                              (self.completion_price_edit, 'completion_price')):
+                if self.model_data.get(key) is not None:
+                    edit.setText(str(self.model_data[key]))
     
     def get_data(self) -> Dict:
         """Получить данные из диалога"""
@@ -165,8 +236,18 @@ class ModelDialog(QDialog):
             'api_id': self.api_id_edit.text().strip(),
             'api_key_env_var': self.api_key_env_var_edit.text().strip(),
             'model_type': self.model_type_edit.text().strip().lower(),
-            'is_active': 1 if self.is_active_checkbox.isChecked() else 0
+            'is_active': 1 if self.is_active_checkbox.isChecked() else 0,
+            'prompt_price': self._parse_price(self.prompt_price_edit.text()),
+            'completion_price': self._parse_price(self.completion_price_edit.text())
         }
+    
+    @staticmethod
+    def _parse_price(text: str) -> Optional[float]:
+        """Преобразовать введенную цену в число (None, если поле пустое или некорректное)"""
+        try:
+            return float(text.strip().replace(',', '.'))
+        except ValueError:
+            return None
 
 
 
@@ -174,16 +255,89 @@ class ModelDialog(QDialog):
 class MainWindow(QMainWindow):
     """Главное окно приложения"""
     
-    def __init__(self):
+    # Изменение настройки (ключ, новое значение) — из любого потока,
+    # обработчики вызываются в главном потоке
+    settings_changed = pyqtSignal(str, str)
+    
+    # Ошибка фоновой записи в БД (из потока ResultWriter)
+    write_failed = pyqtSignal(str)
+    
+    # Начало и завершение (отчет) долгой операции с БД (start_db_task)
+    db_task_started = pyqtSignal()
+    db_task_finished = pyqtSignal(dict)
+    
+    # Настройки, влияющие на внешний вид окна
+    APPEARANCE_SETTINGS = ("theme", "font_size")
+    
+    # Правила хранения и архивирования результатов
+    RETENTION_SETTINGS = ("retention_keep_last", "retention_max_age_days", "archive_after_days")
+    
+    def __init__(self, db: Optional[Database] = None):
         super().__init__()
-        self.db = Database()
-        self.network_manager = NetworkManager()
+        self.db = db or Database()
+        startup_profile.mark("База данных открыта")
+        self._network_manager: Optional['NetworkManager'] = None
         self.temp_results: List[Dict] = []  # Временное хранилище результатов
         self.current_prompt_id: Optional[int] = None
+        # Потоковый вывод: накопленный текст по индексу модели, строки с
+        # изменениями, ожидающие перерисовки, и открытые окна просмотра
+        self.stream_texts: List[str] = []
+        self.stream_model_names: List[str] = []
+        self.stream_dirty_rows = set()
+        self.stream_viewers: Dict[int, object] = {}
+        self.stream_throttle = None
+        
+        # Несколько настроек, сохраненных подряд, применяются одним проходом
+        self.apply_settings_timer = QTimer(self)
+        self.apply_settings_timer.setSingleShot(True)
+        self.apply_settings_timer.timeout.connect(self.apply_settings)
+        self.settings_changed.connect(self.on_setting_changed)
+        self._settings_listener = self.settings_changed.emit
+        self.db.add_settings_listener(self._settings_listener)
+        
+        # Результаты и статистика записываются в БД в фоновом потоке
+        self.write_failed.connect(self.on_write_failed)
+        self.result_writer = ResultWriter(
+            self.db,
+            durability=self.db.get_setting("write_durability", DEFAULT_DURABILITY),
+            on_error=self.write_failed.emit
+        )
+        
+        # Статистика использования учитывает все запросы, ушедшие в сеть
+        # (главное окно, ассистент, пакетное улучшение). Модуль network
+        # загружается после показа окна, до первой возможной отправки
+        self._usage_listener = lambda result: self.result_writer.record_usage([result])
+        QTimer.singleShot(0, self.register_usage_listener)
+        
+        # Архивирование, правила хранения и обслуживание БД выполняются
+        # в отдельном потоке (start_db_task), по одной операции
+        self.db_task_thread = None
+        
+        # Правила хранения результатов применяются в фоне по таймеру
+        self.retention_timer = QTimer(self)
+        self.retention_timer.timeout.connect(self.apply_retention)
+        self.retention_timer.start(RETENTION_STARTUP_DELAY_MS)
+        
+        # Обслуживание БД (ANALYZE, incremental_vacuum, контрольная точка WAL),
+        # пока программа простаивает
+        self.maintenance_timer = QTimer(self)
+        self.maintenance_timer.timeout.connect(self.on_maintenance_timer)
+        self.maintenance_timer.start(MAINTENANCE_STARTUP_DELAY_MS)
         
         self.init_ui()
+        startup_profile.mark("Интерфейс построен")
         self.load_prompts()
+        startup_profile.mark("Промты загружены")
         self.apply_settings()  # Применяем настройки при запуске
+        startup_profile.mark("Настройки применены")
+    
+    @property
+    def network_manager(self) -> 'NetworkManager':
+        """Менеджер сетевых запросов (модули network и models загружаются при первой отправке)"""
+        if self._network_manager is None:
+            from network import NetworkManager
+            self._network_manager = NetworkManager()
+        return self._network_manager
     
     def init_ui(self):
         """Инициализация интерфейса"""
@@ -229,15 +383,21 @@ class MainWindow(QMainWindow):
         self.progress_bar.setVisible(False)
         main_layout.addWidget(self.progress_bar)
         
-        # Таблица результатов
-        self.results_table = QTableWidget()
-        self.results_table.setColumnCount(3)
-        self.results_table.setHorizontalHeaderLabels(["Выбрать", "Модель", "Ответ"])
+        # Таблица результатов: отметки хранятся в модели, ответы рисует делегат
+        self.results_model = ResultsTableModel(self)
+        self.results_model.checked_changed.connect(self.on_checkbox_changed)
+        self.results_table = QTableView()
+        self.results_table.setModel(self.results_model)
+        response_delegate = ResponseDelegate(self.results_table)
+        self.results_table.setItemDelegateForColumn(COLUMN_RESPONSE, response_delegate)
+        self.results_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.results_table.horizontalHeader().setStretchLastSection(True)
         self.results_table.setColumnWidth(0, 80)
         self.results_table.setColumnWidth(1, 150)
         # Настройка для многострочного отображения в колонке "Ответ"
-        self.results_table.verticalHeader().setDefaultSectionSize(100)  # Высота строки по умолчанию
+        # Высота строки по умолчанию; видимые строки подгоняются под текст ответа
+        self.results_table.verticalHeader().setDefaultSectionSize(MIN_ROW_HEIGHT)
+        self.results_row_heights = RowHeightFitter(self.results_table, COLUMN_RESPONSE, response_delegate)
         self.results_table.setWordWrap(True)  # Включить перенос слов
         self.results_table.setSelectionBehavior(QAbstractItemView.SelectRows)  # Выбор целой строки
         main_layout.addWidget(self.results_table)
@@ -255,6 +415,11 @@ class MainWindow(QMainWindow):
         self.open_button.setEnabled(False)
         buttons_layout.addWidget(self.open_button)
         
+        self.timings_button = QPushButton("Замеры времени")
+        self.timings_button.clicked.connect(self.on_show_timings)
+        self.timings_button.setEnabled(False)
+        buttons_layout.addWidget(self.timings_button)
+        
         self.clear_button = QPushButton("Очистить")
         self.clear_button.clicked.connect(self.on_clear_clicked)
         buttons_layout.addWidget(self.clear_button)
@@ -263,7 +428,7 @@ class MainWindow(QMainWindow):
         main_layout.addLayout(buttons_layout)
         
         # Подключаем обработчик выбора строки для активации кнопки "Открыть"
-        self.results_table.itemSelectionChanged.connect(self.on_selection_changed)
+        self.results_table.selectionModel().selectionChanged.connect(self.on_selection_changed)
         
         # Статусная строка
         self.statusBar().showMessage("Готово")
@@ -288,6 +453,8 @@ class MainWindow(QMainWindow):
         # Меню "Результаты"
         results_menu = menubar.addMenu("Результаты")
         results_menu.addAction("Просмотр результатов", self.on_view_results)
+        results_menu.addAction("Статистика использования", self.on_view_usage_stats)
+        results_menu.addAction("История задержек", self.on_view_timings_history)
         
         # Меню "Настройки"
         settings_menu = menubar.addMenu("Настройки")
@@ -360,25 +527,13 @@ class MainWindow(QMainWindow):
         
         # Очищаем временную таблицу
         self.temp_results.clear()
-        self.results_table.setRowCount(0)
+        self.results_model.clear()
         self.save_button.setEnabled(False)
+        self.timings_button.setEnabled(False)
         
-        # Получаем активные модели
-        models_data = self.db.get_active_models()
-        if not models_data:
-            QMessageBox.warning(self, "Ошибка", "Нет активных моделей! Добавьте модели в меню 'Модели'.")
-            return
-        
-        # Создаем экземпляры моделей
-        from models import ModelFactory
-        models = []
-        for model_data in models_data:
-            model = ModelFactory.create_model_from_db(model_data)
-            if model:
-                models.append(model)
-        
-        if not models:
-            QMessageBox.warning(self, "Ошибка", "Не удалось загрузить модели!")
+        # Получаем экземпляры активных моделей (из кэша, пока модели не менялись)
+        models = self.active_models()
+        if models is None:
             return
         
         # Отправляем запросы в отдельном потоке
@@ -387,12 +542,87 @@ class MainWindow(QMainWindow):
         self.progress_bar.setVisible(True)
         self.progress_bar.setRange(0, 0)  # Неопределенный прогресс
         
-        self.request_thread = SendRequestThread(self.network_manager, prompt_text, models)
+        stream = self.db.get_setting("stream_responses", "false") == "true"
+        if stream:
+            self.start_streaming_view(models)
+        
+        self.request_thread = SendRequestThread(self.network_manager, prompt_text, models, stream,
+                                                self.make_auto_saver(prompt_text))
+        self.request_thread.delta.connect(self.on_stream_delta)
         self.request_thread.finished.connect(self.on_requests_finished)
         self.request_thread.progress.connect(self.statusBar().showMessage)
         self.request_thread.error.connect(self.on_request_error)
         self.request_thread.start()
     
+    def make_auto_saver(self, prompt_text: str) -> Optional[Callable[[Dict], None]]:
+        """
+        Функция автосохранения результатов по мере получения
+        
+        Вызывается в потоке запросов и только ставит запись в очередь
+        ResultWriter. Возвращает None, если автосохранение выключено.
+        """
+        if self.db.get_setting("auto_save", "false") != "true":
+            return None
+        save_errors = self.db.get_setting("auto_save_errors", "false") == "true"
+        prompt_id = self.current_prompt_id
+        model_ids = {m['name']: m['id'] for m in self.db.get_all_models()}
+        writer = self.result_writer
+        
+        def save(result: Dict):
+            if not result.get('success') and not save_errors:
+                return
+            model_id = model_ids.get(result.get('model_name'))
+            writer.save_results([result_record(result, prompt_id, model_id, prompt_text)])
+            result['saved'] = True  # Повторно по кнопке "Сохранить выбранные" не сохраняется
+        
+        return save
+    
+    def start_streaming_view(self, models: List):
+        """Подготовить таблицу к потоковому выводу: строка на каждую модель"""
+        from markdown_viewer import FrameThrottle
+        if self.stream_throttle is None:
+            self.stream_throttle = FrameThrottle(self.flush_stream_updates, parent=self)
+        
+        self.stream_texts = [""] * len(models)
+        self.stream_model_names = [model.name for model in models]
+        self.stream_dirty_rows.clear()
+        
+        self.results_model.start_streaming(self.stream_model_names)
+    
+    def on_stream_delta(self, index: int, delta: str):
+        """Обработчик фрагмента потокового ответа"""
+        if index >= len(self.stream_texts):
+            return
+        self.stream_texts[index] += delta
+        self.stream_dirty_rows.add(index)
+        # Таблица перерисовывается не чаще одного раза за кадр
+        self.stream_throttle.request()
+        viewer = self.stream_viewers.get(index)
+        if viewer is not None:
+            viewer.append_markdown(delta)
+    
+    def flush_stream_updates(self):
+        """Обновить в таблице строки, в которые пришли новые фрагменты"""
+        for row in self.stream_dirty_rows:
+            self.results_model.set_response_text(row, self.stream_texts[row])
+        self.stream_dirty_rows.clear()
+    
+    def stop_streaming_view(self, results: Optional[List[Dict]] = None):
+        """Завершить потоковый вывод; открытые окна просмотра получают итоговый текст"""
+        if self.stream_throttle is not None:
+            self.stream_throttle.cancel()
+        results_by_model = {r.get('model_name'): r for r in results or []}
+        for index, viewer in self.stream_viewers.items():
+            result = results_by_model.get(self.stream_model_names[index])
+            if result is not None:
+                viewer.finish_streaming(self.result_markdown(result))
+            else:
+                viewer.finish_streaming()
+        self.stream_viewers.clear()
+        self.stream_texts = []
+        self.stream_model_names = []
+        self.stream_dirty_rows.clear()
+    
     def on_requests_finished(self, results: List[Dict]):
         """Обработчик завершения запросов"""
         self.send_button.setEnabled(True)
@@ -400,7 +630,16 @@ class MainWindow(QMainWindow):
         self.statusBar().showMessage(f"Запросы завершены. Получено ответов: {len(results)}")
         
         # Сохраняем результаты во временное хранилище
+        received_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        for result in results:
+            result.setdefault('received_at', received_at)
         self.temp_results = results
+        self.stop_streaming_view(results)
+        
+        # Токены, задержку и стоимость учитывает обработчик запросов
+        # (register_usage_listener); здесь — замеры времени этой отправки
+        self.result_writer.record_timings(results, self.current_prompt_id)
+        self.timings_button.setEnabled(bool(results))
         
         # Подсчитываем успешные и неуспешные запросы
         success_count = sum(1 for r in results if r.get('success'))
@@ -412,50 +651,11 @@ class MainWindow(QMainWindow):
             )
         
         # Отображаем результаты в таблице
-        self.results_table.setRowCount(len(results))
-        for row, result in enumerate(results):
-            # Чекбокс
-            checkbox = QCheckBox()
-            self.results_table.setCellWidget(row, 0, checkbox)
-            checkbox.stateChanged.connect(self.on_checkbox_changed)
-            
-            # Модель
-            model_item = QTableWidgetItem(result.get('model_name', 'Unknown'))
-            self.results_table.setItem(row, 1, model_item)
-            
-            # Ответ (многострочное поле)
-            if result.get('success'):
-                response_text = result.get('response', 'Нет ответа')
-                response_item = QTableWidgetItem(response_text)
-                response_item.setForeground(Qt.darkGreen)  # Зеленый цвет для успешных ответов
-            else:
-                error_msg = result.get('error', 'Неизвестная ошибка')
-                response_text = f"❌ {error_msg}"
-                response_item = QTableWidgetItem(response_text)
-                response_item.setForeground(Qt.red)  # Красный цвет для ошибок
-            
-            # Настройка многострочного отображения
-            response_item.setTextAlignment(Qt.AlignTop | Qt.AlignLeft)  # Выравнивание по верху и слева
-            response_item.setFlags(response_item.flags() | Qt.TextWordWrap)  # Разрешить перенос слов
-            
-            # Вычисляем высоту строки на основе длины текста
-            text_lines = len(response_text.split('\n')) + (len(response_text) // 80)  # Примерно 80 символов на строку
-            min_height = max(100, min(300, text_lines * 25))  # Минимум 100, максимум 300 пикселей
-            self.results_table.setRowHeight(row, min_height)
-            
-            self.results_table.setItem(row, 2, response_item)
-        
-        self.on_checkbox_changed()  # Обновляем состояние кнопки сохранения
+        self.results_model.set_results(results)
     
     def on_checkbox_changed(self):
-        """Обработчик изменения чекбоксов"""
-        has_selected = False
-        for row in range(self.results_table.rowCount()):
-            checkbox = self.results_table.cellWidget(row, 0)
-            if checkbox and checkbox.isChecked():
-                has_selected = True
-                break
-        self.save_button.setEnabled(has_selected)
+        """Обработчик изменения отметок результатов"""
+        self.save_button.setEnabled(self.results_model.checked_count > 0)
     
     def on_save_clicked(self):
         """Обработчик кнопки 'Сохранить выбранные'"""
@@ -470,38 +670,38 @@ class MainWindow(QMainWindow):
         
         # Собираем выбранные результаты
         results_to_save = []
+        already_saved = 0
         # Получаем словарь моделей для поиска ID по имени
         all_models = {m['name']: m['id'] for m in self.db.get_all_models()}
         
-        for row in range(self.results_table.rowCount()):
-            checkbox = self.results_table.cellWidget(row, 0)
-            if checkbox and checkbox.isChecked():
-                result = self.temp_results[row]
-                if result.get('success'):
-                    model_name = result.get('model_name', 'Unknown')
-                    model_id = all_models.get(model_name)
-                    results_to_save.append({
-                        'prompt_id': self.current_prompt_id,
-                        'model_id': model_id,
-                        'prompt_text': prompt_text,
-                        'model_name': model_name,
-                        'response_text': result.get('response', ''),
-                        'metadata': None
-                    })
+        for row in self.results_model.checked_rows():
+            result = self.temp_results[row]
+            if result.get('saved'):
+                already_saved += 1
+            elif result.get('success'):
+                model_id = all_models.get(result.get('model_name', 'Unknown'))
+                results_to_save.append(
+                    result_record(result, self.current_prompt_id, model_id, prompt_text)
+                )
         
         if not results_to_save:
-            QMessageBox.warning(self, "Ошибка", "Выберите результаты для сохранения!")
+            if already_saved:
+                QMessageBox.information(self, "Сохранение",
+                                        "Выбранные результаты уже сохранены автоматически")
+            else:
+                QMessageBox.warning(self, "Ошибка", "Выберите результаты для сохранения!")
             return
         
-        # Сохраняем в БД
-        saved_count = self.db.save_results(results_to_save)
-        QMessageBox.information(self, "Успех", f"Сохранено результатов: {saved_count}")
+        # Сохраняем в БД (запись выполняется в фоновом потоке)
+        self.result_writer.save_results(results_to_save)
+        QMessageBox.information(self, "Успех", f"Сохранено результатов: {len(results_to_save)}")
         
         # Очищаем временную таблицу
         self.on_clear_clicked()
     
     def on_request_error(self, error_msg: str):
         """Обработчик ошибки при отправке запросов"""
+        self.stop_streaming_view()
         self.send_button.setEnabled(True)
         self.progress_bar.setVisible(False)
         QMessageBox.critical(self, "Ошибка", error_msg)
@@ -510,9 +710,10 @@ class MainWindow(QMainWindow):
     def on_clear_clicked(self):
         """Обработчик кнопки 'Очистить'"""
         self.temp_results.clear()
-        self.results_table.setRowCount(0)
+        self.results_model.clear()
         self.save_button.setEnabled(False)
         self.open_button.setEnabled(False)
+        self.timings_button.setEnabled(False)
         self.statusBar().showMessage("Очищено")
     
     def on_selection_changed(self):
@@ -528,10 +729,34 @@ class MainWindow(QMainWindow):
             return
         
         row = selected_rows[0].row()
+        from markdown_viewer import MarkdownViewDialog
+        
+        # Ответ еще поступает: окно просмотра дополняется по мере получения фрагментов
+        if not self.temp_results and 0 <= row < len(self.stream_texts):
+            model_name = self.stream_model_names[row]
+            md_content = self.result_markdown({
+                'model_name': model_name,
+                'success': True,
+                'response': self.stream_texts[row]
+            })
+            dialog = MarkdownViewDialog(self, md_content, model_name, streaming=True)
+            self.stream_viewers[row] = dialog
+            dialog.exec_()
+            self.stream_viewers.pop(row, None)
+            return
+        
         if row < 0 or row >= len(self.temp_results):
             return
         
         result = self.temp_results[row]
+        
+        # Открываем диалог просмотра
+        dialog = MarkdownViewDialog(self, self.result_markdown(result),
+                                    result.get('model_name', 'Unknown'))
+        dialog.exec_()
+    
+    def result_markdown(self, result: Dict) -> str:
+        """Markdown для просмотра результата: модель, дата, промт и ответ"""
         model_name = result.get('model_name', 'Unknown')
         
         if result.get('success'):
@@ -543,11 +768,12 @@ class MainWindow(QMainWindow):
         # Получаем промт из текстового поля
         prompt_text = self.prompt_text.toPlainText().strip()
         
-        # Создаем Markdown контент
-        from datetime import datetime
-        md_content = f"""# Результат от модели: {model_name}
+        # Дата получения ответа, а не открытия, чтобы повторное открытие
+        # брало готовый HTML из кэша
+        received_at = result.get('received_at') or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return f"""# Результат от модели: {model_name}
 
-**Дата:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+**Дата:** {received_at}
 
 ---
 
@@ -561,11 +787,19 @@ class MainWindow(QMainWindow):
 
 {response_text}
 """
-        
-        # Открываем диалог просмотра
-        from markdown_viewer import MarkdownViewDialog
-        dialog = MarkdownViewDialog(self, md_content, model_name)
-        dialog.exec_()
+    
+    def active_models(self) -> Optional[List]:
+        """Экземпляры активных моделей; None с предупреждением, если их нет"""
+        from models import ModelRegistry
+        registry = ModelRegistry.for_database(self.db)
+        models = registry.active_models()
+        if models:
+            return models
+        if registry.unsupported_active_count():
+            QMessageBox.warning(self, "Ошибка", "Не удалось загрузить модели!")
+        else:
+            QMessageBox.warning(self, "Ошибка", "Нет активных моделей! Добавьте модели в меню 'Модели'.")
+        return None
     
     def on_prompt_context_menu(self, position: QPoint):
         """Контекстное меню для поля ввода промта"""
@@ -587,27 +821,14 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Ошибка", "Введите промт для улучшения!")
             return
         
-        # Получаем активные модели
-        models_data = self.db.get_active_models()
-        if not models_data:
-            QMessageBox.warning(self, "Ошибка", "Нет активных моделей! Добавьте модели в меню 'Модели'.")
-            return
-        
-        # Создаем экземпляры моделей
-        from models import ModelFactory
-        models = []
-        for model_data in models_data:
-            model = ModelFactory.create_model_from_db(model_data)
-            if model:
-                models.append(model)
-        
-        if not models:
-            QMessageBox.warning(self, "Ошибка", "Не удалось загрузить модели!")
+        # Получаем экземпляры активных моделей (из кэша, пока модели не менялись)
+        models = self.active_models()
+        if models is None:
             return
         
         # Открываем диалог улучшения
         from prompt_improvement_dialog import PromptImprovementDialog
-        dialog = PromptImprovementDialog(self, prompt_text, models)
+        dialog = PromptImprovementDialog(self, prompt_text, models, db=self.db)
         
         if dialog.exec_() == QDialog.Accepted:
             selected_prompt = dialog.get_selected_prompt()
@@ -645,7 +866,9 @@ class MainWindow(QMainWindow):
                         data['api_id'],
                         data['api_key_env_var'],
                         data['model_type'],
-                        data['is_active']
+                        data['is_active'],
+                        data['prompt_price'],
+                        data['completion_price']
                     )
                     QMessageBox.information(self, "Успех", "Модель добавлена!")
                 except Exception as e:
@@ -662,18 +885,156 @@ class MainWindow(QMainWindow):
     def on_view_results(self):
         """Просмотр сохраненных результатов"""
         from dialogs import ResultsDialog
+        self.result_writer.flush()
         dialog = ResultsDialog(self, self.db)
         dialog.exec_()
     
+    def on_view_usage_stats(self):
+        """Просмотр статистики использования моделей"""
+        from dialogs import UsageStatsDialog
+        self.result_writer.flush()
+        dialog = UsageStatsDialog(self, self.db)
+        dialog.exec_()
+    
+    def on_show_timings(self):
+        """Показать замеры времени последней отправки"""
+        from dialogs import TimingsDialog
+        dialog = TimingsDialog(self, results=self.temp_results)
+        dialog.exec_()
+    
+    def on_view_timings_history(self):
+        """Просмотр истории замеров времени запросов"""
+        from dialogs import TimingsDialog
+        self.result_writer.flush()
+        dialog = TimingsDialog(self, db=self.db)
+        dialog.exec_()
+    
     def on_settings(self):
         """Настройки программы"""
         from dialogs import SettingsDialog
-        dialog = SettingsDialog(self, self.db)
+        dialog = SettingsDialog(self, self.db, task_runner=self)
         if dialog.exec_() == QDialog.Accepted:
-            dialog.save_settings()
-            self.apply_settings()  # Применяем настройки сразу после сохранения
+            dialog.save_settings()  # Изменения применяются через settings_changed
             QMessageBox.information(self, "Успех", "Настройки сохранены!")
     
+    def on_setting_changed(self, key: str, value: str):
+        """Обработчик изменения настройки"""
+        if key in self.APPEARANCE_SETTINGS:
+            self.apply_settings_timer.start(0)
+        elif key == "write_durability":
+            self.result_writer.set_durability(value)
+        elif key in self.RETENTION_SETTINGS:
+            self.retention_timer.start(0)
+    
+    def on_maintenance_timer(self):
+        """Запустить обслуживание БД, если оно давно не выполнялось и программа простаивает"""
+        self.maintenance_timer.setInterval(MAINTENANCE_CHECK_INTERVAL_MS)
+        last_run = self.db.get_setting("last_maintenance", "")
+        try:
+            due = datetime.now() - datetime.strptime(last_run, '%Y-%m-%d %H:%M:%S') \
+                >= timedelta(hours=MAINTENANCE_PERIOD_HOURS)
+        except ValueError:
+            due = True
+        if not due:
+            return
+        if not self.send_button.isEnabled():
+            # Идет отправка запросов: повторим чуть позже
+            self.maintenance_timer.setInterval(MAINTENANCE_RETRY_MS)
+            return
+        if not self.start_db_task():
+            self.maintenance_timer.setInterval(MAINTENANCE_RETRY_MS)
+    
+    def apply_retention(self):
+        """Применить правила хранения и архивирования результатов (в фоновом потоке)"""
+        self.retention_timer.setInterval(RETENTION_INTERVAL_MS)
+        rules = {}
+        for key in self.RETENTION_SETTINGS:
+            try:
+                rules[key] = max(int(self.db.get_setting(key, "0")), 0)
+            except ValueError:
+                rules[key] = 0
+        if not any(rules.values()):
+            return
+        
+        def retention(db: Database) -> dict:
+            report = {'pruned': 0, 'archived': 0}
+            if rules["retention_keep_last"] or rules["retention_max_age_days"]:
+                report['pruned'] = db.prune_results(rules["retention_keep_last"],
+                                                    rules["retention_max_age_days"])
+            if rules["archive_after_days"]:
+                report['archived'] = db.archive_results(rules["archive_after_days"])
+            logging.info(f"Правила хранения: удалено {report['pruned']}, "
+                         f"перенесено в архив {report['archived']}")
+            return report
+        
+        if not self.start_db_task(retention):
+            # Идет другая фоновая операция с БД: повторим чуть позже
+            self.retention_timer.setInterval(MAINTENANCE_RETRY_MS)
+    
+    def register_usage_listener(self):
+        """Учитывать в статистике использования результаты всех запросов"""
+        from network import NetworkManager
+        NetworkManager.add_request_listener(self._usage_listener)
+    
+    def start_db_task(self, task: Optional[Callable[[Database], dict]] = None) -> bool:
+        """
+        Запустить долгую операцию с БД (по умолчанию обслуживание) в отдельном потоке
+        
+        Операция не ставится в очередь ResultWriter, поэтому flush() перед
+        открытием окон ее не ждет. Одновременно выполняется одна операция.
+        
+        Returns:
+            False, если предыдущая операция еще выполняется
+        """
+        if self.db_task_thread is not None:
+            return False
+        from dialogs import MaintenanceThread
+        self.db_task_thread = MaintenanceThread(self.db, task)
+        self.db_task_thread.finished.connect(self.on_db_task_finished)
+        self.db_task_thread.start()
+        self.db_task_started.emit()
+        return True
+    
+    def db_task_running(self) -> bool:
+        """Выполняется ли долгая операция с БД"""
+        return self.db_task_thread is not None
+    
+    def start_incremental_vacuum_conversion(self) -> bool:
+        """
+        Перевести БД в режим auto_vacuum=INCREMENTAL (VACUUM всей БД) в фоне
+        
+        На время VACUUM запись ResultWriter приостанавливается: иначе ее
+        транзакции ждали бы дольше таймаута соединения.
+        
+        Returns:
+            False, если выполняется другая операция с БД
+        """
+        writer = self.result_writer
+        
+        def conversion(db: Database) -> dict:
+            start = time.perf_counter()
+            with writer.paused():
+                db.enable_incremental_vacuum()
+            report = {'vacuum_seconds': time.perf_counter() - start}
+            logging.info(f"БД переведена в режим auto_vacuum=INCREMENTAL за "
+                         f"{report['vacuum_seconds']:.1f} с")
+            return report
+        
+        return self.start_db_task(conversion)
+    
+    def on_db_task_finished(self, report: dict):
+        """Обработчик завершения фоновой операции с БД"""
+        # Сигнал отправлен в конце run(): поток завершается и его можно отпустить
+        self.db_task_thread.wait()
+        self.db_task_thread = None
+        if 'error' in report:
+            self.on_write_failed(f"Ошибка обслуживания БД: {report['error']}")
+        self.db_task_finished.emit(report)
+    
+    def on_write_failed(self, message: str):
+        """Обработчик ошибки фоновой записи в БД"""
+        self.statusBar().showMessage(message)
+    
     def apply_settings(self):
         """Применить настройки темы и размера шрифта"""
         if not self.db:
@@ -708,7 +1069,7 @@ class MainWindow(QMainWindow):
                 QPushButton:pressed {
                     background-color: #353535;
                 }
-                QTableWidget {
+                QTableView {
                     background-color: #3c3c3c;
                     color: #ffffff;
                     gridline-color: #555555;
@@ -782,6 +1143,18 @@ class MainWindow(QMainWindow):
     
     def closeEvent(self, event):
         """Обработчик закрытия приложения"""
+        self.db.remove_settings_listener(self._settings_listener)
+        from network import NetworkManager
+        NetworkManager.remove_request_listener(self._usage_listener)
+        self.retention_timer.stop()
+        self.maintenance_timer.stop()
+        if self.db_task_thread is not None:
+            # Операция прерывается (транзакция откатывается), а не дожидается конца
+            self.db_task_thread.finished.disconnect(self.on_db_task_finished)
+            self.db_task_thread.cancel()
+            self.db_task_thread.wait()
+            self.db_task_thread = None
+        self.result_writer.close()  # Дописываем очередь записи до закрытия БД
         self.db.close()
         event.accept()
 
@@ -802,8 +1175,24 @@ def main():
     logging.info(f"ChatList версия {__version__} запущен")
     
     app = QApplication(sys.argv)
+    startup_profile.mark("QApplication создан")
+    
+    # Мониторинг зависаний цикла событий (--monitor-stalls или CHATLIST_STALL_MONITOR=1)
+    from stall_monitor import StallMonitor, stall_monitor_enabled, STALL_THRESHOLD_ENV_VAR
+    if stall_monitor_enabled():
+        monitor = StallMonitor(threshold_ms=float(os.getenv(STALL_THRESHOLD_ENV_VAR, "50")))
+        monitor.start()
+        app.aboutToQuit.connect(monitor.log_summary)
+    
     window = MainWindow()
     window.show()
+    startup_profile.mark("Окно показано")
+    
+    def on_first_event_loop_iteration():
+        startup_profile.mark("Первая итерация цикла событий")
+        startup_profile.finish()
+    
+    QTimer.singleShot(0, on_first_event_loop_iteration)
     sys.exit(app.exec_())
 
 
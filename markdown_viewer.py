@@ -1,20 +1,491 @@
 """Диалог для просмотра Markdown контента"""
-import markdown
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
 from PyQt5.QtWidgets import (
     QDialog, QVBoxLayout, QTextBrowser, QPushButton, QHBoxLayout
 )
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QFont
+from PyQt5.QtCore import Qt, QObject, QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import (
+    QFont, QTextBlockFormat, QTextCharFormat, QTextCursor, QTextDocument,
+    QTextDocumentFragment
+)
+
+# Расширения Markdown для отображения ответов моделей
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'nl2br', 'codehilite']
+
+# Предел объема кэша готового HTML (байт)
+RENDER_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+_STYLED_HTML = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <style>
+        body {{
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
+            line-height: 1.6;
+            color: #333333 !important;
+            max-width: 1200px;
+            margin: 0 auto;
+            padding: 20px;
+            background-color: #ffffff !important;
+        }}
+        p {{
+            color: #333333 !important;
+        }}
+        div {{
+            color: #333333 !important;
+            background-color: #ffffff !important;
+        }}
+        h1 {{
+            color: #000000 !important;
+            border-bottom: 3px solid #3498db;
+            padding-bottom: 10px;
+            margin-top: 0;
+        }}
+        h2 {{
+            color: #000000 !important;
+            border-bottom: 2px solid #ecf0f1;
+            padding-bottom: 8px;
+            margin-top: 30px;
+        }}
+        h3 {{
+            color: #000000 !important;
+            margin-top: 25px;
+        }}
+        h4, h5, h6 {{
+            color: #000000 !important;
+        }}
+        code {{
+            background-color: #f4f4f4 !important;
+            color: #333333 !important;
+            padding: 2px 6px;
+            border-radius: 3px;
+            font-family: 'Consolas', 'Monaco', monospace;
+            font-size: 0.9em;
+        }}
+        pre {{
+            background-color: #2c3e50 !important;
+            color: #ecf0f1 !important;
+            padding: 15px;
+            border-radius: 5px;
+            overflow-x: auto;
+            border-left: 4px solid #3498db;
+        }}
+        pre code {{
+            background-color: transparent !important;
+            color: #ecf0f1 !important;
+            padding: 0;
+        }}
+        blockquote {{
+            border-left: 4px solid #3498db;
+            margin: 0;
+            padding-left: 20px;
+            color: #000000 !important;
+            font-style: italic;
+            background-color: #f9f9f9;
+        }}
+        table {{
+            border-collapse: collapse;
+            width: 100%;
+            margin: 20px 0;
+        }}
+        th,                     td {{
+            border: 1px solid #ddd;
+            padding: 12px;
+            text-align: left;
+            color: #000000 !important;
+            background-color: #ffffff !important;
+        }}
+        th {{
+            background-color: #3498db;
+            color: white;
+            font-weight: bold;
+        }}
+        tr:nth-child(even) td {{
+            background-color: #f9f9f9 !important;
+            color: #000000 !important;
+        }}
+        a {{
+            color: #3498db;
+            text-decoration: none;
+        }}
+        a:hover {{
+            text-decoration: underline;
+        }}
+        hr {{
+            border: none;
+            border-top: 2px solid #ecf0f1;
+            margin: 30px 0;
+        }}
+        strong {{
+            color: #000000 !important;
+            font-weight: 600;
+        }}
+        em {{
+            color: #000000 !important;
+        }}
+        ul, ol {{
+            padding-left: 30px;
+        }}
+        li {{
+            margin: 5px 0;
+            color: #000000 !important;
+        }}
+        span {{
+            color: #000000 !important;
+        }}
+        /* Исключение для цветных блоков кода с подсветкой синтаксиса */
+        pre code.hljs,
+        pre code[class*="language-"],
+        .codehilite code,
+        .highlight code {{
+            background-color: transparent !important;
+            color: inherit !important;
+        }}
+        /* Блоки кода с подсветкой сохраняют свои цвета */
+        pre.hljs,
+        pre[class*="language-"],
+        .codehilite pre,
+        .highlight pre {{
+            background-color: #2c3e50 !important;
+            color: #ecf0f1 !important;
+        }}
+    </style>
+</head>
+<body>
+    {html}
+</body>
+</html>
+"""
+
+# Стили документа для потокового вывода, где HTML дописывается фрагментами
+_STYLE_SHEET = re.search(r"<style>(.*)</style>", _STYLED_HTML.format(html=""), re.S).group(1)
+
+_ERROR_HTML = """<html>
+<head>
+    <meta charset="UTF-8">
+    <style>
+        body {{
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
+            line-height: 1.6;
+            padding: 20px;
+            white-space: pre-wrap;
+            color: #000000 !important;
+            background-color: #ffffff !important;
+        }}
+        h2, p {{
+            color: #000000 !important;
+        }}
+    </style>
+</head>
+<body>
+    <h2>Ошибка форматирования:</h2>
+    <p>{error}</p>
+    <hr>
+    <h2>Исходный текст:</h2>
+    <pre>{md_text}</pre>
+</body>
+</html>
+"""
+
+
+class RenderCache:
+    """LRU-кэш готового HTML по хэшу Markdown, ограниченный суммарным объемом"""
+    
+    def __init__(self, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key(md_text: str) -> str:
+        """Ключ кэша для текста Markdown"""
+        return hashlib.sha256(md_text.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Получить HTML из кэша (None, если его нет)"""
+        with self._lock:
+            html = self._items.get(key)
+            if html is not None:
+                self._items.move_to_end(key)
+            return html
+    
+    def put(self, key: str, html: str):
+        """Сохранить HTML, вытесняя давно не использованные записи"""
+        size = len(html.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old.encode('utf-8'))
+            self._items[key] = html
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted.encode('utf-8'))
+    
+    def clear(self):
+        """Очистить кэш"""
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+    
+    def __len__(self):
+        return len(self._items)
+
+
+render_cache = RenderCache()
+
+# Один настроенный экземпляр Markdown: создание с расширениями (в том числе
+# codehilite с Pygments) заметно дороже самого преобразования
+_markdown = None
+_markdown_lock = threading.Lock()
+
+
+def _get_markdown():
+    global _markdown
+    if _markdown is None:
+        import markdown
+        _markdown = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+    return _markdown
+
+
+def _convert(md_text: str) -> str:
+    """Преобразовать Markdown в HTML-фрагмент общим экземпляром Markdown"""
+    with _markdown_lock:
+        md = _get_markdown()
+        try:
+            return md.convert(md_text)
+        finally:
+            md.reset()
+
+
+# Отдельный экземпляр для потокового просмотра: он используется только в
+# главном потоке, поэтому не ждет _markdown_lock, пока фоновый поток
+# преобразует другой документ
+_stream_markdown = None
+
+
+def _convert_streaming(md_text: str) -> str:
+    """Преобразовать фрагмент потокового ответа (только из главного потока)"""
+    global _stream_markdown
+    if _stream_markdown is None:
+        import markdown
+        _stream_markdown = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+    try:
+        return _stream_markdown.convert(md_text)
+    finally:
+        _stream_markdown.reset()
+
+
+def render_markdown(md_text: str) -> str:
+    """
+    Преобразовать Markdown в HTML со стилями, используя кэш
+    
+    Безопасно вызывать из рабочего потока.
+    """
+    key = render_cache.key(md_text)
+    html = render_cache.get(key)
+    if html is not None:
+        return html
+    
+    try:
+        html = _STYLED_HTML.format(html=_convert(md_text))
+    except Exception as e:
+        # Если не удалось конвертировать, показываем как простой текст
+        return _ERROR_HTML.format(error=str(e), md_text=md_text)
+    
+    render_cache.put(key, html)
+    return html
+
+
+# Начало или конец блока кода: ``` или ~~~ (не меньше трех символов)
+_FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+
+
+class IncrementalMarkdownRenderer:
+    """
+    Инкрементальное преобразование Markdown, поступающего по частям
+    
+    Текст делится на блоки по пустым строкам вне блоков кода. Завершенные
+    блоки преобразуются один раз, и их HTML сохраняется; при каждой
+    отрисовке заново преобразуется только последний, еще открытый блок.
+    Поэтому стоимость обновления не растет с длиной ответа. Блоки
+    преобразуются независимо, поэтому конструкции, разделенные пустыми
+    строками (например, «разреженные» списки), могут выглядеть иначе, чем
+    при преобразовании всего текста; итоговый вид дает render_markdown.
+    Преобразование выполняется в главном потоке (_convert_streaming).
+    """
+    
+    def __init__(self):
+        self.text = ""
+        self._blocks_html: List[str] = []
+        self._final_pos = 0  # Конец завершенной части текста
+        self._scan_pos = 0  # Начало первой еще не разобранной строки
+        self._fence: Optional[str] = None  # Открывающая последовательность блока кода
+        self._taken = 0  # Сколько завершенных блоков уже выдано take_new_blocks
+        self._tail_source: Optional[str] = None
+        self._tail_html = ""
+    
+    def feed(self, delta: str):
+        """Добавить очередной фрагмент текста"""
+        self.text += delta
+        self._scan()
+    
+    def _scan(self):
+        """Разобрать новые полные строки и завершить закрытые блоки"""
+        while True:
+            line_end = self.text.find("\n", self._scan_pos)
+            if line_end < 0:
+                return
+            line = self.text[self._scan_pos:line_end]
+            self._scan_pos = line_end + 1
+            
+            fence = _FENCE_RE.match(line)
+            if fence:
+                marker = fence.group(1)
+                if self._fence is None:
+                    self._fence = marker
+                elif marker[0] == self._fence[0] and len(marker) >= len(self._fence):
+                    self._fence = None
+            elif self._fence is None and not line.strip():
+                self._finalize(self._scan_pos)
+    
+    def _finalize(self, end: int):
+        block = self.text[self._final_pos:end]
+        if block.strip():
+            self._blocks_html.append(_convert_streaming(block))
+        self._final_pos = end
+    
+    def take_new_blocks(self) -> List[str]:
+        """HTML блоков, завершенных с предыдущего вызова"""
+        blocks = self._blocks_html[self._taken:]
+        self._taken = len(self._blocks_html)
+        return blocks
+    
+    def tail_html(self) -> str:
+        """HTML последнего, еще открытого блока (преобразуется, только если изменился)"""
+        tail = self.text[self._final_pos:]
+        if tail != self._tail_source:
+            self._tail_source = tail
+            self._tail_html = _convert_streaming(tail) if tail.strip() else ""
+        return self._tail_html
+    
+    def render_body(self) -> str:
+        """HTML-фрагмент для текущего текста"""
+        return "\n".join(self._blocks_html + [self.tail_html()])
+    
+    def render(self) -> str:
+        """HTML-документ со стилями для текущего текста"""
+        return _STYLED_HTML.format(html=self.render_body())
+
+
+class FrameThrottle(QObject):
+    """
+    Ограничение частоты перерисовки при потоковом обновлении
+    
+    request() можно вызывать на каждый фрагмент ответа: обновление
+    выполняется не чаще одного раза за кадр, а если само обновление
+    дорогое, интервал увеличивается, чтобы оно занимало не больше
+    половины времени главного потока.
+    """
+    
+    def __init__(self, callback: Callable[[], None], frame_ms: int = 33, parent=None):
+        super().__init__(parent)
+        self.callback = callback
+        self.frame_ms = frame_ms
+        self.last_cost_ms = 0.0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._run)
+    
+    def request(self):
+        """Запросить обновление (повторные запросы до его выполнения объединяются)"""
+        if not self._timer.isActive():
+            self._timer.start(max(self.frame_ms, int(self.last_cost_ms * 2)))
+    
+    def flush(self):
+        """Выполнить отложенное обновление немедленно"""
+        if self._timer.isActive():
+            self._timer.stop()
+            self._run()
+    
+    def cancel(self):
+        """Отменить отложенное обновление"""
+        self._timer.stop()
+    
+    def _run(self):
+        started = time.perf_counter()
+        self.callback()
+        self.last_cost_ms = (time.perf_counter() - started) * 1000
+
+
+def _insert_html(cursor: QTextCursor, html: str):
+    """
+    Вставить HTML-фрагмент в позицию курсора с оформлением документа
+    
+    Первый вставленный блок сливается с текущим и теряет свое оформление
+    блока (например, отступы заголовка), поэтому оно переносится явно.
+    """
+    document = QTextDocument()
+    document.setDefaultStyleSheet(cursor.document().defaultStyleSheet())
+    document.setHtml(html)
+    start = cursor.position()
+    cursor.insertFragment(QTextDocumentFragment(document))
+    first = document.begin()
+    if QTextCursor(first).currentTable() is None:
+        QTextCursor(cursor.document().findBlock(start)).setBlockFormat(first.blockFormat())
+
+
+class MarkdownRenderThread(QThread):
+    """Поток для преобразования Markdown в HTML без блокировки интерфейса"""
+    rendered = pyqtSignal(str)
+    
+    def __init__(self, md_text: str):
+        super().__init__()
+        self.md_text = md_text
+    
+    def run(self):
+        self.rendered.emit(render_markdown(self.md_text))
+
+
+# Потоки, которые еще выполняются: диалог может закрыться раньше, чем
+# закончится преобразование, а QThread нельзя удалять во время работы
+_active_threads = set()
 
 
 class MarkdownViewDialog(QDialog):
     """Диалог для просмотра Markdown на весь экран"""
     
-    def __init__(self, parent=None, md_content: str = "", title: str = "Просмотр"):
+    def __init__(self, parent=None, md_content: str = "", title: str = "Просмотр",
+                 streaming: bool = False):
+        """
+        Args:
+            parent: Родительский виджет
+            md_content: Текст Markdown
+            title: Заголовок окна
+            streaming: Ответ еще поступает: текст дополняется через
+                append_markdown() и отображается инкрементально до finish_streaming()
+        """
         super().__init__(parent)
         self.setWindowTitle(f"Просмотр: {title}")
         self.setMinimumSize(1200, 800)
         self.md_content = md_content
+        self.render_thread: Optional[MarkdownRenderThread] = None
+        self.stream_renderer: Optional[IncrementalMarkdownRenderer] = None
+        self.stream_throttle: Optional[FrameThrottle] = None
+        self.stream_tail_pos = 0
+        if streaming:
+            self.stream_renderer = IncrementalMarkdownRenderer()
+            self.stream_renderer.feed(md_content)
+            self.stream_throttle = FrameThrottle(self._render_stream, parent=self)
         self.init_ui()
     
     def init_ui(self):
@@ -36,9 +507,16 @@ class MarkdownViewDialog(QDialog):
         font = QFont("Consolas", 11)
         self.text_browser.setFont(font)
         
-        # Конвертируем Markdown в HTML
-        html_content = self.convert_markdown_to_html(self.md_content)
-        self.text_browser.setHtml(html_content)
+        # Готовый HTML берем из кэша, иначе показываем заглушку и
+        # преобразуем Markdown в фоновом потоке
+        html_content = render_cache.get(render_cache.key(self.md_content))
+        if self.stream_renderer is not None:
+            self._start_stream_view()
+        elif html_content is not None:
+            self.text_browser.setHtml(html_content)
+        else:
+            self.text_browser.setPlainText("Форматирование...")
+            self.start_rendering()
         
         layout.addWidget(self.text_browser)
         
@@ -53,187 +531,80 @@ class MarkdownViewDialog(QDialog):
         layout.addLayout(buttons_layout)
         self.setLayout(layout)
     
+    def start_rendering(self):
+        """Запустить преобразование Markdown в фоновом потоке"""
+        thread = MarkdownRenderThread(self.md_content)
+        thread.rendered.connect(self.on_rendered)
+        thread.finished.connect(lambda: _active_threads.discard(thread))
+        _active_threads.add(thread)
+        self.render_thread = thread
+        thread.start()
+    
+    def on_rendered(self, html_content: str):
+        """Показать HTML, полученный из фонового потока"""
+        self.text_browser.setHtml(html_content)
+    
+    def append_markdown(self, delta: str):
+        """Дописать фрагмент потокового ответа"""
+        if self.stream_renderer is None:
+            return
+        self.md_content += delta
+        self.stream_renderer.feed(delta)
+        self.stream_throttle.request()
+    
+    def finish_streaming(self, md_content: Optional[str] = None):
+        """
+        Завершить потоковый вывод
+        
+        Args:
+            md_content: Итоговый текст (если отличается от собранного из фрагментов)
+        """
+        if self.stream_renderer is None:
+            return
+        self.stream_throttle.cancel()
+        if md_content is not None:
+            self.md_content = md_content
+        self.stream_renderer = None
+        # Итоговый текст преобразуется целиком, как при обычном просмотре, но
+        # в фоновом потоке; до этого остается видна потоковая версия
+        html_content = render_cache.get(render_cache.key(self.md_content))
+        if html_content is not None:
+            self.text_browser.setHtml(html_content)
+        else:
+            self.start_rendering()
+    
+    def _start_stream_view(self):
+        """Подготовить документ к потоковому выводу и показать уже полученный текст"""
+        document = self.text_browser.document()
+        document.setDefaultStyleSheet(_STYLE_SHEET)
+        document.clear()
+        # Начало последнего, еще открытого блока: он перерисовывается на
+        # каждом кадре, а завершенные блоки дописываются перед ним один раз
+        self.stream_tail_pos = 0
+        self._render_stream()
+    
+    def _render_stream(self):
+        """Дописать новые блоки потокового ответа и перерисовать последний, сохранив прокрутку"""
+        scrollbar = self.text_browser.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 4
+        position = scrollbar.value()
+        
+        cursor = QTextCursor(self.text_browser.document())
+        cursor.setPosition(self.stream_tail_pos)
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        blocks = self.stream_renderer.take_new_blocks()
+        if blocks:
+            _insert_html(cursor, "\n".join(blocks))
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertBlock(QTextBlockFormat(), QTextCharFormat())
+            self.stream_tail_pos = cursor.position()
+        tail = self.stream_renderer.tail_html()
+        if tail:
+            _insert_html(cursor, tail)
+        
+        scrollbar.setValue(scrollbar.maximum() if at_bottom else position)
+    
     def convert_markdown_to_html(self, md_text: str) -> str:
         """Конвертировать Markdown в HTML с красивым стилем"""
-        try:
-            # Конвертируем Markdown в HTML
-            html = markdown.markdown(
-                md_text,
-                extensions=['fenced_code', 'tables', 'nl2br', 'codehilite']
-            )
-            
-            # Добавляем красивые стили
-            styled_html = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <style>
-                    body {{
-                        font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
-                        line-height: 1.6;
-                        color: #333333 !important;
-                        max-width: 1200px;
-                        margin: 0 auto;
-                        padding: 20px;
-                        background-color: #ffffff !important;
-                    }}
-                    p {{
-                        color: #333333 !important;
-                    }}
-                    div {{
-                        color: #333333 !important;
-                        background-color: #ffffff !important;
-                    }}
-                    h1 {{
-                        color: #000000 !important;
-                        border-bottom: 3px solid #3498db;
-                        padding-bottom: 10px;
-                        margin-top: 0;
-                    }}
-                    h2 {{
-                        color: #000000 !important;
-                        border-bottom: 2px solid #ecf0f1;
-                        padding-bottom: 8px;
-                        margin-top: 30px;
-                    }}
-                    h3 {{
-                        color: #000000 !important;
-                        margin-top: 25px;
-                    }}
-                    h4, h5, h6 {{
-                        color: #000000 !important;
-                    }}
-                    code {{
-                        background-color: #f4f4f4 !important;
-                        color: #333333 !important;
-                        padding: 2px 6px;
-                        border-radius: 3px;
-                        font-family: 'Consolas', 'Monaco', monospace;
-                        font-size: 0.9em;
-                    }}
-                    pre {{
-                        background-color: #2c3e50 !important;
-                        color: #ecf0f1 !important;
-                        padding: 15px;
-                        border-radius: 5px;
-                        overflow-x: auto;
-                        border-left: 4px solid #3498db;
-                    }}
-                    pre code {{
-                        background-color: transparent !important;
-                        color: #ecf0f1 !important;
-                        padding: 0;
-                    }}
-                    blockquote {{
-                        border-left: 4px solid #3498db;
-                        margin: 0;
-                        padding-left: 20px;
-                        color: #000000 !important;
-                        font-style: italic;
-                        background-color: #f9f9f9;
-                    }}
-                    table {{
-                        border-collapse: collapse;
-                        width: 100%;
-                        margin: 20px 0;
-                    }}
-                    th,                     td {{
-                        border: 1px solid #ddd;
-                        padding: 12px;
-                        text-align: left;
-                        color: #000000 !important;
-                        background-color: #ffffff !important;
-                    }}
-                    th {{
-                        background-color: #3498db;
-                        color: white;
-                        font-weight: bold;
-                    }}
-                    tr:nth-child(even) td {{
-                        background-color: #f9f9f9 !important;
-                        color: #000000 !important;
-                    }}
-                    a {{
-                        color: #3498db;
-                        text-decoration: none;
-                    }}
-                    a:hover {{
-                        text-decoration: underline;
-                    }}
-                    hr {{
-                        border: none;
-                        border-top: 2px solid #ecf0f1;
-                        margin: 30px 0;
-                    }}
-                    strong {{
-                        color: #000000 !important;
-                        font-weight: 600;
-                    }}
-                    em {{
-                        color: #000000 !important;
-                    }}
-                    ul, ol {{
-                        padding-left: 30px;
-                    }}
-                    li {{
-                        margin: 5px 0;
-                        color: #000000 !important;
-                    }}
-                    span {{
-                        color: #000000 !important;
-                    }}
-                    /* Исключение для цветных блоков кода с подсветкой синтаксиса */
-                    pre code.hljs,
-                    pre code[class*="language-"],
-                    .codehilite code,
-                    .highlight code {{
-                        background-color: transparent !important;
-                        color: inherit !important;
-                    }}
-                    /* Блоки кода с подсветкой сохраняют свои цвета */
-                    pre.hljs,
-                    pre[class*="language-"],
-                    .codehilite pre,
-                    .highlight pre {{
-                        background-color: #2c3e50 !important;
-                        color: #ecf0f1 !important;
-                    }}
-                </style>
-            </head>
-            <body>
-                {html}
-            </body>
-            </html>
-            """
-            return styled_html
-        except Exception as e:
-            # Если не удалось конвертировать, показываем как простой текст
-            return f"""
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <style>
-                    body {{
-                        font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-                        line-height: 1.6;
-                        padding: 20px;
-                        white-space: pre-wrap;
-                        color: #000000 !important;
-                        background-color: #ffffff !important;
-                    }}
-                    h2, p {{
-                        color: #000000 !important;
-                    }}
-                </style>
-            </head>
-            <body>
-                <h2>Ошибка форматирования:</h2>
-                <p>{str(e)}</p>
-                <hr>
-                <h2>Исходный текст:</h2>
-                <pre>{md_text}</pre>
-            </body>
-            </html>
-            """
-
+        return render_markdown(md_text)
@@ -0,0 +1,349 @@
+"""Локальный тестовый сервер, совместимый с OpenAI/OpenRouter chat completions
+
+Сервер нужен для детерминированных нагрузочных тестов и замеров задержек
+без доступа к реальным API: задержка ответа задается распределением,
+скорость потоковой выдачи — числом токенов в секунду, а ошибки 429/500/404
+внедряются с заданной вероятностью.
+
+Запуск:
+    python mock_server.py --port 8765 --latency lognormal:0.3,0.5 --tps 40
+
+Направить модели тестовой БД на сервер:
+    python mock_server.py --db bench.db --create-models 10
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Переменная окружения с ключом для моделей, направленных на тестовый сервер
+MOCK_API_KEY_ENV_VAR = "MOCK_API_KEY"
+
+# Слова для генерации ответов
+_WORDS = (
+    "модель ответ запрос данные пример текст анализ результат задача решение "
+    "функция система значение список поток сеть время кэш строка таблица"
+).split()
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Разобрать описание распределения задержки
+
+    Форматы (значения в секундах):
+        fixed:0.2            — постоянная задержка
+        uniform:0.1,0.5      — равномерное распределение
+        normal:0.3,0.05      — нормальное (среднее, отклонение), не меньше 0
+        lognormal:0.3,0.5    — логнормальное (медиана, sigma), длинный хвост
+    """
+    kind, _, args = spec.partition(':')
+    values = [float(v) for v in args.split(',') if v.strip()] if args else []
+    kind = kind.strip().lower()
+
+    if kind == 'fixed':
+        delay = values[0] if values else 0.0
+        return lambda rng: delay
+    if kind == 'uniform':
+        low, high = values
+        return lambda rng: rng.uniform(low, high)
+    if kind == 'normal':
+        mean, stddev = values
+        return lambda rng: max(0.0, rng.gauss(mean, stddev))
+    if kind == 'lognormal':
+        median, sigma = values
+        mu = math.log(median)
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    raise ValueError(f"Неизвестное распределение задержки: {spec}")
+
+
+class MockServer:
+    """Тестовый сервер chat completions в отдельном потоке"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency: str = "fixed:0", tokens_per_second: float = 0,
+                 response_tokens: int = 50, error_rates: Optional[Dict[int, float]] = None,
+                 seed: Optional[int] = None):
+        """
+        Инициализация сервера
+
+        Args:
+            host: Адрес для прослушивания
+            port: Порт (0 — выбрать свободный)
+            latency: Распределение задержки до первого байта (см. parse_latency)
+            tokens_per_second: Скорость потоковой выдачи (0 — без ограничения)
+            response_tokens: Количество слов в ответе
+            error_rates: Вероятность ошибок по HTTP-кодам, например {429: 0.05, 500: 0.01}
+            seed: Зерно генератора случайных чисел для воспроизводимости
+        """
+        self.latency = parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.error_rates = error_rates or {}
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'streamed': 0, 'errors': 0}
+
+        handler = type('MockHandler', (_MockHandler,), {'server_state': self})
+        self._httpd = ThreadingHTTPServer((host, port), handler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """URL эндпоинта chat completions"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self) -> 'MockServer':
+        """Запустить сервер в фоновом потоке"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Тестовый сервер запущен: {self.url}")
+        return self
+
+    def stop(self):
+        """Остановить сервер"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _plan_request(self):
+        """Выбрать задержку и внедряемую ошибку для очередного запроса"""
+        with self._rng_lock:
+            delay = self.latency(self._rng)
+            roll = self._rng.random()
+        error_code = None
+        threshold = 0.0
+        for code, rate in sorted(self.error_rates.items()):
+            threshold += rate
+            if roll < threshold:
+                error_code = code
+                break
+        return delay, error_code
+
+    def generate_tokens(self, prompt: str) -> List[str]:
+        """Детерминированный ответ, зависящий только от текста промта"""
+        rng = random.Random(prompt)
+        words = [rng.choice(_WORDS) for _ in range(self.response_tokens)]
+        return [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов тестового сервера"""
+
+    protocol_version = "HTTP/1.1"
+    # Заголовки и тело пишутся отдельно; без TCP_NODELAY алгоритм Нейгла
+    # вместе с отложенным ACK клиента добавляет к ответу ~40 мс
+    disable_nagle_algorithm = True
+    server_state: MockServer = None
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': {'message': 'Invalid JSON', 'code': 400}})
+            return
+
+        state = self.server_state
+        state._count('requests')
+
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f'Unknown path {self.path}', 'code': 404}})
+            return
+
+        delay, error_code = state._plan_request()
+        if delay > 0:
+            time.sleep(delay)
+
+        model = request.get('model', 'mock-model')
+        if error_code is not None:
+            state._count('errors')
+            messages = {
+                404: f'Model {model} not found',
+                429: 'Rate limit exceeded',
+                500: 'Internal server error'
+            }
+            headers = {'Retry-After': '1'} if error_code == 429 else {}
+            self._send_json(error_code, {
+                'error': {'message': messages.get(error_code, 'Error'), 'code': error_code}
+            }, headers)
+            return
+
+        prompt = ' '.join(str(m.get('content', '')) for m in request.get('messages', []))
+        tokens = state.generate_tokens(prompt)
+        usage = {
+            'prompt_tokens': len(prompt.split()),
+            'completion_tokens': len(tokens),
+            'total_tokens': len(prompt.split()) + len(tokens)
+        }
+
+        if request.get('stream'):
+            state._count('streamed')
+            include_usage = (request.get('stream_options') or {}).get('include_usage')
+            self._send_stream(model, tokens, usage if include_usage else None)
+        else:
+            self._send_json(200, {
+                'id': 'chatcmpl-mock',
+                'object': 'chat.completion',
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                    'finish_reason': 'stop'
+                }],
+                'usage': usage
+            })
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_event(self, payload) -> None:
+        data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+        self._write_chunk(f"data: {data}\n\n".encode('utf-8'))
+
+    def _send_stream(self, model: str, tokens: List[str], usage: Optional[Dict]):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        tps = self.server_state.tokens_per_second
+        interval = 1.0 / tps if tps > 0 else 0
+
+        self._send_event({'model': model, 'choices': [{'index': 0, 'delta': {'role': 'assistant'}}]})
+        for token in tokens:
+            if interval:
+                time.sleep(interval)
+            self._send_event({'model': model, 'choices': [{'index': 0, 'delta': {'content': token}}]})
+        self._send_event({'model': model, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+        if usage:
+            self._send_event({'model': model, 'choices': [], 'usage': usage})
+        self._send_event('[DONE]')
+        self._write_chunk(b"")
+
+
+def point_models_to_server(db, url: str, create_models: int = 0,
+                           model_type: str = 'openai') -> List[int]:
+    """
+    Направить модели БД на тестовый сервер
+
+    Все существующие модели получают URL сервера и ключ из MOCK_API_KEY;
+    при необходимости добавляются новые тестовые модели. Используйте только
+    с отдельной (тестовой) БД.
+
+    Args:
+        db: Экземпляр Database
+        url: URL эндпоинта chat completions тестового сервера
+        create_models: Сколько тестовых моделей добавить
+        model_type: Тип добавляемых моделей (openai, openrouter, ...)
+
+    Returns:
+        Список ID всех моделей, направленных на сервер
+    """
+    os.environ.setdefault(MOCK_API_KEY_ENV_VAR, "mock-key")
+
+    model_ids = []
+    for model in db.get_all_models():
+        db.update_model(model['id'], api_url=url, api_key_env_var=MOCK_API_KEY_ENV_VAR)
+        model_ids.append(model['id'])
+
+    existing = {model['name'] for model in db.get_all_models()}
+    number = 1
+    while create_models > 0:
+        name = f"Mock Model {number}"
+        number += 1
+        if name in existing:
+            continue
+        model_ids.append(db.create_model(name, url, f"mock/model-{number - 1}",
+                                         MOCK_API_KEY_ENV_VAR, model_type, 1))
+        create_models -= 1
+
+    return model_ids
+
+
+def _parse_error_rates(args) -> Dict[int, float]:
+    rates = {429: args.error_429, 500: args.error_500, 404: args.error_404}
+    return {code: rate for code, rate in rates.items() if rate > 0}
+
+
+def main():
+    """Запуск тестового сервера из командной строки"""
+    parser = argparse.ArgumentParser(description="Тестовый сервер OpenAI-совместимого API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default='fixed:0.2',
+                        help='fixed:S | uniform:A,B | normal:M,SD | lognormal:MEDIAN,SIGMA')
+    parser.add_argument('--tps', type=float, default=0, help='Токенов в секунду при потоковой выдаче')
+    parser.add_argument('--response-tokens', type=int, default=50)
+    parser.add_argument('--error-429', type=float, default=0)
+    parser.add_argument('--error-500', type=float, default=0)
+    parser.add_argument('--error-404', type=float, default=0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--db', help='Направить модели этой БД на сервер')
+    parser.add_argument('--create-models', type=int, default=0,
+                        help='Сколько тестовых моделей добавить в БД')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    server = MockServer(args.host, args.port, args.latency, args.tps,
+                        args.response_tokens, _parse_error_rates(args), args.seed)
+
+    if args.db:
+        from db import Database
+        db = Database(args.db)
+        model_ids = point_models_to_server(db, server.url, args.create_models)
+        db.close()
+        print(f"Модели БД {args.db} направлены на {server.url}: {len(model_ids)} шт.")
+        print(f"Перед запуском программы задайте {MOCK_API_KEY_ENV_VAR}=mock-key")
+
+    print(f"Сервер слушает {server.url} (Ctrl+C для остановки)")
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
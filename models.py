@@ -1,14 +1,22 @@
 """Модуль работы с моделями нейросетей"""
+import threading
+import weakref
 from abc import ABC, abstractmethod
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from config import get_env_var
 
 
 class Model(ABC):
     """Базовый класс для моделей нейросетей"""
     
+    provider = 'unknown'  # Тип провайдера для статистики использования
+    # Поддерживает ли API параметр response_format={'type': 'json_object'}
+    supports_json_response = False
+    
     def __init__(self, name: str, api_url: str, api_id: str, 
-                 api_key_env_var: str, is_active: bool = True):
+                 api_key_env_var: str, is_active: bool = True,
+                 prompt_price: Optional[float] = None,
+                 completion_price: Optional[float] = None):
         """
         Инициализация модели
         
@@ -18,13 +26,18 @@ class Model(ABC):
             api_id: Идентификатор модели в API
             api_key_env_var: Имя переменной окружения с API-ключом
             is_active: Активна ли модель
+            prompt_price: Цена за 1M входных токенов (USD)
+            completion_price: Цена за 1M выходных токенов (USD)
         """
         self.name = name
         self.api_url = api_url
         self.api_id = api_id
         self.api_key_env_var = api_key_env_var
         self.is_active = is_active
+        self.prompt_price = prompt_price
+        self.completion_price = completion_price
         self._api_key = None
+        self._session = None
     
     def get_api_key(self) -> str:
         """Получить API-ключ из переменной окружения"""
@@ -33,18 +46,146 @@ class Model(ABC):
         return self._api_key
     
     @abstractmethod
-    def send_request(self, prompt: str) -> Dict:
+    def send_request(self, prompt: str,
+                     on_delta: Optional[Callable[[str], None]] = None,
+                     response_format: Optional[Dict] = None) -> Dict:
         """
         Отправить запрос к модели
         
         Args:
             prompt: Текст промта
+            on_delta: Если задан, ответ запрашивается потоком и каждый
+                полученный фрагмент текста передается в эту функцию
+            response_format: Формат ответа для API (например, {'type': 'json_object'});
+                передавайте только моделям с supports_json_response
             
         Returns:
-            Словарь с результатом: {'success': bool, 'response': str, 'error': str}
+            Словарь с результатом: {'success': bool, 'response': str, 'error': str,
+            'metadata': dict}
         """
         pass
     
+    def get_session(self):
+        """Получить HTTP-сессию модели (соединения переиспользуются между запросами)"""
+        if self._session is None:
+            from timing import create_session
+            self._session = create_session()
+        return self._session
+    
+    def _post(self, headers: Dict, data: Dict, probe,
+              on_delta: Optional[Callable[[str], None]] = None,
+              response_format: Optional[Dict] = None):
+        """
+        Отправить POST-запрос к API с замером времени
+        
+        Без on_delta тело ответа читается сразу, с on_delta запрашивается
+        потоковый ответ, который затем читает _read_result.
+        """
+        import json
+        
+        if response_format is not None:
+            data = dict(data, response_format=response_format)
+        if on_delta is not None:
+            data = dict(data, stream=True, stream_options={'include_usage': True})
+        body = json.dumps(data).encode('utf-8')
+        probe.bytes_sent = len(body)
+        
+        with probe:
+            response = self.get_session().post(
+                self.api_url,
+                headers=headers,
+                data=body,
+                timeout=30,
+                stream=True
+            )
+            probe.mark_first_byte()
+            if on_delta is None or response.status_code >= 400:
+                probe.bytes_received = len(response.content)
+                probe.finish()
+        return response
+    
+    def _read_result(self, response, probe,
+                     on_delta: Optional[Callable[[str], None]] = None) -> Dict:
+        """Получить JSON ответа; потоковый ответ собирается в тот же формат"""
+        if on_delta is None:
+            return response.json()
+        
+        import json
+        
+        chunks = []
+        usage = None
+        has_choices = False
+        for line in response.iter_lines():
+            probe.bytes_received += len(line) + 1
+            if not line.startswith(b'data:'):
+                continue
+            payload = line[5:].strip()
+            if payload == b'[DONE]':
+                break
+            event = json.loads(payload)
+            if event.get('usage'):
+                usage = event['usage']
+            for choice in event.get('choices') or []:
+                has_choices = True
+                delta = (choice.get('delta') or {}).get('content')
+                if delta:
+                    probe.mark_first_token()
+                    chunks.append(delta)
+                    on_delta(delta)
+        probe.finish()
+        
+        result = {'usage': usage}
+        if has_choices:
+            result['choices'] = [{'message': {'content': ''.join(chunks)}}]
+        return result
+    
+    def calculate_cost(self, prompt_tokens: Optional[int],
+                       completion_tokens: Optional[int]) -> Optional[float]:
+        """Рассчитать стоимость запроса по ценам модели (None, если цены не заданы)"""
+        if self.prompt_price is None and self.completion_price is None:
+            return None
+        cost = (prompt_tokens or 0) * (self.prompt_price or 0)
+        cost += (completion_tokens or 0) * (self.completion_price or 0)
+        return cost / 1_000_000
+    
+    def _build_metadata(self, probe, status_code: Optional[int] = None,
+                        result: Optional[Dict] = None) -> Dict:
+        """
+        Собрать метаданные запроса: токены, задержку, HTTP-статус и стоимость
+        
+        Args:
+            probe: Замер времени запроса (TimingProbe)
+            status_code: HTTP-статус ответа
+            result: Разобранный JSON ответа (блок 'usage' берется из него)
+        """
+        probe.finish()
+        latency = probe.total_time
+        usage = (result or {}).get('usage') or {}
+        prompt_tokens = usage.get('prompt_tokens')
+        completion_tokens = usage.get('completion_tokens')
+        total_tokens = usage.get('total_tokens')
+        if total_tokens is None and (prompt_tokens is not None or completion_tokens is not None):
+            total_tokens = (prompt_tokens or 0) + (completion_tokens or 0)
+        
+        cost = self.calculate_cost(prompt_tokens, completion_tokens)
+        if cost is None and usage.get('cost') is not None:
+            # OpenRouter сам сообщает стоимость запроса
+            cost = float(usage['cost'])
+        
+        return {
+            'provider': self.provider,
+            'api_id': self.api_id,
+            'status_code': status_code,
+            'latency': round(latency, 4),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': total_tokens,
+            'tokens_per_second': round(completion_tokens / latency, 2)
+            if completion_tokens and latency > 0 else None,
+            'cost': cost,
+            'timing': probe.to_dict()
+        }
+    
     def to_dict(self) -> Dict:
         """Преобразовать модель в словарь"""
         return {
@@ -52,17 +193,25 @@ class Model(ABC):
             'api_url': self.api_url,
             'api_id': self.api_id,
             'api_key_env_var': self.api_key_env_var,
-            'is_active': self.is_active
+            'is_active': self.is_active,
+            'prompt_price': self.prompt_price,
+            'completion_price': self.completion_price
         }
 
 
 class OpenAIModel(Model):
     """Модель для OpenAI API"""
     
-    def send_request(self, prompt: str) -> Dict:
+    provider = 'openai'
+    supports_json_response = True
+    
+    def send_request(self, prompt: str,
+                     on_delta: Optional[Callable[[str], None]] = None,
+                     response_format: Optional[Dict] = None) -> Dict:
         """Отправить запрос к OpenAI API"""
         import requests
         import json
+        from timing import TimingProbe
         
         api_key = self.get_api_key()
         headers = {
@@ -78,50 +227,57 @@ class OpenAIModel(Model):
             "temperature": 0.7
         }
         
+        probe = TimingProbe()
         try:
-            response = requests.post(
-                self.api_url,
-                headers=headers,
-                json=data,
-                timeout=30
-            )
+            response = self._post(headers, data, probe, on_delta, response_format)
             response.raise_for_status()
             
-            result = response.json()
+            result = self._read_result(response, probe, on_delta)
             if 'choices' in result and len(result['choices']) > 0:
                 response_text = result['choices'][0]['message']['content']
                 return {
                     'success': True,
                     'response': response_text,
-                    'error': None
+                    'error': None,
+                    'metadata': self._build_metadata(probe, response.status_code, result)
                 }
             else:
                 return {
                     'success': False,
                     'response': None,
-                    'error': 'Неожиданный формат ответа от API'
+                    'error': 'Неожиданный формат ответа от API',
+                    'metadata': self._build_metadata(probe, response.status_code, result)
                 }
         except requests.exceptions.RequestException as e:
+            status_code = e.response.status_code if e.response is not None else None
             return {
                 'success': False,
                 'response': None,
-                'error': f'Ошибка запроса: {str(e)}'
+                'error': f'Ошибка запроса: {str(e)}',
+                'metadata': self._build_metadata(probe, status_code)
             }
         except Exception as e:
             return {
                 'success': False,
                 'response': None,
-                'error': f'Неожиданная ошибка: {str(e)}'
+                'error': f'Неожиданная ошибка: {str(e)}',
+                'metadata': self._build_metadata(probe)
             }
 
 
 class DeepSeekModel(Model):
     """Модель для DeepSeek API"""
     
-    def send_request(self, prompt: str) -> Dict:
+    provider = 'deepseek'
+    supports_json_response = True
+    
+    def send_request(self, prompt: str,
+                     on_delta: Optional[Callable[[str], None]] = None,
+                     response_format: Optional[Dict] = None) -> Dict:
         """Отправить запрос к DeepSeek API"""
         import requests
         import json
+        from timing import TimingProbe
         
         api_key = self.get_api_key()
         headers = {
@@ -137,50 +293,57 @@ class DeepSeekModel(Model):
             "temperature": 0.7
         }
         
+        probe = TimingProbe()
         try:
-            response = requests.post(
-                self.api_url,
-                headers=headers,
-                json=data,
-                timeout=30
-            )
+            response = self._post(headers, data, probe, on_delta, response_format)
             response.raise_for_status()
             
-            result = response.json()
+            result = self._read_result(response, probe, on_delta)
             if 'choices' in result and len(result['choices']) > 0:
                 response_text = result['choices'][0]['message']['content']
                 return {
                     'success': True,
                     'response': response_text,
-                    'error': None
+                    'error': None,
+                    'metadata': self._build_metadata(probe, response.status_code, result)
                 }
             else:
                 return {
                     'success': False,
                     'response': None,
-                    'error': 'Неожиданный формат ответа от API'
+                    'error': 'Неожиданный формат ответа от API',
+                    'metadata': self._build_metadata(probe, response.status_code, result)
                 }
         except requests.exceptions.RequestException as e:
+            status_code = e.response.status_code if e.response is not None else None
             return {
                 'success': False,
                 'response': None,
-                'error': f'Ошибка запроса: {str(e)}'
+                'error': f'Ошибка запроса: {str(e)}',
+                'metadata': self._build_metadata(probe, status_code)
             }
         except Exception as e:
             return {
                 'success': False,
                 'response': None,
-                'error': f'Неожиданная ошибка: {str(e)}'
+                'error': f'Неожиданная ошибка: {str(e)}',
+                'metadata': self._build_metadata(probe)
             }
 
 
 class GroqModel(Model):
     """Модель для Groq API"""
     
-    def send_request(self, prompt: str) -> Dict:
+    provider = 'groq'
+    supports_json_response = True
+    
+    def send_request(self, prompt: str,
+                     on_delta: Optional[Callable[[str], None]] = None,
+                     response_format: Optional[Dict] = None) -> Dict:
         """Отправить запрос к Groq API"""
         import requests
         import json
+        from timing import TimingProbe
         
         api_key = self.get_api_key()
         headers = {
@@ -196,50 +359,56 @@ class GroqModel(Model):
             "temperature": 0.7
         }
         
+        probe = TimingProbe()
         try:
-            response = requests.post(
-                self.api_url,
-                headers=headers,
-                json=data,
-                timeout=30
-            )
+            response = self._post(headers, data, probe, on_delta, response_format)
             response.raise_for_status()
             
-            result = response.json()
+            result = self._read_result(response, probe, on_delta)
             if 'choices' in result and len(result['choices']) > 0:
                 response_text = result['choices'][0]['message']['content']
                 return {
                     'success': True,
                     'response': response_text,
-                    'error': None
+                    'error': None,
+                    'metadata': self._build_metadata(probe, response.status_code, result)
                 }
             else:
                 return {
                     'success': False,
                     'response': None,
-                    'error': 'Неожиданный формат ответа от API'
+                    'error': 'Неожиданный формат ответа от API',
+                    'metadata': self._build_metadata(probe, response.status_code, result)
                 }
         except requests.exceptions.RequestException as e:
+            status_code = e.response.status_code if e.response is not None else None
             return {
                 'success': False,
                 'response': None,
-                'error': f'Ошибка запроса: {str(e)}'
+                'error': f'Ошибка запроса: {str(e)}',
+                'metadata': self._build_metadata(probe, status_code)
             }
         except Exception as e:
             return {
                 'success': False,
                 'response': None,
-                'error': f'Неожиданная ошибка: {str(e)}'
+                'error': f'Неожиданная ошибка: {str(e)}',
+                'metadata': self._build_metadata(probe)
             }
 
 
 class OpenRouterModel(Model):
     """Модель для OpenRouter API"""
     
-    def send_request(self, prompt: str) -> Dict:
+    provider = 'openrouter'
+    
+    def send_request(self, prompt: str,
+                     on_delta: Optional[Callable[[str], None]] = None,
+                     response_format: Optional[Dict] = None) -> Dict:
         """Отправить запрос к OpenRouter API"""
         import requests
         import json
+        from timing import TimingProbe
         
         api_key = self.get_api_key()
         headers = {
@@ -257,13 +426,9 @@ class OpenRouterModel(Model):
             "temperature": 0.7
         }
         
+        probe = TimingProbe()
         try:
-            response = requests.post(
-                self.api_url,
-                headers=headers,
-                json=data,
-                timeout=30
-            )
+            response = self._post(headers, data, probe, on_delta, response_format)
             
             # Проверяем статус код перед парсингом JSON
             if response.status_code != 200:
@@ -271,23 +436,26 @@ class OpenRouterModel(Model):
                 return {
                     'success': False,
                     'response': None,
-                    'error': error_message
+                    'error': error_message,
+                    'metadata': self._build_metadata(probe, response.status_code)
                 }
             
             # Если статус 200, парсим ответ
-            result = response.json()
+            result = self._read_result(response, probe, on_delta)
             if 'choices' in result and len(result['choices']) > 0:
                 response_text = result['choices'][0]['message']['content']
                 return {
                     'success': True,
                     'response': response_text,
-                    'error': None
+                    'error': None,
+                    'metadata': self._build_metadata(probe, response.status_code, result)
                 }
             else:
                 return {
                     'success': False,
                     'response': None,
-                    'error': 'Неожиданный формат ответа от API'
+                    'error': 'Неожиданный формат ответа от API',
+                    'metadata': self._build_metadata(probe, response.status_code, result)
                 }
         except requests.exceptions.HTTPError as e:
             # Обработка HTTP ошибок (когда raise_for_status() вызывается)
@@ -298,41 +466,52 @@ class OpenRouterModel(Model):
             return {
                 'success': False,
                 'response': None,
-                'error': error_message
+                'error': error_message,
+                'metadata': self._build_metadata(
+                    probe, response_obj.status_code if response_obj is not None else None
+                )
             }
         except requests.exceptions.RequestException as e:
             # Для других ошибок запросов пытаемся извлечь информацию об ошибке
             error_msg = str(e)
+            metadata = self._build_metadata(
+                probe, e.response.status_code if e.response is not None else None
+            )
             # Если это ошибка с кодом статуса в сообщении, пытаемся обработать
             if '404' in error_msg:
                 return {
                     'success': False,
                     'response': None,
-                    'error': f'Модель "{self.api_id}" не найдена (404). Проверьте правильность имени модели на https://openrouter.ai/models'
+                    'error': f'Модель "{self.api_id}" не найдена (404). Проверьте правильность имени модели на https://openrouter.ai/models',
+                    'metadata': metadata
                 }
             elif '402' in error_msg:
                 return {
                     'success': False,
                     'response': None,
-                    'error': f'Требуется оплата. Модель "{self.api_id}" требует пополнения баланса на OpenRouter.'
+                    'error': f'Требуется оплата. Модель "{self.api_id}" требует пополнения баланса на OpenRouter.',
+                    'metadata': metadata
                 }
             elif '429' in error_msg:
                 return {
                     'success': False,
                     'response': None,
-                    'error': 'Превышен лимит запросов. Подождите 1-2 минуты и попробуйте снова.'
+                    'error': 'Превышен лимит запросов. Подождите 1-2 минуты и попробуйте снова.',
+                    'metadata': metadata
                 }
             else:
                 return {
                     'success': False,
                     'response': None,
-                    'error': f'Ошибка запроса: {error_msg}'
+                    'error': f'Ошибка запроса: {error_msg}',
+                    'metadata': metadata
                 }
         except Exception as e:
             return {
                 'success': False,
                 'response': None,
-                'error': f'Неожиданная ошибка: {str(e)}'
+                'error': f'Неожиданная ошибка: {str(e)}',
+                'metadata': self._build_metadata(probe)
             }
     
     def _parse_openrouter_error(self, response):
@@ -340,7 +519,7 @@ class OpenRouterModel(Model):
         import logging
         logger = logging.getLogger(__name__)
         
-        if not response:
+        if response is None:
             logger.warning(f"OpenRouterModel._parse_openrouter_error: response is None для модели {self.api_id}")
             return f'Ошибка подключения к OpenRouter. Проверьте интернет-соединение и правильность API-ключа.'
         
@@ -350,7 +529,7 @@ class OpenRouterModel(Model):
         error_detail = ""
         response_text = ""
         try:
-            if response:
+            if response is not None:
                 response_text = response.text[:200] if hasattr(response, 'text') else ""
                 try:
                     error_data = response.json()
@@ -433,7 +612,9 @@ class ModelFactory:
             api_url=model_data['api_url'],
             api_id=model_data['api_id'],
             api_key_env_var=model_data['api_key_env_var'],
-            is_active=bool(model_data.get('is_active', 1))
+            is_active=bool(model_data.get('is_active', 1)),
+            prompt_price=model_data.get('prompt_price'),
+            completion_price=model_data.get('completion_price')
         )
     
     @classmethod
@@ -441,3 +622,103 @@ class ModelFactory:
         """Зарегистрировать новый тип модели"""
         cls._model_classes[model_type.lower()] = model_class
 
+
+class ModelRegistry:
+    """
+    Кэш экземпляров моделей, созданных из БД
+    
+    Экземпляры хранят найденный API-ключ и пул HTTP-соединений, поэтому
+    создавать их заново при каждой отправке дорого. Реестр загружает таблицу
+    models одним запросом и перечитывает ее, только когда Database сообщает
+    об изменении моделей (Database.models_version). Модели, данные которых
+    не изменились, сохраняют прежние экземпляры.
+    
+    Изменения, сделанные в файл БД в обход этого экземпляра Database, видны
+    после invalidate().
+    """
+    
+    # Поля, при изменении которых модель создается заново
+    _IDENTITY_FIELDS = ('model_type', 'name', 'api_url', 'api_id', 'api_key_env_var',
+                        'prompt_price', 'completion_price')
+    
+    _registries: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+    _registries_lock = threading.Lock()
+    
+    def __init__(self, db):
+        """
+        Args:
+            db: Экземпляр Database
+        """
+        self.db = db
+        self._lock = threading.Lock()
+        self._models: Dict[int, Tuple[Dict, Model]] = {}  # ID -> (данные из БД, экземпляр)
+        self._active_ids: List[int] = []
+        self._unsupported_active = 0  # Активные модели неподдерживаемых типов
+        self._version: Optional[int] = None
+    
+    @classmethod
+    def for_database(cls, db) -> 'ModelRegistry':
+        """Общий реестр для экземпляра Database"""
+        with cls._registries_lock:
+            registry = cls._registries.get(db)
+            if registry is None:
+                registry = cls(db)
+                cls._registries[db] = registry
+            return registry
+    
+    def active_models(self) -> List[Model]:
+        """Активные модели в порядке названий"""
+        with self._lock:
+            self._sync()
+            return [self._models[model_id][1] for model_id in self._active_ids]
+    
+    def models_by_ids(self, model_ids: List[int]) -> List[Model]:
+        """Модели с указанными ID в порядке списка (отсутствующие пропускаются)"""
+        with self._lock:
+            self._sync()
+            return [self._models[model_id][1] for model_id in model_ids
+                    if model_id in self._models]
+    
+    def unsupported_active_count(self) -> int:
+        """Количество активных моделей, тип которых не поддерживается"""
+        with self._lock:
+            self._sync()
+            return self._unsupported_active
+    
+    def invalidate(self):
+        """Перечитать модели из БД при следующем обращении"""
+        with self._lock:
+            self._version = None
+    
+    def _sync(self):
+        """Перечитать таблицу models, если она изменилась"""
+        version = self.db.models_version
+        if version == self._version:
+            return
+        
+        models = {}
+        active_ids = []
+        unsupported_active = 0
+        for row in self.db.get_all_models():
+            model_id = row['id']
+            cached = self._models.get(model_id)
+            if cached and all(cached[0].get(f) == row.get(f) for f in self._IDENTITY_FIELDS):
+                model = cached[1]
+                model.is_active = bool(row.get('is_active', 1))
+            else:
+                model = ModelFactory.create_model_from_db(row)
+                if model is None:
+                    import logging
+                    logging.getLogger(__name__).warning(
+                        f"Не удалось создать модель типа {row.get('model_type')}"
+                    )
+                    unsupported_active += 1 if row.get('is_active', 1) else 0
+                    continue
+            models[model_id] = (row, model)
+            if model.is_active:
+                active_ids.append(model_id)
+        
+        self._models = models
+        self._active_ids = active_ids
+        self._unsupported_active = unsupported_active
+        self._version = version
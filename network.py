@@ -1,21 +1,30 @@
 """Модуль сетевых запросов к API моделей"""
+import json
 import logging
-from typing import List, Dict, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from models import Model, ModelFactory
+import threading
+from functools import partial
+from typing import Callable, List, Dict, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from models import Model, ModelRegistry
 from config import DEFAULT_TIMEOUT
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 
 class NetworkManager:
     """Менеджер для отправки запросов к API моделей"""
     
+    # Выполняющиеся запросы общие для всех экземпляров менеджера: главное окно,
+    # ассистент и пакетные задачи создают свои менеджеры, но одинаковый запрос
+    # к одной и той же модели должен уходить в сеть только один раз
+    _inflight: Dict[Tuple, Future] = {}
+    _inflight_lock = threading.Lock()
+    
+    # Получатели результатов запросов, ушедших в сеть, общие для всех
+    # экземпляров: так статистика использования учитывает запросы главного
+    # окна, ассистента и пакетных задач в одном месте
+    _request_listeners: List[Callable[[Dict], None]] = []
+    
     def __init__(self, timeout: int = DEFAULT_TIMEOUT, max_workers: int = 5):
         """
         Инициализация менеджера
@@ -27,13 +36,23 @@ class NetworkManager:
         self.timeout = timeout
         self.max_workers = max_workers
     
-    def send_to_model(self, model: Model, prompt: str) -> Dict:
+    def send_to_model(self, model: Model, prompt: str,
+                      on_delta: Optional[Callable[[str], None]] = None,
+                      response_format: Optional[Dict] = None) -> Dict:
         """
         Отправить запрос к одной модели
         
+        Одновременные одинаковые запросы (та же модель и тот же промт)
+        объединяются: HTTP-запрос выполняется один раз, а все ожидающие
+        получают копию одного и того же результата. Фрагменты потокового
+        ответа получает только запрос, который выполняется в сети.
+        
         Args:
             model: Экземпляр модели
             prompt: Текст промта
+            on_delta: Если задан, ответ запрашивается потоком и каждый
+                полученный фрагмент текста передается в эту функцию
+            response_format: Формат ответа для API (см. Model.send_request)
             
         Returns:
             Словарь с результатом:
@@ -42,19 +61,89 @@ class NetworkManager:
                 'model_id': int (опционально),
                 'success': bool,
                 'response': str,
-                'error': str
+                'error': str,
+                'metadata': dict (токены, задержка, HTTP-статус, стоимость)
             }
         """
+        key = self._request_key(model, prompt, response_format)
+        
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._inflight[key] = future
+        
+        if not is_leader:
+            logger.info(f"Запрос к модели {model.name} объединен с уже выполняющимся")
+            result = future.result()
+            metadata = dict(result.get('metadata') or {}, coalesced=True)
+            return dict(result, model_name=model.name, metadata=metadata)
+        
+        try:
+            result = self._send_request(model, prompt, on_delta, response_format)
+            future.set_result(result)
+            self._notify_request_listeners(dict(result))
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+        
+        return dict(result)
+    
+    @classmethod
+    def add_request_listener(cls, listener: Callable[[Dict], None]):
+        """
+        Подписаться на результаты запросов всех менеджеров
+        
+        Функция вызывается из рабочего потока с результатом каждого
+        запроса, выполненного в сети (объединенные запросы не передаются).
+        """
+        cls._request_listeners.append(listener)
+    
+    @classmethod
+    def remove_request_listener(cls, listener: Callable[[Dict], None]):
+        """Отписаться от результатов запросов"""
+        if listener in cls._request_listeners:
+            cls._request_listeners.remove(listener)
+    
+    def _notify_request_listeners(self, result: Dict):
+        for listener in list(self._request_listeners):
+            try:
+                listener(result)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика результата запроса: {str(e)}")
+    
+    @staticmethod
+    def _request_key(model: Model, prompt: str,
+                     response_format: Optional[Dict] = None) -> Tuple:
+        """Ключ для объединения одинаковых запросов"""
+        return (type(model).__name__, model.api_url, model.api_id,
+                model.api_key_env_var, prompt,
+                json.dumps(response_format, sort_keys=True) if response_format else None)
+    
+    def _send_request(self, model: Model, prompt: str,
+                      on_delta: Optional[Callable[[str], None]] = None,
+                      response_format: Optional[Dict] = None) -> Dict:
+        """Выполнить запрос к модели без объединения"""
         logger.info(f"Отправка запроса к модели: {model.name}")
         
         try:
-            result = model.send_request(prompt)
+            kwargs = {}
+            if on_delta is not None:
+                kwargs['on_delta'] = on_delta
+            if response_format is not None:
+                kwargs['response_format'] = response_format
+            result = model.send_request(prompt, **kwargs)
             
             response_dict = {
                 'model_name': model.name,
                 'success': result['success'],
                 'response': result.get('response'),
-                'error': result.get('error')
+                'error': result.get('error'),
+                'metadata': result.get('metadata')
             }
             
             if result['success']:
@@ -70,16 +159,24 @@ class NetworkManager:
                 'model_name': model.name,
                 'success': False,
                 'response': None,
-                'error': f'Неожиданная ошибка: {str(e)}'
+                'error': f'Неожиданная ошибка: {str(e)}',
+                'metadata': None
             }
     
-    def send_to_all_models(self, prompt: str, models: List[Model]) -> List[Dict]:
+    def send_to_all_models(self, prompt: str, models: List[Model],
+                           on_delta: Optional[Callable[[int, str], None]] = None,
+                           on_result: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
         """
         Отправить промт во все модели параллельно
         
         Args:
             prompt: Текст промта
             models: Список экземпляров моделей
+            on_delta: Если задан, ответы запрашиваются потоком; функция
+                получает индекс модели в списке models и фрагмент текста
+                (вызывается из рабочих потоков)
+            on_result: Если задана, вызывается с каждым результатом по мере
+                получения (из потока, вызвавшего send_to_all_models)
             
         Returns:
             Список словарей с результатами в едином формате:
@@ -88,7 +185,8 @@ class NetworkManager:
                     'model_name': str,
                     'success': bool,
                     'response': str,
-                    'error': str
+                    'error': str,
+                    'metadata': dict
                 },
                 ...
             ]
@@ -105,8 +203,9 @@ class NetworkManager:
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             # Запускаем все запросы параллельно
             future_to_model = {
-                executor.submit(self.send_to_model, model, prompt): model
-                for model in models
+                executor.submit(self.send_to_model, model, prompt,
+                                partial(on_delta, index) if on_delta else None): model
+                for index, model in enumerate(models)
             }
             
             # Собираем результаты по мере их готовности
@@ -114,19 +213,57 @@ class NetworkManager:
                 model = future_to_model[future]
                 try:
                     result = future.result()
-                    results.append(result)
                 except Exception as e:
                     logger.error(f"Ошибка при выполнении запроса к {model.name}: {str(e)}")
-                    results.append({
+                    result = {
                         'model_name': model.name,
                         'success': False,
                         'response': None,
-                        'error': f'Ошибка выполнения: {str(e)}'
-                    })
+                        'error': f'Ошибка выполнения: {str(e)}',
+                        'metadata': None
+                    }
+                results.append(result)
+                if on_result:
+                    on_result(result)
         
         logger.info(f"Получено {len(results)} результатов")
         return results
     
+    def run_concurrently(self, tasks: Dict[str, Callable[[], Dict]],
+                         on_result: Optional[Callable[[str, Dict], None]] = None) -> Dict[str, Dict]:
+        """
+        Выполнить независимые запросы параллельно
+        
+        Общее время равно времени самого долгого запроса, а не их сумме.
+        
+        Args:
+            tasks: Имя задачи -> функция, выполняющая запрос и возвращающая
+                словарь с ключами 'success' и 'error'
+            on_result: Если задана, вызывается с именем задачи и ее результатом
+                по мере завершения задач (из рабочих потоков)
+            
+        Returns:
+            Имя задачи -> результат
+        """
+        results = {}
+        if not tasks:
+            return results
+        
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(tasks))) as executor:
+            future_to_name = {executor.submit(task): name for name, task in tasks.items()}
+            for future in as_completed(future_to_name):
+                name = future_to_name[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Ошибка при выполнении задачи {name}: {str(e)}")
+                    result = {'success': False, 'error': f'Ошибка выполнения: {str(e)}'}
+                results[name] = result
+                if on_result:
+                    on_result(name, result)
+        
+        return results
+    
     def send_to_models_from_db(self, prompt: str, db, model_ids: Optional[List[int]] = None) -> List[Dict]:
         """
         Отправить промт в модели из БД
@@ -139,28 +276,13 @@ class NetworkManager:
         Returns:
             Список словарей с результатами
         """
-        if model_ids:
-            models_data = []
-            for model_id in model_ids:
-                model_data = db.get_model_by_id(model_id)
-                if model_data:
-                    models_data.append(model_data)
-        else:
-            models_data = db.get_active_models()
-        
-        if not models_data:
+        registry = ModelRegistry.for_database(db)
+        models = registry.models_by_ids(model_ids) if model_ids else registry.active_models()
+        
+        if not models:
             logger.warning("Не найдено активных моделей")
             return []
         
-        # Создаем экземпляры моделей из данных БД
-        models = []
-        for model_data in models_data:
-            model = ModelFactory.create_model_from_db(model_data)
-            if model:
-                models.append(model)
-            else:
-                logger.warning(f"Не удалось создать модель типа {model_data.get('model_type')}")
-        
         return self.send_to_all_models(prompt, models)
     
     def process_response(self, response: Dict) -> Dict:
@@ -179,5 +301,6 @@ class NetworkManager:
             'model_name': response.get('model_name', 'Unknown'),
             'success': response.get('success', False),
             'response': response.get('response', ''),
-            'error': response.get('error')
+            'error': response.get('error'),
+            'metadata': response.get('metadata')
         }
@@ -2,25 +2,114 @@
 import re
 import json
 import logging
-from typing import Dict, List, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
 from models import Model
 from network import NetworkManager
+from prompt_cache import PromptCache
 
 logger = logging.getLogger(__name__)
 
+# Специализации, под которые адаптируется промт
+ADAPTATION_TYPES = {
+    'code': 'программирование и разработка кода',
+    'analysis': 'анализ данных и логическое мышление',
+    'creative': 'креативные задачи и творчество'
+}
+
+# Формат ответа для комбинированного запроса у провайдеров с JSON-режимом
+JSON_RESPONSE_FORMAT = {'type': 'json_object'}
+
+# Шаблоны для разбора ответов. Ответы моделей бывают очень длинными, поэтому
+# шаблоны ищут только короткие маркеры без вложенных и ленивых повторений
+# (время поиска линейно от длины ответа), а границы текста между маркерами
+# находятся через str.find
+_IMPROVED_LABEL = re.compile(r'улучшенный|improved|результат', re.IGNORECASE)
+_VARIANT_MARKER = re.compile(r'вариант\s+\d+', re.IGNORECASE)
+_VARIANT_LINE = re.compile(r'\n[^\S\n]*вариант\s+\d+', re.IGNORECASE)
+_LIST_ITEM = re.compile(r'^(?:\d+[.)]|[-*•])', re.MULTILINE)
+_FENCE_LANGUAGE = re.compile(r'(?:prompt|text)?')
+_LABEL_SEPARATOR = re.compile(r'[\s:]*')
+_WHITESPACE = re.compile(r'\s*')
+_BULLET_PREFIX = re.compile(r'^[-*•]\s*', re.MULTILINE)
+_NUMBER_PREFIX = re.compile(r'^\d+[.)]\s*', re.MULTILINE)
+
+
+def _paragraph_after(text: str, pos: int) -> Optional[str]:
+    """Абзац после метки: пропускаются пробелы и двоеточия, текст идет до пустой строки"""
+    start = _LABEL_SEPARATOR.match(text, pos).end()
+    if start >= len(text):
+        return None
+    end = text.find('\n\n', start + 1)
+    return text[start:end if end != -1 else len(text)].strip()
+
+
+def _fenced_block(text: str) -> Optional[str]:
+    """Содержимое первого блока кода ```...``` (None, если блока нет)"""
+    opening = text.find('```')
+    if opening == -1:
+        return None
+    # Начало содержимого: после языка и перевода строки, а если тогда блок
+    # оказывается пустым — раньше (язык и перевод строки необязательны)
+    pos = opening + 3
+    language = _FENCE_LANGUAGE.match(text, pos).end()
+    newline = int(text.startswith('\n', language))
+    starts = [language + newline, language, pos + int(text.startswith('\n', pos)), pos]
+    for start in dict.fromkeys(starts):
+        closing = text.find('```', start + 1)
+        if closing == -1:
+            continue
+        if text[closing - 1] == '\n' and closing - 1 > start:
+            closing -= 1
+        return text[start:closing].strip()
+    return None
+
+
+def _extract_json_object(text: str) -> Optional[Dict]:
+    """Найти JSON-объект в ответе модели (в том числе внутри блока кода)"""
+    cleaned = text.strip()
+    candidates = [cleaned]
+    start, end = cleaned.find('{'), cleaned.rfind('}')
+    if 0 <= start < end:
+        candidates.append(cleaned[start:end + 1])
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
 
 class PromptAssistant:
     """Класс для работы с улучшением промтов"""
     
-    def __init__(self, network_manager: Optional[NetworkManager] = None):
+    def __init__(self, network_manager: Optional[NetworkManager] = None,
+                 cache: Optional[PromptCache] = None):
         """
         Инициализация ассистента
         
         Args:
             network_manager: Менеджер сетевых запросов (если None, создается новый)
+            cache: Кэш ответов (если None, используется кэш только в памяти)
         """
         self.network_manager = network_manager or NetworkManager()
-        self.cache = {}  # Простой кэш для одинаковых промтов
+        self.cache = cache if cache is not None else PromptCache()
+    
+    def _cached(self, operation: str, prompt: str, model: Model, params: Dict,
+                run: Callable[[], Dict]) -> Dict:
+        """Вернуть результат операции из кэша или выполнить ее и сохранить успешный результат"""
+        key = PromptCache.make_key(operation, model.api_id, prompt, params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.info(f"Использован кэш для операции {operation}")
+            return dict(cached)
+        
+        result = run()
+        if result.get('success'):
+            self.cache.put(key, result, operation, model.api_id)
+        return result
     
     def improve_prompt(self, prompt: str, model: Model) -> Dict:
         """
@@ -38,12 +127,10 @@ class PromptAssistant:
                 'error': str
             }
         """
-        # Проверяем кэш
-        cache_key = f"{model.name}:{prompt[:100]}"
-        if cache_key in self.cache:
-            logger.info("Использован кэш для улучшения промта")
-            return self.cache[cache_key]
-        
+        return self._cached('improve', prompt, model, {},
+                            lambda: self._improve_prompt(prompt, model))
+    
+    def _improve_prompt(self, prompt: str, model: Model) -> Dict:
         # Формируем промпт для улучшения
         improvement_prompt = self._create_improvement_prompt(prompt)
         
@@ -52,14 +139,11 @@ class PromptAssistant:
         
         if result.get('success'):
             improved = self._parse_improved_prompt(result.get('response', ''))
-            response = {
+            return {
                 'success': True,
                 'improved_prompt': improved,
                 'error': None
             }
-            # Сохраняем в кэш
-            self.cache[cache_key] = response
-            return response
         else:
             return {
                 'success': False,
@@ -84,6 +168,10 @@ class PromptAssistant:
                 'error': str
             }
         """
+        return self._cached('variants', prompt, model, {'count': count},
+                            lambda: self._generate_variants(prompt, model, count))
+    
+    def _generate_variants(self, prompt: str, model: Model, count: int) -> Dict:
         # Формируем промпт для генерации вариантов
         variants_prompt = self._create_variants_prompt(prompt, count)
         
@@ -121,6 +209,10 @@ class PromptAssistant:
                 'error': str
             }
         """
+        return self._cached('adapt', prompt, model, {'model_type': model_type.lower()},
+                            lambda: self._adapt_for_model_type(prompt, model_type, model))
+    
+    def _adapt_for_model_type(self, prompt: str, model_type: str, model: Model) -> Dict:
         # Формируем промпт для адаптации
         adaptation_prompt = self._create_adaptation_prompt(prompt, model_type)
         
@@ -143,15 +235,22 @@ class PromptAssistant:
     
     def improve_with_variants(self, prompt: str, model: Model, 
                              generate_variants: bool = True,
-                             adapt_for_type: Optional[str] = None) -> Dict:
+                             adapt_for_type: Optional[str] = None,
+                             on_partial: Optional[Callable[[str, Dict], None]] = None) -> Dict:
         """
         Комплексное улучшение промта с вариантами
         
+        Улучшение, генерация вариантов и адаптация независимы друг от друга
+        и выполняются параллельно через NetworkManager.
+        
         Args:
             prompt: Исходный промт
             model: Модель для улучшения
             generate_variants: Генерировать ли варианты переформулировки
             adapt_for_type: Тип адаптации ('code', 'analysis', 'creative') или None
+            on_partial: Если задана, вызывается по мере готовности каждой части
+                с ее именем ('improve', 'variants', 'adapt') и результатом
+                соответствующего метода (из рабочих потоков)
             
         Returns:
             Словарь с результатом:
@@ -171,8 +270,15 @@ class PromptAssistant:
             'error': None
         }
         
-        # Улучшаем основной промт
-        improved_result = self.improve_prompt(prompt, model)
+        tasks = {'improve': lambda: self.improve_prompt(prompt, model)}
+        if generate_variants:
+            tasks['variants'] = lambda: self.generate_variants(prompt, model)
+        if adapt_for_type:
+            tasks['adapt'] = lambda: self.adapt_for_model_type(prompt, adapt_for_type, model)
+        
+        parts = self.network_manager.run_concurrently(tasks, on_partial)
+        
+        improved_result = parts['improve']
         if not improved_result.get('success'):
             result['error'] = improved_result.get('error')
             return result
@@ -180,17 +286,15 @@ class PromptAssistant:
         result['improved_prompt'] = improved_result.get('improved_prompt')
         result['success'] = True
         
-        # Генерируем варианты, если нужно
-        if generate_variants:
-            variants_result = self.generate_variants(prompt, model)
+        if 'variants' in parts:
+            variants_result = parts['variants']
             if variants_result.get('success'):
                 result['variants'] = variants_result.get('variants', [])
             else:
                 logger.warning(f"Не удалось сгенерировать варианты: {variants_result.get('error')}")
         
-        # Адаптируем под тип, если указан
-        if adapt_for_type:
-            adapted_result = self.adapt_for_model_type(prompt, adapt_for_type, model)
+        if 'adapt' in parts:
+            adapted_result = parts['adapt']
             if adapted_result.get('success'):
                 result['adapted_prompt'] = adapted_result.get('adapted_prompt')
             else:
@@ -198,6 +302,123 @@ class PromptAssistant:
         
         return result
     
+    def improve_batch(self, prompts: List[Dict], model: Model, max_concurrency: int = 4,
+                      on_result: Optional[Callable[[int, Dict], None]] = None,
+                      should_stop: Optional[Callable[[], bool]] = None) -> int:
+        """
+        Улучшить список промтов с ограничением числа одновременных запросов
+        
+        Одновременно выполняется не больше max_concurrency запросов: следующий
+        промт отправляется, когда завершается один из текущих. После остановки
+        (should_stop вернула True) новые запросы не отправляются, а уже
+        отправленные дожидаются завершения.
+        
+        Args:
+            prompts: Промты в виде словарей с ключами 'id' и 'prompt'
+            model: Модель для улучшения
+            max_concurrency: Максимальное количество одновременных запросов
+            on_result: Вызывается с ID промта и результатом improve_prompt
+                по мере завершения (из рабочих потоков)
+            should_stop: Проверка запроса на остановку
+            
+        Returns:
+            Количество обработанных промтов
+        """
+        pending = iter(prompts)
+        processed = 0
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            running = {}
+            
+            def submit_next() -> bool:
+                if should_stop and should_stop():
+                    return False
+                item = next(pending, None)
+                if item is None:
+                    return False
+                future = executor.submit(self.improve_prompt, item['prompt'], model)
+                running[future] = item['id']
+                return True
+            
+            while len(running) < max_concurrency and submit_next():
+                pass
+            
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    prompt_id = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"Ошибка при улучшении промта {prompt_id}: {str(e)}")
+                        result = {'success': False, 'improved_prompt': None,
+                                  'error': f'Ошибка: {str(e)}'}
+                    processed += 1
+                    if on_result:
+                        on_result(prompt_id, result)
+                    submit_next()
+        
+        return processed
+    
+    def improve_combined(self, prompt: str, model: Model,
+                         generate_variants: bool = True,
+                         adapt_for_type: Optional[str] = None,
+                         on_partial: Optional[Callable[[str, Dict], None]] = None) -> Dict:
+        """
+        Комплексное улучшение промта одним запросом
+        
+        Модель возвращает улучшенный промт, варианты и адаптацию одним
+        JSON-объектом: исходный промт передается один раз, а не три. Если
+        провайдер поддерживает response_format, JSON запрашивается через API;
+        если ответ не удалось разобрать как JSON, используются обычные парсеры.
+        
+        Args и результат — как у improve_with_variants; on_partial вызывается
+        для каждой части после получения ответа.
+        """
+        count = 3 if generate_variants else 0
+        model_type = adapt_for_type.lower() if adapt_for_type else None
+        result = self._cached('combined', prompt, model, {'count': count, 'model_type': model_type},
+                              lambda: self._improve_combined(prompt, model, count, model_type))
+        
+        if on_partial and result.get('success'):
+            on_partial('improve', {'success': True, 'improved_prompt': result['improved_prompt'],
+                                   'error': None})
+            if generate_variants:
+                on_partial('variants', {'success': bool(result['variants']),
+                                        'variants': result['variants'], 'error': None})
+            if adapt_for_type:
+                on_partial('adapt', {'success': result['adapted_prompt'] is not None,
+                                     'adapted_prompt': result['adapted_prompt'], 'error': None})
+        return result
+    
+    def _improve_combined(self, prompt: str, model: Model, count: int,
+                          model_type: Optional[str]) -> Dict:
+        combined_prompt = self._create_combined_prompt(prompt, count, model_type)
+        
+        response_format = JSON_RESPONSE_FORMAT if model.supports_json_response else None
+        result = self.network_manager.send_to_model(model, combined_prompt,
+                                                    response_format=response_format)
+        status_code = (result.get('metadata') or {}).get('status_code')
+        if response_format is not None and not result.get('success') and status_code == 400:
+            # Модель не поддерживает JSON-режим — повторяем обычным запросом
+            logger.warning(f"Модель {model.name} отклонила JSON-режим, повтор без response_format")
+            result = self.network_manager.send_to_model(model, combined_prompt)
+        
+        if not result.get('success'):
+            return {
+                'success': False,
+                'improved_prompt': None,
+                'variants': [],
+                'adapted_prompt': None,
+                'error': result.get('error', 'Неизвестная ошибка')
+            }
+        
+        parsed = self._parse_combined_response(result.get('response') or '', count,
+                                               model_type is not None)
+        if not parsed['improved_prompt']:
+            return dict(parsed, success=False, error='Модель не вернула улучшенный промт')
+        return dict(parsed, success=True, error=None)
+    
     def _create_improvement_prompt(self, prompt: str) -> str:
         """Создать промпт для улучшения"""
         return f"""Ты эксперт по написанию эффективных промптов для AI-моделей. 
@@ -239,13 +460,7 @@ class PromptAssistant:
 
     def _create_adaptation_prompt(self, prompt: str, model_type: str) -> str:
         """Создать промпт для адаптации под тип модели"""
-        type_descriptions = {
-            'code': 'программирование и разработка кода',
-            'analysis': 'анализ данных и логическое мышление',
-            'creative': 'креативные задачи и творчество'
-        }
-        
-        description = type_descriptions.get(model_type.lower(), 'специфические задачи')
+        description = ADAPTATION_TYPES.get(model_type.lower(), 'специфические задачи')
         
         return f"""Ты эксперт по адаптации промптов для разных типов AI-моделей.
 
@@ -262,6 +477,60 @@ class PromptAssistant:
 
 Верни ТОЛЬКО адаптированную версию промпта, без дополнительных объяснений."""
 
+    def _create_combined_prompt(self, prompt: str, count: int, model_type: Optional[str]) -> str:
+        """Создать промпт для улучшения, вариантов и адаптации одним запросом"""
+        fields = ['"improved": "улучшенная версия промпта"']
+        tasks = ["1. Улучши промпт: сделай его более четким, конкретным и эффективным, "
+                 "сохранив основную суть и цель"]
+        if count:
+            fields.append(f'"variants": [{count} строки с вариантами переформулировки]')
+            tasks.append(f"{len(tasks) + 1}. Создай {count} различных варианта переформулировки "
+                         "с той же сутью, но разными формулировками и структурой")
+        if model_type:
+            description = ADAPTATION_TYPES.get(model_type, 'специфические задачи')
+            fields.append('"adapted": "адаптированная версия промпта"')
+            tasks.append(f"{len(tasks) + 1}. Адаптируй промпт для модели, специализирующейся "
+                         f"на {description}, используя характерные для этого терминологию и подходы")
+        tasks_text = "\n".join(tasks)
+        fields_text = ",\n  ".join(fields)
+        
+        return f"""Ты эксперт по написанию эффективных промптов для AI-моделей.
+
+Исходный промпт:
+{prompt}
+
+Задачи:
+{tasks_text}
+
+Верни ТОЛЬКО JSON-объект без пояснений и без блока кода:
+{{
+  {fields_text}
+}}"""
+
+    def _parse_combined_response(self, response: str, count: int, adapt: bool) -> Dict:
+        """Парсить ответ комбинированного запроса: JSON, а при неудаче — обычные парсеры"""
+        data = _extract_json_object(response)
+        if data is not None:
+            improved = data.get('improved')
+            variants = data.get('variants') or []
+            if isinstance(variants, str):
+                variants = self._parse_variants(variants, count)
+            adapted = data.get('adapted')
+            return {
+                'improved_prompt': improved.strip() if isinstance(improved, str) else None,
+                'variants': [v.strip() for v in variants if isinstance(v, str) and v.strip()][:count],
+                'adapted_prompt': adapted.strip() if adapt and isinstance(adapted, str) else None
+            }
+        
+        logger.warning("Ответ комбинированного запроса не является JSON, используются обычные парсеры")
+        first_variant = _VARIANT_LINE.search(response)
+        head = response[:first_variant.start()] if first_variant else response
+        return {
+            'improved_prompt': self._parse_improved_prompt(head) or None,
+            'variants': self._parse_variants(response, count) if count else [],
+            'adapted_prompt': None
+        }
+
     def _parse_improved_prompt(self, response: str) -> str:
         """Парсить улучшенный промт из ответа модели"""
         # Убираем лишние пробелы и переносы строк
@@ -269,19 +538,27 @@ class PromptAssistant:
         
         # Пытаемся найти промт в различных форматах
         # Формат: "Улучшенный промпт: ..."
-        match = re.search(r'(?:улучшенный|improved|результат)[\s:]*\n*(.+?)(?:\n\n|\Z)', cleaned, re.IGNORECASE | re.DOTALL)
-        if match:
-            return match.group(1).strip()
+        for match in _IMPROVED_LABEL.finditer(cleaned):
+            paragraph = _paragraph_after(cleaned, match.end())
+            if paragraph is not None:
+                return paragraph
         
         # Формат: "```\n...\n```"
-        match = re.search(r'```(?:prompt|text)?\n?(.+?)\n?```', cleaned, re.DOTALL)
-        if match:
-            return match.group(1).strip()
+        fenced = _fenced_block(cleaned)
+        if fenced is not None:
+            return fenced
         
         # Формат: "**Промпт:** ..."
-        match = re.search(r'\*\*[^*]+\*\*[\s:]*\n*(.+?)(?:\n\n|\Z)', cleaned, re.DOTALL)
-        if match:
-            return match.group(1).strip()
+        pos = cleaned.find('**')
+        while pos != -1:
+            closing = cleaned.find('*', pos + 2)
+            if closing == -1:
+                break
+            if closing > pos + 2 and cleaned.startswith('**', closing):
+                paragraph = _paragraph_after(cleaned, closing + 2)
+                if paragraph is not None:
+                    return paragraph
+            pos = cleaned.find('**', pos + 1)
         
         # Если ничего не найдено, возвращаем весь ответ
         return cleaned
@@ -290,26 +567,36 @@ class PromptAssistant:
         """Парсить варианты переформулировки из ответа модели"""
         variants = []
         
-        # Пытаемся найти варианты в формате "Вариант 1: ..."
-        pattern = r'вариант\s+\d+[\s:]*\n*(.+?)(?=\n*вариант\s+\d+|$)'
-        matches = re.finditer(pattern, response, re.IGNORECASE | re.DOTALL)
-        
-        for match in matches:
-            variant = match.group(1).strip()
+        # Пытаемся найти варианты в формате "Вариант 1: ..." — текст варианта
+        # продолжается до следующего маркера или до конца ответа
+        marker = _VARIANT_MARKER.search(response)
+        while marker:
+            start = _LABEL_SEPARATOR.match(response, marker.end()).end()
+            if start >= len(response):
+                break
+            marker = _VARIANT_MARKER.search(response, start + 1)
+            variant = response[start:marker.start() if marker else len(response)].strip()
             # Убираем маркеры списка и лишние символы
-            variant = re.sub(r'^[-*•]\s*', '', variant, flags=re.MULTILINE)
-            variant = re.sub(r'^\d+[.)]\s*', '', variant, flags=re.MULTILINE)
+            variant = _BULLET_PREFIX.sub('', variant)
+            variant = _NUMBER_PREFIX.sub('', variant)
             if variant:
                 variants.append(variant)
         
-        # Если не нашли в формате "Вариант N:", пытаемся найти пронумерованный список
+        # Если не нашли в формате "Вариант N:", пытаемся найти пронумерованный список:
+        # пункт — остаток строки после номера или маркера
         if not variants:
-            pattern = r'(?:^|\n)(?:\d+[.)]|[-*•])\s*(.+?)(?=\n(?:^\d+[.)]|[-*•])|$)'
-            matches = re.finditer(pattern, response, re.MULTILINE | re.DOTALL)
-            for match in matches:
-                variant = match.group(1).strip()
+            item = _LIST_ITEM.search(response)
+            while item:
+                start = _WHITESPACE.match(response, item.end()).end()
+                if start >= len(response):
+                    break
+                end = response.find('\n', start + 1)
+                if end == -1:
+                    end = len(response)
+                variant = response[start:end].strip()
                 if variant and len(variant) > 10:  # Минимальная длина варианта
                     variants.append(variant)
+                item = _LIST_ITEM.search(response, end)
         
         # Если все еще нет вариантов, пытаемся разбить по параграфам
         if not variants:
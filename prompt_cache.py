@@ -0,0 +1,155 @@
+"""Кэш ответов AI-ассистента для улучшения промтов
+
+Двухуровневый кэш: ограниченный LRU в памяти и таблица assistant_cache в
+SQLite, которая переживает перезапуск программы. Ключ — SHA-256 от операции,
+модели (api_id), полного текста промта и параметров операции, поэтому
+промты с общим началом не путаются, а разные операции и параметры (число
+вариантов, тип адаптации) кэшируются отдельно.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+from db import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+# Максимальное количество ответов в памяти
+MEMORY_CACHE_SIZE = 256
+
+# Максимальное количество ответов в БД (давно не использованные удаляются)
+PERSISTENT_CACHE_SIZE = 5000
+
+# Очистка таблицы от лишних записей выполняется раз в столько сохранений
+PRUNE_EVERY = 100
+
+
+class PromptCache:
+    """Кэш результатов improve_prompt / generate_variants / adapt_for_model_type"""
+
+    _caches: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+    _caches_lock = threading.Lock()
+
+    def __init__(self, db_name: Optional[str] = None, max_entries: int = MEMORY_CACHE_SIZE,
+                 max_persisted: int = PERSISTENT_CACHE_SIZE):
+        """
+        Args:
+            db_name: Файл БД для второго уровня кэша (None — только память)
+            max_entries: Максимальное количество ответов в памяти
+            max_persisted: Максимальное количество ответов в БД
+        """
+        self.db_name = db_name
+        self.max_entries = max_entries
+        self.max_persisted = max_persisted
+        self._entries: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        # Ассистент работает в рабочих потоках, а соединение sqlite3 нельзя
+        # использовать из другого потока: у каждого потока свое соединение
+        self._connections = ConnectionManager(db_name) if db_name else None
+        self._puts = 0
+
+    @classmethod
+    def for_database(cls, db) -> 'PromptCache':
+        """Общий кэш для экземпляра Database (второй уровень — в его файле БД)"""
+        with cls._caches_lock:
+            cache = cls._caches.get(db)
+            if cache is None:
+                cache = cls(db.db_name)
+                cls._caches[db] = cache
+            return cache
+
+    @staticmethod
+    def make_key(operation: str, model_api_id: str, prompt: str,
+                 params: Optional[Dict[str, Any]] = None) -> str:
+        """Ключ кэша: хэш операции, модели, полного промта и параметров"""
+        payload = json.dumps([operation, model_api_id, prompt, params or {}],
+                             ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Найти ответ в памяти, затем в БД"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+
+        value = self._load(key)
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    def put(self, key: str, value: Dict, operation: str = "", model_api_id: str = ""):
+        """Сохранить ответ в памяти и в БД"""
+        self._remember(key, value)
+        self._store(key, value, operation, model_api_id)
+
+    def clear(self):
+        """Очистить кэш в памяти (записи в БД сохраняются)"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remember(self, key: str, value: Dict):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Соединение с БД для текущего потока"""
+        if self._connections is None:
+            return None
+        return self._connections.connection()
+
+    def _load(self, key: str) -> Optional[Dict]:
+        conn = self._connection()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute("SELECT value FROM assistant_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE assistant_cache SET last_used_at = ? WHERE key = ?",
+                         (_now(), key))
+            conn.commit()
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Не удалось прочитать кэш ассистента: {str(e)}")
+            return None
+
+    def _store(self, key: str, value: Dict, operation: str, model_api_id: str):
+        conn = self._connection()
+        if conn is None:
+            return
+        now = _now()
+        try:
+            conn.execute("""
+                INSERT OR REPLACE INTO assistant_cache
+                    (key, operation, model_api_id, value, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, operation, model_api_id, json.dumps(value, ensure_ascii=False), now, now))
+            with self._lock:
+                self._puts += 1
+                prune = self._puts % PRUNE_EVERY == 0
+            if prune:
+                conn.execute("""
+                    DELETE FROM assistant_cache WHERE key NOT IN (
+                        SELECT key FROM assistant_cache ORDER BY last_used_at DESC LIMIT ?
+                    )
+                """, (self.max_persisted,))
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось сохранить кэш ассистента: {str(e)}")
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
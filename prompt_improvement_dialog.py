@@ -10,6 +10,7 @@ from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5.QtGui import QFont
 from models import Model
 from prompt_assistant import PromptAssistant
+from prompt_cache import PromptCache
 
 logger = logging.getLogger(__name__)
 
@@ -18,25 +19,32 @@ class ImprovePromptThread(QThread):
     """Поток для асинхронного улучшения промта"""
     finished = pyqtSignal(dict)
     progress = pyqtSignal(str)
+    # Имя готовой части ('improve', 'variants', 'adapt') и ее результат
+    partial = pyqtSignal(str, dict)
     
     def __init__(self, assistant: PromptAssistant, prompt: str, model: Model,
-                 generate_variants: bool = True, adapt_for_type: Optional[str] = None):
+                 generate_variants: bool = True, adapt_for_type: Optional[str] = None,
+                 combined: bool = False):
         super().__init__()
         self.assistant = assistant
         self.prompt = prompt
         self.model = model
         self.generate_variants = generate_variants
         self.adapt_for_type = adapt_for_type
+        self.combined = combined
     
     def run(self):
         """Выполнить улучшение промта"""
         try:
-            self.progress.emit("Улучшение промта...")
-            result = self.assistant.improve_with_variants(
+            self.progress.emit("Улучшение промта... %v из %m")
+            improve = (self.assistant.improve_combined if self.combined
+                       else self.assistant.improve_with_variants)
+            result = improve(
                 self.prompt,
                 self.model,
                 self.generate_variants,
-                self.adapt_for_type
+                self.adapt_for_type,
+                on_partial=self.partial.emit
             )
             self.finished.emit(result)
         except Exception as e:
@@ -50,12 +58,15 @@ class ImprovePromptThread(QThread):
 class PromptImprovementDialog(QDialog):
     """Диалог для улучшения промтов"""
     
-    def __init__(self, parent=None, original_prompt: str = "", models: List[Model] = None):
+    def __init__(self, parent=None, original_prompt: str = "", models: List[Model] = None,
+                 db=None):
         super().__init__(parent)
         self.original_prompt = original_prompt
         self.models = models or []
         self.selected_variant = None
-        self.assistant = PromptAssistant()
+        # Кэш ответов общий для всех диалогов и сохраняется в БД между запусками
+        cache = PromptCache.for_database(db) if db is not None else None
+        self.assistant = PromptAssistant(cache=cache)
         
         self.setWindowTitle("Улучшение промта")
         self.setMinimumSize(900, 700)
@@ -95,6 +106,14 @@ class PromptImprovementDialog(QDialog):
         adapt_type_layout.addStretch()
         options_layout.addLayout(adapt_type_layout)
         
+        self.combined_checkbox = QCheckBox("Одним запросом (ответ в формате JSON)")
+        self.combined_checkbox.setToolTip(
+            "Улучшение, варианты и адаптация запрашиваются одним запросом: "
+            "меньше токенов и быстрее, но результат зависит от того, "
+            "насколько точно модель соблюдает формат"
+        )
+        options_layout.addWidget(self.combined_checkbox)
+        
         options_group.setLayout(options_layout)
         layout.addWidget(options_group)
         
@@ -208,9 +227,10 @@ class PromptImprovementDialog(QDialog):
         self.use_improved_button.setEnabled(False)
         self.adapted_group.setVisible(False)
         
-        # Показываем прогресс
+        # Показываем прогресс: запросы выполняются параллельно, шаг — одна готовая часть
         self.progress_bar.setVisible(True)
-        self.progress_bar.setRange(0, 0)
+        self.progress_bar.setRange(0, 1 + int(generate_variants) + int(adapt_for_type is not None))
+        self.progress_bar.setValue(0)
         self.improve_button.setEnabled(False)
         
         # Запускаем улучшение в отдельном потоке
@@ -219,12 +239,36 @@ class PromptImprovementDialog(QDialog):
             self.original_prompt,
             model,
             generate_variants,
-            adapt_for_type
+            adapt_for_type,
+            self.combined_checkbox.isChecked()
         )
+        self.improve_thread.partial.connect(self.on_part_ready)
         self.improve_thread.finished.connect(self.on_improvement_finished)
         self.improve_thread.progress.connect(self.progress_bar.setFormat)
         self.improve_thread.start()
     
+    def on_part_ready(self, operation: str, result: dict):
+        """Обработчик готовности одной части: раздел заполняется, не дожидаясь остальных"""
+        self.progress_bar.setValue(self.progress_bar.value() + 1)
+        if not result.get('success'):
+            return
+        
+        if operation == 'improve':
+            improved = result.get('improved_prompt')
+            if improved:
+                self.improved_text.setPlainText(improved)
+                self.use_improved_button.setEnabled(True)
+        elif operation == 'adapt':
+            adapted = result.get('adapted_prompt')
+            if adapted:
+                self.adapted_text.setPlainText(adapted)
+                self.adapted_group.setVisible(True)
+        elif operation == 'variants':
+            for i, variant in enumerate(result.get('variants', []), 1):
+                item = QListWidgetItem(f"Вариант {i}: {variant[:100]}...")
+                item.setData(Qt.UserRole, variant)
+                self.variants_list.addItem(item)
+    
     def on_improvement_finished(self, result: dict):
         """Обработчик завершения улучшения"""
         self.progress_bar.setVisible(False)
@@ -235,27 +279,8 @@ class PromptImprovementDialog(QDialog):
             QMessageBox.critical(self, "Ошибка", f"Не удалось улучшить промт:\n{error}")
             return
         
-        # Отображаем улучшенный промт
-        improved = result.get('improved_prompt')
-        if improved:
-            self.improved_text.setPlainText(improved)
-            self.use_improved_button.setEnabled(True)
-        
-        # Отображаем адаптированный промт
-        adapted = result.get('adapted_prompt')
-        if adapted:
-            self.adapted_text.setPlainText(adapted)
-            self.adapted_group.setVisible(True)
-        
-        # Отображаем варианты
-        variants = result.get('variants', [])
-        if variants:
-            for i, variant in enumerate(variants, 1):
-                item = QListWidgetItem(f"Вариант {i}: {variant[:100]}...")
-                item.setData(Qt.UserRole, variant)
-                self.variants_list.addItem(item)
-        
-        if improved or variants or adapted:
+        # Разделы уже заполнены по мере готовности частей
+        if result.get('improved_prompt') or result.get('variants') or result.get('adapted_prompt'):
             QMessageBox.information(self, "Успех", "Промт успешно улучшен!")
     
     def on_variant_selection_changed(self):
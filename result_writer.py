@@ -0,0 +1,266 @@
+"""Фоновая запись результатов в БД (write-behind)
+
+Сохранение результатов и статистики не выполняется в потоке интерфейса:
+операции ставятся в очередь, а отдельный поток (со своим соединением из
+Database) записывает их пакетами — все операции, накопившиеся за BATCH_DELAY, одной
+транзакцией. Перед чтением сохраненных данных и при выходе из программы
+очередь дописывается через flush() / close().
+
+Надежность записи задается уровнем durability (PRAGMA synchronous):
+  fast   — без fsync; при сбое питания можно потерять последние записи
+  normal — fsync при контрольных точках WAL; при падении программы данные
+           сохраняются, при сбое питания может пропасть последняя транзакция
+  full   — fsync при каждой транзакции
+
+Если БД временно заблокирована другим соединением (SQLITE_BUSY/SQLITE_LOCKED
+дольше таймаута соединения), транзакция повторяется с растущей паузой;
+on_error получает только ошибки, не исчезнувшие после повторов.
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from itertools import groupby
+from typing import Callable, Dict, Iterator, List, Optional
+from db import Database
+
+logger = logging.getLogger(__name__)
+
+# Уровни надежности записи и соответствующие значения PRAGMA synchronous
+DURABILITY_LEVELS = {
+    'fast': 'OFF',
+    'normal': 'NORMAL',
+    'full': 'FULL',
+}
+DEFAULT_DURABILITY = 'normal'
+
+# Сколько ждать следующих операций, чтобы записать их одной транзакцией (сек)
+BATCH_DELAY = 0.05
+
+# Максимальное количество операций в одной транзакции
+MAX_BATCH_SIZE = 200
+
+# Повторы транзакции при временной блокировке БД: количество и первая пауза
+# (сек, удваивается с каждым повтором до RETRY_MAX_DELAY)
+RETRY_ATTEMPTS = 5
+RETRY_DELAY = 0.5
+RETRY_MAX_DELAY = 5.0
+
+# Коды ошибок SQLite, означающие временную блокировку
+_TRANSIENT_ERROR_CODES = (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+# Признак остановки потока записи
+_STOP = object()
+
+
+class ResultWriter:
+    """Очередь записи в БД с отдельным потоком и пакетными транзакциями"""
+
+    def __init__(self, db: Database, durability: str = DEFAULT_DURABILITY,
+                 on_error: Optional[Callable[[str], None]] = None,
+                 batch_delay: float = BATCH_DELAY, max_batch_size: int = MAX_BATCH_SIZE,
+                 retry_attempts: int = RETRY_ATTEMPTS, retry_delay: float = RETRY_DELAY):
+        """
+        Args:
+            db: База данных (поток записи получает в ней собственное соединение)
+            durability: Уровень надежности записи (ключ DURABILITY_LEVELS)
+            on_error: Функция (текст ошибки); вызывается в потоке записи
+            batch_delay: Сколько ждать следующих операций перед записью (сек)
+            max_batch_size: Максимальное количество операций в транзакции
+            retry_attempts: Сколько раз повторять транзакцию при блокировке БД
+            retry_delay: Пауза перед первым повтором (сек)
+        """
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Неизвестный уровень надежности записи: {durability}")
+        self.db = db
+        self.durability = durability
+        self.on_error = on_error
+        self.batch_delay = batch_delay
+        self.max_batch_size = max_batch_size
+        self.retry_attempts = retry_attempts
+        self.retry_delay = retry_delay
+        # Количество зафиксированных транзакций (для статистики и тестов)
+        self.transactions = 0
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._closed = False
+        # Удерживается потоком записи на время транзакции и в paused()
+        self._write_lock = threading.Lock()
+        self._paused = False
+        self._thread = threading.Thread(target=self._run, name="ResultWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, job: Callable[[Database], object], batched: bool = True):
+        """
+        Поставить операцию записи в очередь
+
+        Args:
+            job: Функция, выполняющая запись через переданный ей Database
+            batched: Выполнять в общей транзакции с соседними операциями;
+                     False — для операций, которые сами управляют транзакциями
+                     (при блокировке БД такая операция повторяется целиком)
+        """
+        if self._closed:
+            raise RuntimeError("Запись в БД уже остановлена")
+        self._queue.put((job, batched))
+
+    def save_results(self, results: List[Dict]):
+        """Сохранить результаты (см. Database.save_results)"""
+        self.submit(lambda db: db.save_results(results))
+
+    def record_usage(self, results: List[Dict]):
+        """Учесть запросы в статистике использования (см. Database.record_usage)"""
+        self.submit(lambda db: db.record_usage(results))
+
+    def record_timings(self, results: List[Dict], prompt_id: Optional[int] = None):
+        """Сохранить замеры времени запросов (см. Database.record_timings)"""
+        self.submit(lambda db: db.record_timings(results, prompt_id))
+
+    def set_durability(self, durability: str):
+        """Изменить уровень надежности (применяется перед следующей транзакцией)"""
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Неизвестный уровень надежности записи: {durability}")
+        self.durability = durability
+
+    def flush(self):
+        """
+        Дождаться записи всех операций, поставленных в очередь
+        
+        Во время paused() не ждет: очередь будет записана после возобновления.
+        """
+        if self._paused:
+            return
+        self._queue.join()
+
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        """
+        Приостановить запись на время долгой операции с БД в другом потоке
+        
+        Дожидается окончания текущей транзакции; новые операции копятся в
+        очереди и записываются после выхода из блока.
+        """
+        with self._write_lock:
+            self._paused = True
+            try:
+                yield
+            finally:
+                self._paused = False
+
+    def close(self):
+        """Дописать очередь и остановить поток записи"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        applied_durability = None
+        try:
+            stop = False
+            while not stop:
+                jobs = self._next_batch()
+                if jobs[-1] is _STOP:
+                    jobs.pop()
+                    stop = True
+                with self._write_lock:
+                    if self.durability != applied_durability:
+                        applied_durability = self._apply_durability()
+                    self._write(jobs)
+                for _ in range(len(jobs) + (1 if stop else 0)):
+                    self._queue.task_done()
+        finally:
+            self.db.release_connection()
+
+    def _apply_durability(self) -> Optional[str]:
+        """Задать PRAGMA synchronous соединению потока записи"""
+        durability = self.durability
+        try:
+            self.db.conn.execute(f"PRAGMA synchronous = {DURABILITY_LEVELS[durability]}")
+            return durability
+        except Exception as e:
+            # Запись продолжается с прежним уровнем, очередь должна разбираться
+            self._report(e)
+            return None
+
+    def _next_batch(self) -> List:
+        """Дождаться операции и собрать следующие, поступившие за batch_delay"""
+        jobs = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_delay
+        while jobs[-1] is not _STOP and len(jobs) < self.max_batch_size:
+            try:
+                jobs.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return jobs
+
+    def _write(self, jobs: List):
+        """Выполнить операции: подряд идущие пакетные — общими транзакциями"""
+        for batched, group in groupby(jobs, key=lambda item: item[1]):
+            group = [job for job, _ in group]
+            if batched:
+                self._write_batch(group)
+                continue
+            for job in group:
+                try:
+                    self._retrying(lambda: job(self.db))
+                    self.transactions += 1
+                except Exception as e:
+                    self._report(e)
+
+    def _write_batch(self, jobs: List[Callable[[Database], object]]):
+        """Записать операции одной транзакцией (при ошибке — по одной)"""
+        try:
+            self._retrying(lambda: self._run_batch(jobs))
+            return
+        except Exception as e:
+            # Блокировка, не снятая за все повторы, помешает и записи по одной
+            if len(jobs) == 1 or _is_transient(e):
+                self._report(e)
+                return
+
+        # Ошибочная операция не должна отменять запись остальных
+        for job in jobs:
+            try:
+                self._retrying(lambda: self._run_batch([job]))
+            except Exception as e:
+                self._report(e)
+
+    def _run_batch(self, jobs: List[Callable[[Database], object]]):
+        db = self.db
+        with db.batch():
+            for job in jobs:
+                job(db)
+        self.transactions += 1
+
+    def _retrying(self, action: Callable[[], object]):
+        """Выполнить действие, повторяя его с растущей паузой при временной блокировке БД"""
+        delay = self.retry_delay
+        for attempt in range(self.retry_attempts + 1):
+            try:
+                return action()
+            except sqlite3.OperationalError as e:
+                if not _is_transient(e) or attempt == self.retry_attempts:
+                    raise
+                logger.warning(f"БД заблокирована, повтор записи через {delay:.1f} с: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_DELAY)
+
+    def _report(self, error: Exception):
+        message = f"Не удалось сохранить данные в БД: {str(error)}"
+        logger.error(message)
+        if self.on_error:
+            self.on_error(message)
+
+
+def _is_transient(error: Exception) -> bool:
+    """Ошибка вызвана временной блокировкой БД другим соединением"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is None:
+        return "locked" in str(error) or "busy" in str(error)
+    # Младший байт — основной код (расширенные, например SQLITE_BUSY_SNAPSHOT)
+    return code & 0xff in _TRANSIENT_ERROR_CODES
@@ -0,0 +1,404 @@
+"""Модель и делегат таблицы результатов главного окна
+
+Вместо QTableWidget с виджетом-чекбоксом в каждой строке результаты хранятся
+в ResultsTableModel: отметка «Выбрать» — это состояние Qt.CheckStateRole в
+модели, а ответы рисует ResponseDelegate, который переносит и обрезает текст
+под размер ячейки, обрабатывая только ту часть ответа, что помещается на экран.
+RowHeightFitter подгоняет под текст высоту только видимых строк.
+"""
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from PyQt5.QtCore import (
+    Qt, QAbstractTableModel, QEvent, QModelIndex, QObject, QPointF, QRect, QSize,
+    QTimer, pyqtSignal
+)
+from PyQt5.QtGui import QBrush, QColor, QFont, QFontMetrics, QPalette, QTextLayout, QTextOption
+from PyQt5.QtWidgets import (
+    QApplication, QStyle, QStyledItemDelegate, QStyleOptionViewItem, QTableView
+)
+
+# Колонки таблицы результатов
+COLUMN_CHECK = 0
+COLUMN_MODEL = 1
+COLUMN_RESPONSE = 2
+
+HEADERS = ["Выбрать", "Модель", "Ответ"]
+
+# Пределы высоты строки с ответом
+MIN_ROW_HEIGHT = 100
+MAX_ROW_HEIGHT = 300
+
+# Максимальное количество запомненных высот строк
+MAX_CACHED_HEIGHTS = 10000
+
+# QTextLayout не переносит строку по "\n", только по разделителю строк Unicode
+_LINE_SEPARATOR = "\u2028"
+
+
+def response_text(result: Dict) -> str:
+    """Текст ячейки «Ответ»: ответ модели или сообщение об ошибке"""
+    if result.get('success'):
+        return result.get('response', 'Нет ответа')
+    return f"❌ {result.get('error', 'Неизвестная ошибка')}"
+
+
+class ResultsTableModel(QAbstractTableModel):
+    """
+    Результаты текущего запроса с отметками для сохранения
+
+    Строки — словари результатов из NetworkManager. Во время потокового
+    вывода строки создаются заранее по списку моделей и текст ответа
+    обновляется по мере поступления фрагментов; отмечать такие строки нельзя.
+    """
+
+    # Количество отмеченных строк изменилось
+    checked_changed = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._results: List[Dict] = []
+        self._texts: List[str] = []
+        self._checked: List[bool] = []
+        self._checked_count = 0
+        self._streaming = False
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._results)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section: int, orientation, role: int = Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        result = self._results[row]
+
+        if column == COLUMN_CHECK:
+            if role == Qt.CheckStateRole and not self._streaming:
+                return Qt.Checked if self._checked[row] else Qt.Unchecked
+            return None
+
+        if role == Qt.DisplayRole:
+            if column == COLUMN_MODEL:
+                return result.get('model_name', 'Unknown')
+            return self._texts[row]
+        if role == Qt.ForegroundRole and column == COLUMN_RESPONSE and not self._streaming:
+            # Зеленый цвет для успешных ответов, красный для ошибок
+            return QColor(Qt.darkGreen if result.get('success') else Qt.red)
+        if role == Qt.TextAlignmentRole and column == COLUMN_RESPONSE:
+            return Qt.AlignTop | Qt.AlignLeft
+        return None
+
+    def setData(self, index: QModelIndex, value, role: int = Qt.EditRole) -> bool:
+        if (not index.isValid() or index.column() != COLUMN_CHECK
+                or role != Qt.CheckStateRole or self._streaming):
+            return False
+        self.set_checked(index.row(), value == Qt.Checked)
+        return True
+
+    def flags(self, index: QModelIndex):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == COLUMN_CHECK and not self._streaming:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def set_results(self, results: List[Dict]):
+        """Показать результаты запроса (все строки без отметок)"""
+        self.beginResetModel()
+        self._results = results
+        self._texts = [response_text(result) for result in results]
+        self._checked = [False] * len(results)
+        self._streaming = False
+        self.endResetModel()
+        self._set_checked_count(0)
+
+    def start_streaming(self, model_names: List[str]):
+        """Создать по строке на каждую модель для потокового вывода"""
+        self.beginResetModel()
+        self._results = [{'model_name': name} for name in model_names]
+        self._texts = [""] * len(model_names)
+        self._checked = [False] * len(model_names)
+        self._streaming = True
+        self.endResetModel()
+        self._set_checked_count(0)
+
+    def set_response_text(self, row: int, text: str):
+        """Обновить текст ответа в строке (при потоковом выводе)"""
+        if 0 <= row < len(self._texts):
+            self._texts[row] = text
+            index = self.index(row, COLUMN_RESPONSE)
+            self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+    def clear(self):
+        """Удалить все строки"""
+        self.set_results([])
+
+    def result(self, row: int) -> Optional[Dict]:
+        """Результат в строке"""
+        if 0 <= row < len(self._results):
+            return self._results[row]
+        return None
+
+    def set_checked(self, row: int, checked: bool):
+        """Отметить строку для сохранения или снять отметку"""
+        if self._checked[row] == checked:
+            return
+        self._checked[row] = checked
+        index = self.index(row, COLUMN_CHECK)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        self._set_checked_count(self._checked_count + (1 if checked else -1))
+
+    def set_all_checked(self, checked: bool):
+        """Отметить все строки или снять все отметки"""
+        if not self._results or self._streaming:
+            return
+        self._checked = [checked] * len(self._results)
+        self.dataChanged.emit(self.index(0, COLUMN_CHECK),
+                              self.index(len(self._results) - 1, COLUMN_CHECK),
+                              [Qt.CheckStateRole])
+        self._set_checked_count(len(self._results) if checked else 0)
+
+    def checked_rows(self) -> List[int]:
+        """Номера отмеченных строк"""
+        return [row for row, checked in enumerate(self._checked) if checked]
+
+    @property
+    def checked_count(self) -> int:
+        """Количество отмеченных строк"""
+        return self._checked_count
+
+    def _set_checked_count(self, count: int):
+        changed = count != self._checked_count
+        self._checked_count = count
+        if changed:
+            self.checked_changed.emit(count)
+
+
+class ResponseDelegate(QStyledItemDelegate):
+    """
+    Отрисовка длинных ответов с переносом слов
+
+    Ответ может занимать сотни килобайт, а в ячейку помещается лишь несколько
+    строк. Поэтому делегат раскладывает только начало текста, которого
+    заведомо хватает на площадь ячейки, и заканчивает последнюю видимую
+    строку многоточием, если текст не поместился.
+
+    Высота строки (sizeHint) измеряется той же раскладкой и ограничена
+    min_height..max_height; результаты измерений кэшируются по хэшу текста,
+    ширине колонки и шрифту.
+    """
+
+    ELLIPSIS = "…"
+    # Отступы текста от границ ячейки
+    PADDING_X = 4
+    PADDING_Y = 2
+
+    def __init__(self, parent=None, min_height: int = MIN_ROW_HEIGHT,
+                 max_height: int = MAX_ROW_HEIGHT):
+        super().__init__(parent)
+        self.min_height = min_height
+        self.max_height = max_height
+        self._heights: "OrderedDict[Tuple[int, int, str], int]" = OrderedDict()
+
+    def paint(self, painter, option: QStyleOptionViewItem, index: QModelIndex):
+        opt = QStyleOptionViewItem(option)
+        self.initStyleOption(opt, index)
+        text = opt.text
+        opt.text = ""
+        style = opt.widget.style() if opt.widget else QApplication.style()
+        # Фон, выделение и фокус рисуются стилем, текст — ниже
+        style.drawControl(QStyle.CE_ItemViewItem, opt, painter, opt.widget)
+
+        rect = opt.rect.adjusted(self.PADDING_X, self.PADDING_Y, -self.PADDING_X, -self.PADDING_Y)
+        if not text or rect.width() <= 0 or rect.height() <= 0:
+            return
+
+        painter.save()
+        painter.setFont(opt.font)
+        if opt.state & QStyle.State_Selected:
+            painter.setPen(opt.palette.color(QPalette.HighlightedText))
+        else:
+            foreground = index.data(Qt.ForegroundRole)
+            painter.setPen(QBrush(foreground).color() if foreground is not None
+                           else opt.palette.color(QPalette.Text))
+        painter.setClipRect(rect)
+        self.draw_text(painter, text, opt.font, rect)
+        painter.restore()
+
+    def sizeHint(self, option: QStyleOptionViewItem, index: QModelIndex) -> QSize:
+        size = super().sizeHint(option, index)
+        widget = option.widget
+        width = (widget.columnWidth(index.column()) if isinstance(widget, QTableView)
+                 else option.rect.width())
+        text = index.data(Qt.DisplayRole)
+        return QSize(size.width(), self.row_height(text or "", option.font, width))
+
+    def row_height(self, text: str, font: QFont, width: int) -> int:
+        """Высота строки, в которую помещается текст при ширине колонки width"""
+        key = (hash(text), width, font.key())
+        height = self._heights.get(key)
+        if height is not None:
+            self._heights.move_to_end(key)
+            return height
+
+        rect = QRect(0, 0, width - 2 * self.PADDING_X, self.max_height - 2 * self.PADDING_Y)
+        if not text or rect.width() <= 0:
+            height = self.min_height
+        else:
+            layout, lines, prefix = self._layout_lines(text, font, rect)
+            if self._is_truncated(text, prefix, lines[-1]):
+                height = self.max_height
+            else:
+                text_height = int(lines[-1].y() + lines[-1].height() + 0.5)
+                height = max(self.min_height, min(self.max_height, text_height + 2 * self.PADDING_Y))
+
+        self._heights[key] = height
+        if len(self._heights) > MAX_CACHED_HEIGHTS:
+            self._heights.popitem(last=False)
+        return height
+
+    def clear_cache(self):
+        """Сбросить кэш высот (например, при изменении ширины колонки)"""
+        self._heights.clear()
+
+    def draw_text(self, painter, text: str, font: QFont, rect: QRect):
+        """Нарисовать видимую часть текста с переносом слов"""
+        layout, lines, prefix = self._layout_lines(text, font, rect)
+        origin = QPointF(rect.topLeft())
+        for line in lines[:-1]:
+            line.draw(painter, origin)
+        last = lines[-1]
+        if not self._is_truncated(text, prefix, last):
+            last.draw(painter, origin)
+            return
+
+        # Текст не поместился: последняя видимая строка заканчивается многоточием
+        remainder = prefix[last.textStart():].split("\n", 1)[0].rstrip()
+        elided = QFontMetrics(font).elidedText(remainder + self.ELLIPSIS, Qt.ElideRight, rect.width())
+        painter.drawText(QPointF(rect.left(), rect.top() + last.y() + last.ascent()), elided)
+
+    def _layout_lines(self, text: str, font: QFont, rect: QRect):
+        """
+        Разложить начало текста по строкам ширины rect
+
+        Returns:
+            (раскладка, строки, помещающиеся по высоте в rect (хотя бы одна),
+            разложенное начало текста); раскладку нужно держать, пока
+            используются строки
+        """
+        prefix = self.visible_prefix(text, QFontMetrics(font), rect)
+        layout = QTextLayout(prefix.replace("\n", _LINE_SEPARATOR), font)
+        text_option = QTextOption()
+        text_option.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
+        layout.setTextOption(text_option)
+
+        lines = []
+        y = 0.0
+        layout.beginLayout()
+        while True:
+            line = layout.createLine()
+            if not line.isValid():
+                break
+            line.setLineWidth(rect.width())
+            if lines and y + line.height() > rect.height():
+                break
+            line.setPosition(QPointF(0, y))
+            y += line.height()
+            lines.append(line)
+        layout.endLayout()
+        return layout, lines, prefix
+
+    @staticmethod
+    def _is_truncated(text: str, prefix: str, last_line) -> bool:
+        """Не поместился ли текст в разложенные строки"""
+        return (last_line.textStart() + last_line.textLength() < len(prefix)
+                or len(prefix) < len(text))
+
+    @staticmethod
+    def visible_prefix(text: str, metrics: QFontMetrics, rect: QRect) -> str:
+        """Начало текста, которого заведомо достаточно, чтобы заполнить прямоугольник"""
+        max_lines = rect.height() // max(1, metrics.lineSpacing()) + 1
+        chars_per_line = rect.width() // max(1, metrics.averageCharWidth()) + 1
+        # Запас в два раза на узкие символы
+        prefix = text[:max_lines * chars_per_line * 2]
+        end = -1
+        for _ in range(max_lines + 1):
+            end = prefix.find("\n", end + 1)
+            if end < 0:
+                return prefix
+        return prefix[:end]
+
+
+class RowHeightFitter(QObject):
+    """
+    Подгонка высоты видимых строк таблицы под текст в колонке
+
+    QHeaderView.ResizeToContents измеряет все строки таблицы при каждом
+    изменении; здесь высота вычисляется делегатом только для строк, попавших
+    в область просмотра, а остальные сохраняют высоту по умолчанию до тех
+    пор, пока их не прокрутят на экран. Подгонка откладывается до ближайшей
+    итерации цикла событий, так что пачка изменений модели обрабатывается
+    один раз.
+    """
+
+    def __init__(self, view: QTableView, column: int, delegate: ResponseDelegate):
+        super().__init__(view)
+        self.view = view
+        self.column = column
+        self.delegate = delegate
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.fit_visible_rows)
+
+        view.verticalScrollBar().valueChanged.connect(self.schedule)
+        view.horizontalHeader().sectionResized.connect(self._on_section_resized)
+        view.viewport().installEventFilter(self)
+        model = view.model()
+        model.modelReset.connect(self.schedule)
+        model.rowsInserted.connect(self.schedule)
+        model.dataChanged.connect(self._on_data_changed)
+
+    def schedule(self):
+        """Подогнать высоту видимых строк на ближайшей итерации цикла событий"""
+        if not self._timer.isActive():
+            self._timer.start(0)
+
+    def fit_visible_rows(self):
+        """Подогнать высоту строк, видимых в области просмотра"""
+        view = self.view
+        row = view.rowAt(0)
+        if row < 0:
+            return
+        model = view.model()
+        font = view.font()
+        width = view.columnWidth(self.column)
+        viewport_height = view.viewport().height()
+        row_count = model.rowCount()
+        while row < row_count and view.rowViewportPosition(row) < viewport_height:
+            if not view.isRowHidden(row):
+                text = model.index(row, self.column).data(Qt.DisplayRole) or ""
+                height = self.delegate.row_height(text, font, width)
+                if view.rowHeight(row) != height:
+                    view.setRowHeight(row, height)
+            row += 1
+
+    def eventFilter(self, obj, event) -> bool:
+        if event.type() == QEvent.Resize:
+            self.schedule()
+        return False
+
+    def _on_section_resized(self, column: int, old_size: int, new_size: int):
+        if column == self.column:
+            # Высоты, измеренные при прежней ширине, больше не понадобятся
+            self.delegate.clear_cache()
+            self.schedule()
+
+    def _on_data_changed(self, top_left: QModelIndex, bottom_right: QModelIndex, roles=()):
+        if top_left.column() <= self.column <= bottom_right.column():
+            self.schedule()
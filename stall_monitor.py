@@ -0,0 +1,214 @@
+"""Мониторинг зависаний цикла событий Qt
+
+Таймер-пульс в главном потоке срабатывает каждые interval_ms миллисекунд;
+если очередное срабатывание опоздало больше чем на threshold_ms, значит
+главный поток был занят обработчиком и интерфейс не отвечал. Пока пульс
+задерживается, сторожевой поток снимает стек главного потока, чтобы
+определить, какой слот вызвал зависание и где внутри него тратится время.
+
+Включение в приложении:
+    python main.py --monitor-stalls
+    CHATLIST_STALL_MONITOR=1 python main.py
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from PyQt5.QtCore import QObject, QTimer
+
+logger = logging.getLogger(__name__)
+
+# Переменные окружения для включения мониторинга
+STALL_MONITOR_ENV_VAR = "CHATLIST_STALL_MONITOR"
+STALL_THRESHOLD_ENV_VAR = "CHATLIST_STALL_THRESHOLD_MS"
+
+# Зависание без Python-кода в стеке (отрисовка, компоновка, код Qt)
+QT_INTERNAL = "<Qt>"
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+_SITE_PACKAGES = f"{os.sep}site-packages{os.sep}"
+
+
+def stall_monitor_enabled(argv: Optional[List[str]] = None) -> bool:
+    """Включен ли мониторинг флагом --monitor-stalls или переменной окружения"""
+    argv = sys.argv if argv is None else argv
+    return '--monitor-stalls' in argv or os.getenv(STALL_MONITOR_ENV_VAR, '') not in ('', '0')
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{os.path.basename(code.co_filename)}:{name}"
+
+
+class StallMonitor(QObject):
+    """Детектор длительных задач в главном потоке Qt"""
+
+    def __init__(self, threshold_ms: float = 50, interval_ms: int = 10,
+                 sample_interval_ms: float = 5, ignore_paths: Iterable[str] = (),
+                 parent=None):
+        """
+        Args:
+            threshold_ms: Минимальная задержка цикла событий, считающаяся зависанием
+            interval_ms: Период таймера-пульса
+            sample_interval_ms: Период снятия стека главного потока во время зависания
+            ignore_paths: Каталоги, код из которых не считается слотом
+                (например, сценарий бенчмарка, вызывающий обработчики)
+            parent: Родительский QObject
+        """
+        super().__init__(parent)
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.sample_interval = sample_interval_ms / 1000
+        self.ignore_paths = tuple(os.path.abspath(p) for p in ignore_paths) + (
+            os.path.abspath(__file__),
+        )
+        self.stalls: List[Dict] = []
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self._on_heartbeat)
+        self._last_beat = 0.0
+        self._samples: List[Tuple[str, str]] = []
+        self._samples_lock = threading.Lock()
+        self._main_thread_id = None
+        self._base_codes = set()
+        self._running = False
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self):
+        """
+        Запустить мониторинг
+
+        Вызывается из главного потока до входа в цикл событий: функции,
+        находящиеся в стеке в момент запуска (main() с app.exec_()),
+        не считаются слотами.
+        """
+        if self._running:
+            return
+        self._main_thread_id = threading.get_ident()
+        frame = sys._getframe(1)
+        while frame is not None:
+            self._base_codes.add(frame.f_code)
+            frame = frame.f_back
+
+        self._running = True
+        self._last_beat = time.perf_counter()
+        self._timer.start()
+        self._watchdog = threading.Thread(target=self._watch, name="StallWatchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Мониторинг зависаний включен (порог {self.threshold * 1000:.0f} мс)")
+
+    def stop(self):
+        """Остановить мониторинг"""
+        if not self._running:
+            return
+        self._running = False
+        self._timer.stop()
+        if self._watchdog:
+            self._watchdog.join()
+
+    def reset(self):
+        """Очистить накопленные зависания"""
+        self.stalls = []
+        with self._samples_lock:
+            self._samples = []
+        self._last_beat = time.perf_counter()
+
+    def _on_heartbeat(self):
+        """Срабатывание таймера в главном потоке"""
+        now = time.perf_counter()
+        lag = now - self._last_beat - self.interval
+        self._last_beat = now
+
+        with self._samples_lock:
+            samples, self._samples = self._samples, []
+
+        if lag < self.threshold:
+            return
+
+        if samples:
+            slot = Counter(s for s, _ in samples).most_common(1)[0][0]
+            hotspot = Counter(h for s, h in samples if s == slot).most_common(1)[0][0]
+        else:
+            slot = hotspot = QT_INTERNAL
+        stall = {
+            'slot': slot,
+            'hotspot': hotspot,
+            'duration_ms': round(lag * 1000, 1),
+            'started_at': time.time() - lag,
+            'samples': len(samples)
+        }
+        self.stalls.append(stall)
+        logger.debug(f"Зависание {stall['duration_ms']} мс в {slot} ({hotspot})")
+
+    def _watch(self):
+        """Сторожевой поток: снимает стек главного потока, пока пульс задерживается"""
+        while self._running:
+            time.sleep(self.sample_interval)
+            if time.perf_counter() - self._last_beat - self.interval < self.threshold / 2:
+                continue
+            frame = sys._current_frames().get(self._main_thread_id)
+            if frame is None:
+                continue
+            sample = self._describe_stack(frame)
+            with self._samples_lock:
+                self._samples.append(sample)
+
+    def _describe_stack(self, frame) -> Tuple[str, str]:
+        """
+        Определить слот и самое глубокое место в коде проекта
+
+        Слот — самая внешняя функция проекта, вызванная из цикла событий;
+        горячая точка — самая глубокая функция проекта в стеке.
+        """
+        project_frames = []
+        while frame is not None:
+            filename = os.path.abspath(frame.f_code.co_filename)
+            if (filename.startswith(_PROJECT_DIR)
+                    and not filename.startswith(self.ignore_paths)
+                    and _SITE_PACKAGES not in filename
+                    and frame.f_code not in self._base_codes):
+                project_frames.append(frame)
+            frame = frame.f_back
+
+        if not project_frames:
+            return QT_INTERNAL, QT_INTERNAL
+        return _frame_label(project_frames[-1]), _frame_label(project_frames[0])
+
+    def summary(self) -> List[Dict]:
+        """Сводка зависаний по слотам, отсортированная по суммарному времени"""
+        by_slot: Dict[str, List[Dict]] = {}
+        for stall in self.stalls:
+            by_slot.setdefault(stall['slot'], []).append(stall)
+
+        rows = []
+        for slot, stalls in by_slot.items():
+            durations = sorted(s['duration_ms'] for s in stalls)
+            hotspots = Counter(s['hotspot'] for s in stalls)
+            rows.append({
+                'slot': slot,
+                'count': len(stalls),
+                'total_ms': round(sum(durations), 1),
+                'max_ms': durations[-1],
+                'p95_ms': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+                'hotspot': hotspots.most_common(1)[0][0]
+            })
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows
+
+    def log_summary(self):
+        """Записать сводку зависаний в лог"""
+        rows = self.summary()
+        if not rows:
+            logger.info("Зависаний цикла событий не обнаружено")
+            return
+        logger.info(f"Зависания цикла событий (порог {self.threshold * 1000:.0f} мс):")
+        for row in rows:
+            logger.info(
+                f"  {row['slot']}: {row['count']} раз, всего {row['total_ms']} мс, "
+                f"максимум {row['max_ms']} мс, горячая точка {row['hotspot']}"
+            )
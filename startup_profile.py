@@ -0,0 +1,110 @@
+"""Профилирование запуска программы
+
+С флагом --profile-startup main.py подключает этот модуль до остальных
+импортов: каждый первый импорт модуля замеряется через обертку над
+builtins.__import__ (работает и в сборке PyInstaller, где -X importtime
+недоступен), а этапы инициализации отмечаются вызовами mark(). После
+первой итерации цикла событий в stdout выводится хронология запуска.
+"""
+import builtins
+import sys
+import time
+from typing import List, Optional, Tuple
+
+# Импорты короче этого порога не выводятся в хронологии
+MIN_IMPORT_MS = 1.0
+
+
+class StartupProfiler:
+    """Хронология импортов и этапов инициализации"""
+
+    def __init__(self, started: Optional[float] = None):
+        """
+        Args:
+            started: Момент начала отсчета (time.perf_counter()); по умолчанию — сейчас
+        """
+        self.started = started if started is not None else time.perf_counter()
+        # (начало, длительность, глубина вложенности, модуль)
+        self.imports: List[Tuple[float, float, int, str]] = []
+        # (момент, этап)
+        self.marks: List[Tuple[float, str]] = []
+        self._depth = 0
+        self._original_import = None
+
+    def install(self):
+        """Начать замер импортов"""
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        """Прекратить замер импортов"""
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # Уже загруженные модули и относительные импорты не замеряются
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        started = time.perf_counter()
+        depth = self._depth
+        self._depth += 1
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            self._depth -= 1
+            self.imports.append((started - self.started, time.perf_counter() - started, depth, name))
+
+    def mark(self, label: str):
+        """Отметить завершение этапа инициализации"""
+        self.marks.append((time.perf_counter() - self.started, label))
+
+    def timeline(self) -> List[str]:
+        """Строки хронологии, упорядоченные по времени"""
+        events = []
+        for offset, duration, depth, name in self.imports:
+            if duration * 1000 >= MIN_IMPORT_MS:
+                events.append((offset, f"{'  ' * depth}import {name}: {duration * 1000:.1f} мс"))
+        for offset, label in self.marks:
+            events.append((offset, f"== {label}"))
+        events.sort(key=lambda event: event[0])
+        return [f"{offset * 1000:8.1f} мс  {text}" for offset, text in events]
+
+    def report(self, stream=None):
+        """Вывести хронологию запуска и итоги"""
+        stream = stream or sys.stdout
+        top_level = sum(duration for _, duration, depth, _ in self.imports if depth == 0)
+        total = self.marks[-1][0] if self.marks else time.perf_counter() - self.started
+        print("Хронология запуска:", file=stream)
+        for line in self.timeline():
+            print(line, file=stream)
+        print(f"Импорты: {top_level * 1000:.1f} мс, всего до готовности: {total * 1000:.1f} мс",
+              file=stream, flush=True)
+
+
+_profiler: Optional[StartupProfiler] = None
+
+
+def install(started: Optional[float] = None) -> StartupProfiler:
+    """Включить профилирование запуска"""
+    global _profiler
+    _profiler = StartupProfiler(started)
+    _profiler.install()
+    return _profiler
+
+
+def mark(label: str):
+    """Отметить этап запуска (ничего не делает, если профилирование выключено)"""
+    if _profiler is not None:
+        _profiler.mark(label)
+
+
+def finish():
+    """Завершить профилирование и вывести хронологию"""
+    global _profiler
+    if _profiler is None:
+        return
+    _profiler.uninstall()
+    _profiler.report()
+    _profiler = None
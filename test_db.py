@@ -1,8 +1,12 @@
 """Тесты для модуля базы данных"""
 import unittest
 import os
+import shutil
+import sqlite3
 import tempfile
-from db import Database
+import threading
+from datetime import datetime, timedelta
+from db import Database, SCHEMA_VERSION
 
 
 class TestDatabase(unittest.TestCase):
@@ -65,6 +69,52 @@ class TestDatabase(unittest.TestCase):
         prompt = self.db.get_prompt_by_id(prompt_id)
         self.assertIsNone(prompt)
     
+    def test_prompt_versions_and_tags(self):
+        """Тест версий промта и поиска по тегу"""
+        original_id = self.db.create_prompt("Исходный", "наука, Физика")
+        self.db.create_prompt("Другой", "метафизика")
+        version_id = self.db.create_prompt("Улучшенный", "наука, Физика", parent_id=original_id)
+        
+        versions = self.db.get_prompt_versions(original_id)
+        self.assertEqual([v['id'] for v in versions], [version_id])
+        tagged = self.db.get_prompts_by_tag("физика")
+        self.assertEqual([p['id'] for p in tagged], [original_id, version_id])
+    
+    def test_improvement_job_progress(self):
+        """Тест задания пакетного улучшения: продолжение с необработанных промтов"""
+        ids = [self.db.create_prompt(f"Промт {i}") for i in range(3)]
+        job_id = self.db.create_improvement_job(ids + [ids[0]], "Model", {'max_concurrency': 2})
+        
+        version_id = self.db.create_prompt("Улучшенный", parent_id=ids[0])
+        self.assertTrue(self.db.finish_improvement_job_item(job_id, ids[0], result_prompt_id=version_id))
+        self.assertTrue(self.db.finish_improvement_job_item(job_id, ids[1], error="Таймаут"))
+        self.assertFalse(self.db.finish_improvement_job_item(job_id, ids[1], error="Повтор"))
+        self.db.set_improvement_job_status(job_id, 'paused')
+        
+        job = self.db.get_improvement_job(job_id)
+        self.assertEqual((job['total'], job['done'], job['failed']), (3, 1, 1))
+        self.assertEqual(job['options'], {'max_concurrency': 2})
+        self.assertEqual([p['id'] for p in self.db.get_pending_job_prompts(job_id)], [ids[2]])
+        self.assertEqual([j['id'] for j in self.db.get_unfinished_improvement_jobs()], [job_id])
+        
+        self.db.set_improvement_job_status(job_id, 'done')
+        self.assertEqual(self.db.get_unfinished_improvement_jobs(), [])
+    
+    def test_improvement_job_with_deleted_prompt(self):
+        """Тест: удаленный промт отмечается ошибкой, и задание может завершиться"""
+        ids = [self.db.create_prompt(f"Промт {i}") for i in range(2)]
+        job_id = self.db.create_improvement_job(ids, "Model")
+        self.db.delete_prompt(ids[0])
+        self.db.finish_improvement_job_item(job_id, ids[1], error="Таймаут")
+        
+        self.assertEqual(self.db.get_pending_job_prompts(job_id), [])
+        job = self.db.get_improvement_job(job_id)
+        self.assertEqual(job['done'] + job['failed'], job['total'])
+        error = self.db.conn.execute(
+            "SELECT error FROM improvement_job_items WHERE job_id = ? AND prompt_id = ?",
+            (job_id, ids[0])).fetchone()[0]
+        self.assertEqual(error, "Промт удален")
+    
     def test_create_model(self):
         """Тест создания модели"""
         model_id = self.db.create_model(
@@ -136,6 +186,216 @@ class TestDatabase(unittest.TestCase):
         results = self.db.get_results()
         self.assertEqual(len(results), 1)
     
+    def test_identical_responses_stored_once(self):
+        """Тест: одинаковые ответы хранятся один раз и удаляются вместе с последним результатом"""
+        ids = [self.db.save_result(None, None, "Тест", f"Model {i}", "Одинаковый ответ")
+               for i in range(3)]
+        other_id = self.db.save_result(None, None, "Тест", "Model", "Другой ответ")
+        
+        def blobs():
+            return {row['body']: row['refcount'] for row in
+                    self.db.conn.execute("SELECT body, refcount FROM response_blobs")}
+        
+        self.assertEqual(blobs(), {"Одинаковый ответ": 3, "Другой ответ": 1})
+        self.assertEqual(len(self.db.get_results(search="Одинаковый")), 3)
+        
+        self.db.delete_result(ids[0])
+        self.db.delete_result(other_id)
+        self.assertEqual(blobs(), {"Одинаковый ответ": 2})
+        for result_id in ids[1:]:
+            self.db.delete_result(result_id)
+        self.assertEqual(blobs(), {})
+    
+    def test_batch_commits_once(self):
+        """Тест: операции внутри batch() фиксируются вместе или откатываются вместе"""
+        with self.db.batch():
+            self.db.create_prompt("Первый")
+            self.db.create_prompt("Второй")
+            self.assertTrue(self.db.conn.in_transaction)
+        self.assertFalse(self.db.conn.in_transaction)
+        
+        with self.assertRaises(ValueError):
+            with self.db.batch():
+                self.db.create_prompt("Откатится")
+                raise ValueError("ошибка")
+        
+        prompts = [p['prompt'] for p in self.db.get_prompts()]
+        self.assertEqual(sorted(prompts), ["Второй", "Первый"])
+    
+    def test_connection_per_thread(self):
+        """Тест: рабочий поток получает собственное соединение и может писать в БД"""
+        connections = []
+        
+        def worker():
+            connections.append(self.db.conn)
+            self.db.create_prompt("Из потока")
+        
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        
+        self.assertIsNot(connections[0], self.db.conn)
+        self.assertEqual([p['prompt'] for p in self.db.get_prompts()], ["Из потока"])
+        
+        # Соединение закрывается вместе с завершившимся потоком
+        self.assertEqual(len(self.db._connections), 1)
+    
+    def test_close_keeps_live_thread_connection(self):
+        """Тест: close() не закрывает соединение работающего потока, а conn после него недоступно"""
+        opened = threading.Event()
+        closed = threading.Event()
+        outcome = []
+        
+        def worker():
+            conn = self.db.conn
+            opened.set()
+            closed.wait()
+            outcome.append(conn.execute("SELECT COUNT(*) FROM prompts").fetchone()[0])
+            try:
+                self.db.conn
+            except sqlite3.ProgrammingError:
+                outcome.append("закрыта")
+        
+        thread = threading.Thread(target=worker)
+        thread.start()
+        opened.wait()
+        self.db.close()
+        closed.set()
+        thread.join()
+        
+        self.assertEqual(outcome, [0, "закрыта"])
+        self.assertEqual(len(self.db._connections), 0)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            self.db.get_prompts()
+    
+    def test_read_only_database(self):
+        """Тест: БД только для чтения читает данные и отказывает в записи"""
+        self.db.create_prompt("Промт")
+        reader = Database(db_name=self.temp_db.name, read_only=True)
+        try:
+            self.assertEqual(len(reader.get_prompts()), 1)
+            with self.assertRaises(sqlite3.OperationalError):
+                reader.create_prompt("Запись")
+        finally:
+            reader.close()
+    
+    def test_prune_results(self):
+        """Тест правил хранения: последние N на промт и модель, ограничение возраста"""
+        results = [
+            {'prompt_id': None, 'model_id': None, 'prompt_text': prompt,
+             'model_name': model, 'response_text': f"{prompt} {model} {i}"}
+            for prompt in ("П1", "П2") for model in ("A", "B") for i in range(3)
+        ]
+        self.db.save_results(results)
+        self.db.conn.execute("UPDATE results SET created_at = '2000-01-01 00:00:00' "
+                             "WHERE prompt_text = 'П2' AND model_name = 'B'")
+        self.db.conn.commit()
+        
+        self.assertEqual(self.db.prune_results(), 0)
+        self.assertEqual(self.db.prune_results(max_age_days=30), 3)
+        self.assertEqual(self.db.prune_results(keep_last=2), 3)
+        
+        remaining = sorted(r['response_text'] for r in self.db.get_results())
+        self.assertEqual(remaining, ["П1 A 1", "П1 A 2", "П1 B 1", "П1 B 2", "П2 A 1", "П2 A 2"])
+        blobs = self.db.conn.execute("SELECT COUNT(*) FROM response_blobs").fetchone()[0]
+        self.assertEqual(blobs, 6)
+    
+    def test_archive_results_by_month(self):
+        """Тест: старые результаты переносятся в помесячные архивы и остаются доступны"""
+        self.addCleanup(shutil.rmtree, self.db.archive_dir, True)
+        self.db.save_results([
+            {'prompt_text': "Промт", 'model_name': model, 'response_text': "Одинаковый ответ"}
+            for model in ("A", "B", "C")
+        ])
+        self.db.conn.execute("UPDATE results SET created_at = '2020-01-15 10:00:00' WHERE model_name = 'A'")
+        self.db.conn.execute("UPDATE results SET created_at = '2020-02-15 10:00:00' WHERE model_name = 'B'")
+        self.db.conn.commit()
+        
+        self.assertEqual(self.db.archive_results(30), 2)
+        self.assertEqual(self.db.get_archive_months(), ["2020-01", "2020-02"])
+        self.assertTrue(os.path.exists(self.db.archive_path("2020-01")))
+        hot = self.db.conn.execute("SELECT model_name FROM results").fetchall()
+        self.assertEqual([row['model_name'] for row in hot], ["C"])
+        
+        # Без периода читается только основная БД, весь архив — по запросу
+        self.assertEqual([r['model_name'] for r in self.db.get_results()], ["C"])
+        results = self.db.get_results(include_archive=True)
+        self.assertEqual([r['model_name'] for r in results], ["C", "B", "A"])
+        self.assertEqual({r['response_text'] for r in results}, {"Одинаковый ответ"})
+        
+        # Архив подключается, только если месяц попадает в период
+        self.assertEqual(self.db.get_archive_months(date_from="2021-01-01"), [])
+        january = self.db.get_results(date_from="2020-01-01", date_to="2020-01-31")
+        self.assertEqual([r['model_name'] for r in january], ["A"])
+        self.assertEqual(len(self.db.get_results(date_from="2020-02-01")), 2)
+        
+        # Выборка по ID находит и архивные результаты, в порядке списка
+        ids = [r['id'] for r in results]
+        by_ids = self.db.get_results_by_ids([ids[2], ids[0], ids[2], -1])
+        self.assertEqual([r['model_name'] for r in by_ids], ["A", "C"])
+        
+        # Удаление находит результат и в архиве
+        archived_id = results[2]['id']
+        self.assertTrue(self.db.delete_result(archived_id))
+        self.assertEqual(len(self.db.get_results(include_archive=True)), 2)
+        self.assertFalse(self.db.delete_result(archived_id))
+    
+    def test_archive_refcount_recomputed(self):
+        """Тест: повторный перенос тех же строк не увеличивает счетчик ссылок в архиве"""
+        self.addCleanup(shutil.rmtree, self.db.archive_dir, True)
+        self.db.save_results([
+            {'prompt_text': "Промт", 'model_name': model, 'response_text': "Ответ"}
+            for model in ("A", "B")
+        ])
+        self.db.conn.execute("UPDATE results SET created_at = '2020-01-15 10:00:00'")
+        self.db.conn.commit()
+        rows = self.db.conn.execute("SELECT * FROM results").fetchall()
+        self.assertEqual(self.db.archive_results(30), 2)
+        
+        # Сбой после записи архива: строки остались и в основной БД
+        self.db.conn.executemany(
+            "INSERT INTO results (id, prompt_id, model_id, prompt_text, model_name, "
+            "response_hash, created_at, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [tuple(row) for row in rows])
+        self.db.conn.commit()
+        self.assertEqual(self.db.archive_results(30), 2)
+        
+        with self.db._attached_archive("2020-01"):
+            refcount = self.db.conn.execute(
+                "SELECT refcount FROM archive.response_blobs").fetchone()[0]
+        self.assertEqual(refcount, 2)
+    
+    def test_prune_results_in_archives(self):
+        """Тест: ограничение возраста удаляет и архивные результаты, старые месяцы — целиком"""
+        self.addCleanup(shutil.rmtree, self.db.archive_dir, True)
+        self.db.save_results([
+            {'prompt_text': "Промт", 'model_name': model, 'response_text': f"Ответ {model}"}
+            for model in ("A", "B", "C")
+        ])
+        old = (datetime.now() - timedelta(days=400)).strftime("%Y-%m-%d %H:%M:%S")
+        self.db.conn.execute("UPDATE results SET created_at = '2020-01-15 10:00:00' WHERE model_name = 'A'")
+        self.db.conn.execute("UPDATE results SET created_at = ? WHERE model_name = 'B'", (old,))
+        self.db.conn.commit()
+        self.assertEqual(self.db.archive_results(30), 2)
+        
+        self.assertEqual(self.db.prune_results(max_age_days=1000), 1)
+        self.assertEqual(self.db.get_archive_months(), [old[:7]])
+        self.assertEqual(self.db.prune_results(max_age_days=100), 1)
+        self.assertEqual(self.db.get_archive_months(), [])
+        self.assertEqual([r['model_name'] for r in self.db.get_results(include_archive=True)], ["C"])
+    
+    def test_archive_not_attached_inside_batch(self):
+        """Тест: подключение архива внутри batch() не фиксирует пакет"""
+        with self.assertRaises(RuntimeError):
+            with self.db.batch():
+                self.db.create_prompt("Промт")
+                with self.db._attached_archive("2020-01"):
+                    pass
+        self.assertEqual(self.db.get_prompts(), [])
+        with self.assertRaises(RuntimeError):
+            with self.db.batch():
+                self.db.prune_results(max_age_days=30)
+    
     def test_get_setting(self):
         """Тест получения настройки"""
         self.db.set_setting("test_key", "test_value")
@@ -148,6 +408,270 @@ class TestDatabase(unittest.TestCase):
         self.assertTrue(success)
         value = self.db.get_setting("test_key")
         self.assertEqual(value, "test_value")
+    
+    def test_settings_cached(self):
+        """Тест: настройки читаются из кэша без запросов к БД"""
+        self.db.set_setting("theme", "dark")
+        self.db.get_setting("theme")
+        
+        statements = []
+        self.db.conn.set_trace_callback(statements.append)
+        try:
+            for _ in range(100):
+                self.assertEqual(self.db.get_setting("theme"), "dark")
+            self.assertEqual(self.db.get_setting("missing", "default"), "default")
+        finally:
+            self.db.conn.set_trace_callback(None)
+        self.assertEqual(statements, [])
+        
+        # Значение из кэша совпадает с сохраненным в БД
+        self.db.reload_settings()
+        self.assertEqual(self.db.get_setting("theme"), "dark")
+    
+    def test_settings_listeners(self):
+        """Тест уведомлений об изменении настроек"""
+        changes = []
+        self.db.add_settings_listener(lambda key, value: changes.append((key, value)))
+        
+        self.db.set_setting("theme", "dark")
+        self.db.set_setting("theme", "dark")  # Значение не изменилось
+        self.db.set_setting("font_size", "12")
+        
+        self.assertEqual(changes, [("theme", "dark"), ("font_size", "12")])
+
+    
+    def test_set_setting_in_batch(self):
+        """Тест: внутри batch() настройка применяется после фиксации и отбрасывается при откате"""
+        changes = []
+        self.db.add_settings_listener(lambda key, value: changes.append((key, value)))
+        
+        with self.db.batch():
+            self.db.set_setting("theme", "dark")
+            self.assertIsNone(self.db.get_setting("theme"))
+            self.assertEqual(changes, [])
+        self.assertEqual(self.db.get_setting("theme"), "dark")
+        self.assertEqual(changes, [("theme", "dark")])
+        
+        with self.assertRaises(ValueError):
+            with self.db.batch():
+                self.db.set_setting("theme", "light")
+                raise ValueError("Откат")
+        self.assertEqual(self.db.get_setting("theme"), "dark")
+        self.db.reload_settings()
+        self.assertEqual(self.db.get_setting("theme"), "dark")
+        self.assertEqual(changes, [("theme", "dark")])
+    
+    def test_record_usage(self):
+        """Тест суточной статистики использования"""
+        results = [
+            {'model_name': 'Model 1', 'success': True,
+             'metadata': {'provider': 'openai', 'prompt_tokens': 10, 'completion_tokens': 40,
+                          'latency': 2.0, 'cost': 0.01}},
+            {'model_name': 'Model 1', 'success': False,
+             'metadata': {'provider': 'openai', 'latency': 1.0}},
+            {'model_name': 'Model 1', 'success': True,
+             'metadata': {'provider': 'openai', 'prompt_tokens': 10, 'completion_tokens': 40,
+                          'latency': 2.0, 'cost': 0.01, 'coalesced': True}},
+            {'model_name': 'Model 2', 'success': True, 'metadata': None}
+        ]
+        count = self.db.record_usage(results)
+        self.assertEqual(count, 3)
+        
+        stats = {s['model_name']: s for s in self.db.get_usage_stats()}
+        self.assertEqual(stats['Model 1']['requests'], 2)
+        self.assertEqual(stats['Model 1']['errors'], 1)
+        self.assertEqual(stats['Model 1']['completion_tokens'], 40)
+        self.assertAlmostEqual(stats['Model 1']['cost'], 0.01)
+        self.assertAlmostEqual(stats['Model 1']['tokens_per_second'], 40 / 3.0)
+        self.assertEqual(stats['Model 2']['requests'], 1)
+    
+    def test_record_timings(self):
+        """Тест сохранения истории замеров времени"""
+        timing = {'connect_time': 0.05, 'tls_time': 0.1, 'ttfb': 0.4, 'ttft': None,
+                  'total_time': 1.2, 'bytes_sent': 100, 'bytes_received': 2000,
+                  'reused_connection': False}
+        results = [
+            {'model_name': 'Model 1', 'success': True,
+             'metadata': {'status_code': 200, 'timing': timing}},
+            {'model_name': 'Model 2', 'success': False, 'metadata': None}
+        ]
+        count = self.db.record_timings(results, prompt_id=None)
+        self.assertEqual(count, 1)
+        
+        history = self.db.get_request_timings()
+        self.assertEqual(len(history), 1)
+        self.assertEqual(history[0]['model_name'], 'Model 1')
+        self.assertEqual(history[0]['status_code'], 200)
+        self.assertAlmostEqual(history[0]['ttfb'], 0.4)
+        self.assertEqual(history[0]['reused_connection'], 0)
+    
+    def test_schema_creation_skipped_when_version_current(self):
+        """Тест: при актуальной версии схемы таблицы при запуске не пересоздаются"""
+        self.db.conn.execute("DROP INDEX idx_prompts_date")
+        self.db.conn.commit()
+        self.db.close()
+        
+        self.db = Database(db_name=self.temp_db.name)
+        indexes = [row['name'] for row in self.db.conn.execute("PRAGMA index_list(prompts)")]
+        self.assertNotIn("idx_prompts_date", indexes)
+        
+        # После сброса версии схема проверяется и восстанавливается
+        self.db.conn.execute("PRAGMA user_version = 0")
+        self.db.conn.commit()
+        self.db.close()
+        self.db = Database(db_name=self.temp_db.name)
+        indexes = [row['name'] for row in self.db.conn.execute("PRAGMA index_list(prompts)")]
+        self.assertIn("idx_prompts_date", indexes)
+    
+    def test_migration_enables_incremental_vacuum(self):
+        """Тест: новая БД сразу, а обновленная только по явному переводу работают в режиме auto_vacuum=INCREMENTAL"""
+        self.assertTrue(self.db.incremental_vacuum_enabled())
+        self.db.close()
+        
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute("PRAGMA auto_vacuum = NONE")
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA user_version = 5")
+        conn.close()
+        
+        # Ни при открытии, ни при плановом обслуживании VACUUM не выполняется
+        self.db = Database(db_name=self.temp_db.name)
+        self.assertEqual(self.db.conn.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+        report = self.db.run_maintenance()
+        self.assertEqual(report['freed_pages'], 0)
+        self.assertFalse(self.db.incremental_vacuum_enabled())
+        
+        self.assertFalse(self.db.incremental_vacuum_enabled())
+        
+        # Перевод выполняется в фоновом потоке; основное соединение видит новый режим
+        def convert():
+            self.db.enable_incremental_vacuum()
+            self.db.release_connection()
+        worker = threading.Thread(target=convert)
+        worker.start()
+        worker.join()
+        self.assertTrue(self.db.incremental_vacuum_enabled())
+        with self.assertRaises(RuntimeError):
+            with self.db.batch():
+                self.db.enable_incremental_vacuum()
+    
+    def test_run_maintenance(self):
+        """Тест обслуживания: тексты без ссылок удаляются, свободные страницы возвращаются"""
+        self.db.save_results([
+            {'prompt_text': "Промт", 'model_name': "M", 'response_text': f"{i} " + "ответ " * 1000}
+            for i in range(100)
+        ])
+        self.db.conn.execute("DELETE FROM results")
+        self.db.conn.execute("INSERT INTO response_blobs (hash, body, refcount) VALUES ('x', 'y', 1)")
+        self.db.conn.commit()
+        free_pages = self.db.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        self.assertGreater(free_pages, 0)
+        
+        report = self.db.run_maintenance()
+        
+        self.assertEqual(report['orphan_blobs'], 1)
+        # ANALYZE занимает страницу под sqlite_stat1, поэтому точного равенства нет
+        self.assertGreater(report['freed_pages'], free_pages // 2)
+        self.assertEqual(self.db.conn.execute("PRAGMA freelist_count").fetchone()[0], 0)
+        self.assertIn('analyze', report['timings'])
+        self.assertIn('optimize', self.db.run_maintenance()['timings'])
+        with self.assertRaises(RuntimeError):
+            with self.db.batch():
+                self.db.run_maintenance()
+    
+    def test_migration_adds_model_prices(self):
+        """Тест обновления БД, созданной старой версией программы"""
+        self.db.close()
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute("DROP TABLE models")
+        conn.execute("""
+            CREATE TABLE models (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE,
+                api_url TEXT NOT NULL,
+                api_id TEXT NOT NULL,
+                api_key_env_var TEXT NOT NULL,
+                model_type TEXT NOT NULL,
+                is_active INTEGER NOT NULL DEFAULT 1,
+                created_at TEXT NOT NULL,
+                updated_at TEXT
+            )
+        """)
+        conn.execute("PRAGMA user_version = 0")
+        conn.commit()
+        conn.close()
+        
+        self.db = Database(db_name=self.temp_db.name)
+        model_id = self.db.create_model("Priced", "https://api.test.com", "priced",
+                                        "TEST_KEY", "openai", 1, 1.5, 3.0)
+        model = self.db.get_model_by_id(model_id)
+        self.assertEqual(model['prompt_price'], 1.5)
+        self.assertEqual(model['completion_price'], 3.0)
+        version = self.db.conn.execute("PRAGMA user_version").fetchone()[0]
+        self.assertEqual(version, SCHEMA_VERSION)
+
+    
+    def test_migration_adds_prompt_parent(self):
+        """Тест: в БД предыдущей версии у промтов появляется ссылка на исходный промт"""
+        self.db.close()
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute("DROP TABLE prompts")
+        conn.execute("""
+            CREATE TABLE prompts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                tags TEXT
+            )
+        """)
+        conn.execute("INSERT INTO prompts (date, prompt) VALUES ('2024-01-15 10:00:00', 'Старый')")
+        conn.execute("PRAGMA user_version = 3")
+        conn.commit()
+        conn.close()
+        
+        self.db = Database(db_name=self.temp_db.name)
+        version_id = self.db.create_prompt("Новый", parent_id=1)
+        self.assertEqual(self.db.get_prompt_by_id(version_id)['parent_id'], 1)
+        self.assertIsNone(self.db.get_prompt_by_id(1)['parent_id'])
+
+    
+    def test_migration_moves_responses_to_blobs(self):
+        """Тест: тексты ответов из БД версии 4 переносятся в response_blobs"""
+        self.db.close()
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute("DROP TABLE results")
+        conn.execute("DROP TABLE response_blobs")
+        conn.execute("""
+            CREATE TABLE results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                prompt_id INTEGER,
+                model_id INTEGER,
+                prompt_text TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                response_text TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                metadata TEXT
+            )
+        """)
+        conn.executemany("""
+            INSERT INTO results (prompt_text, model_name, response_text, created_at, metadata)
+            VALUES ('Промт', ?, ?, '2024-01-15 10:00:00', '{"latency": 1.0}')
+        """, [("A", "Ответ"), ("B", "Ответ"), ("C", "Другой")])
+        conn.execute("PRAGMA user_version = 4")
+        conn.commit()
+        conn.close()
+        
+        self.db = Database(db_name=self.temp_db.name)
+        results = self.db.get_results(order_by="model_name", order_dir="ASC")
+        self.assertEqual([(r['model_name'], r['response_text']) for r in results],
+                         [("A", "Ответ"), ("B", "Ответ"), ("C", "Другой")])
+        self.assertEqual(results[0]['metadata'], {'latency': 1.0})
+        blobs = dict(self.db.conn.execute("SELECT body, refcount FROM response_blobs").fetchall())
+        self.assertEqual(blobs, {"Ответ": 2, "Другой": 1})
+        
+        # Триггеры пересозданной таблицы работают
+        self.db.delete_result(results[2]['id'])
+        self.assertEqual(self.db.conn.execute("SELECT COUNT(*) FROM response_blobs").fetchone()[0], 1)
 
 
 if __name__ == '__main__':
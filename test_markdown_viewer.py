@@ -0,0 +1,190 @@
+"""Тесты для просмотра Markdown"""
+import os
+import threading
+import unittest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+import markdown_viewer
+from markdown_viewer import (
+    IncrementalMarkdownRenderer, MarkdownViewDialog, RenderCache, render_cache, render_markdown
+)
+
+
+class TestRenderCache(unittest.TestCase):
+    """Тесты для класса RenderCache"""
+
+    def test_lru_eviction_by_size(self):
+        """Тест вытеснения давно не использованных записей при превышении объема"""
+        cache = RenderCache(max_bytes=250)
+        cache.put("a", "a" * 100)
+        cache.put("b", "b" * 100)
+        self.assertIsNotNone(cache.get("a"))  # "a" становится недавно использованной
+        cache.put("c", "c" * 100)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(cache.size, 200)
+
+    def test_oversized_item_not_cached(self):
+        """Тест: запись больше всего кэша не сохраняется"""
+        cache = RenderCache(max_bytes=10)
+        cache.put("big", "x" * 100)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+
+
+class TestRenderMarkdown(unittest.TestCase):
+    """Тесты преобразования Markdown в HTML"""
+
+    def setUp(self):
+        render_cache.clear()
+
+    def test_render_uses_cache(self):
+        """Тест повторного преобразования из кэша"""
+        text = "# Заголовок\n\n| a | b |\n|---|---|\n| 1 | 2 |"
+        html = render_markdown(text)
+        self.assertIn("<table>", html)
+        self.assertEqual(len(render_cache), 1)
+        self.assertIs(render_markdown(text), html)
+
+    def test_markdown_instance_reused_and_reset(self):
+        """Тест: общий экземпляр Markdown не переносит состояние между документами"""
+        first = render_markdown("```python\nx = 1\n```")
+        instance = markdown_viewer._markdown
+        second = render_markdown("Просто текст")
+
+        self.assertIs(markdown_viewer._markdown, instance)
+        self.assertIn('class="codehilite"', first)
+        self.assertNotIn('class="codehilite"', second)
+        self.assertIn("Просто текст", second)
+
+
+def _normalize(html: str) -> str:
+    return "".join(html.split())
+
+
+class TestIncrementalMarkdownRenderer(unittest.TestCase):
+    """Тесты инкрементального преобразования потокового ответа"""
+
+    TEXT = (
+        "# Заголовок\n\nПервый абзац.\n\n"
+        "```python\ndef f():\n\n    return 1\n```\n\n"
+        "| a | b |\n|---|---|\n| 1 | 2 |\n\nПоследний абзац"
+    )
+
+    def _feed_by_chunks(self, renderer, text, size=7):
+        for i in range(0, len(text), size):
+            renderer.feed(text[i:i + size])
+            renderer.render_body()
+
+    def test_matches_full_render(self):
+        """Тест: результат по частям совпадает с преобразованием всего текста"""
+        renderer = IncrementalMarkdownRenderer()
+        self._feed_by_chunks(renderer, self.TEXT)
+        self.assertEqual(_normalize(renderer.render()), _normalize(render_markdown(self.TEXT)))
+
+    def test_fence_with_blank_line_not_split(self):
+        """Тест: пустая строка внутри блока кода не завершает блок"""
+        renderer = IncrementalMarkdownRenderer()
+        renderer.feed("```\nx = 1\n\ny = 2\n")
+        self.assertEqual(renderer._blocks_html, [])
+        renderer.feed("```\n\n")
+        self.assertEqual(len(renderer._blocks_html), 1)
+        self.assertIn("y = 2", renderer._blocks_html[0])
+
+    def test_tail_converted_only_when_changed(self):
+        """Тест: неизменившийся последний блок не преобразуется повторно"""
+        renderer = IncrementalMarkdownRenderer()
+        renderer.feed("Абзац 1\n\nАбзац 2")
+        calls = []
+        original = markdown_viewer._convert_streaming
+
+        def counting_convert(text):
+            calls.append(text)
+            return original(text)
+
+        markdown_viewer._convert_streaming = counting_convert
+        try:
+            renderer.render_body()
+            renderer.render_body()
+            renderer.feed(" продолжается")
+            renderer.render_body()
+        finally:
+            markdown_viewer._convert_streaming = original
+        self.assertEqual(calls, ["Абзац 2", "Абзац 2 продолжается"])
+
+    def test_new_blocks_taken_once(self):
+        """Тест: каждый завершенный блок выдается для вывода один раз"""
+        renderer = IncrementalMarkdownRenderer()
+        renderer.feed("Абзац 1\n\nАбзац 2")
+        first = renderer.take_new_blocks()
+        self.assertEqual(len(first), 1)
+        self.assertIn("Абзац 1", first[0])
+        self.assertEqual(renderer.take_new_blocks(), [])
+        renderer.feed("\n\nАбзац 3")
+        second = renderer.take_new_blocks()
+        self.assertEqual(len(second), 1)
+        self.assertIn("Абзац 2", second[0])
+        self.assertIn("Абзац 3", renderer.tail_html())
+
+    def test_does_not_wait_for_background_render(self):
+        """Тест: потоковое преобразование не ждет блокировки фонового форматирования"""
+        renderer = IncrementalMarkdownRenderer()
+        worker = threading.Thread(target=lambda: renderer.feed("Абзац 1\n\nАбзац 2") or renderer.render_body())
+        with markdown_viewer._markdown_lock:
+            worker.start()
+            worker.join(5)
+            self.assertFalse(worker.is_alive())
+
+
+class TestMarkdownViewDialog(unittest.TestCase):
+    """Тесты для диалога MarkdownViewDialog"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        render_cache.clear()
+
+    def test_renders_in_background_then_from_cache(self):
+        """Тест: первое открытие форматирует в фоне, повторное — сразу из кэша"""
+        text = "# Ответ\n\n" + "Абзац текста ответа. " * 2000
+        dialog = MarkdownViewDialog(None, text, "Тест")
+        self.assertIsNotNone(dialog.render_thread)
+        self.assertTrue(dialog.render_thread.wait(10000))
+        self.app.processEvents()
+        self.assertIn("Абзац текста ответа", dialog.text_browser.toPlainText())
+
+        second = MarkdownViewDialog(None, text, "Тест")
+        self.assertIsNone(second.render_thread)
+        self.assertIn("Абзац текста ответа", second.text_browser.toPlainText())
+
+    def test_streaming_dialog(self):
+        """Тест: потоковый просмотр дополняется фрагментами и завершается полным текстом"""
+        dialog = MarkdownViewDialog(None, "", "Тест", streaming=True)
+        dialog.append_markdown("Первый ")
+        dialog.append_markdown("фрагмент\n\nВторой")
+        dialog.stream_throttle.flush()
+        self.assertIn("Второй", dialog.text_browser.toPlainText())
+
+        dialog.append_markdown(" абзац\n\n## Третий\n\nКонец")
+        dialog.stream_throttle.flush()
+        self.assertEqual(
+            dialog.text_browser.toPlainText(), "Первый фрагмент\nВторой абзац\nТретий\nКонец"
+        )
+
+        # Итоговый текст форматируется целиком в фоновом потоке
+        dialog.finish_streaming("Первый фрагмент\n\nВторой абзац\n\nИтог")
+        self.assertIsNotNone(dialog.render_thread)
+        self.assertTrue(dialog.render_thread.wait(10000))
+        self.app.processEvents()
+        self.assertIn("Итог", dialog.text_browser.toPlainText())
+        self.assertNotIn("Третий", dialog.text_browser.toPlainText())
+
+
+if __name__ == '__main__':
+    unittest.main()
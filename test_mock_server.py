@@ -0,0 +1,103 @@
+"""Тесты запросов к моделям через локальный тестовый сервер"""
+import os
+import tempfile
+import unittest
+from db import Database
+from mock_server import MockServer, MOCK_API_KEY_ENV_VAR, parse_latency, point_models_to_server
+from models import OpenAIModel, OpenRouterModel, ModelFactory
+from network import NetworkManager
+
+
+class TestMockServer(unittest.TestCase):
+    """Тесты моделей на реальных сокетах"""
+    
+    def setUp(self):
+        os.environ[MOCK_API_KEY_ENV_VAR] = "mock-key"
+        self.server = MockServer(response_tokens=20, seed=1).start()
+    
+    def tearDown(self):
+        self.server.stop()
+    
+    def _model(self, model_class=OpenAIModel, name="Mock"):
+        return model_class(name, self.server.url, "mock/model", MOCK_API_KEY_ENV_VAR)
+    
+    def test_send_request(self):
+        """Тест обычного ответа и метаданных"""
+        result = self._model().send_request("Привет")
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(len(result['response'].split()), 20)
+        self.assertEqual(result['metadata']['completion_tokens'], 20)
+        self.assertEqual(result['metadata']['status_code'], 200)
+        self.assertFalse(result['metadata']['timing']['reused_connection'])
+    
+    def test_connection_reused(self):
+        """Тест повторного использования соединения из пула"""
+        model = self._model()
+        model.send_request("Первый")
+        result = model.send_request("Второй")
+        
+        self.assertTrue(result['metadata']['timing']['reused_connection'])
+    
+    def test_streaming(self):
+        """Тест потокового ответа"""
+        deltas = []
+        result = self._model().send_request("Привет", on_delta=deltas.append)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(len(deltas), 20)
+        self.assertEqual(''.join(deltas), result['response'])
+        self.assertEqual(result['metadata']['completion_tokens'], 20)
+        self.assertIsNotNone(result['metadata']['timing']['ttft'])
+        self.assertEqual(self.server.stats['streamed'], 1)
+    
+    def test_error_injection(self):
+        """Тест внедрения ошибки 429"""
+        self.server.error_rates = {429: 1.0}
+        
+        result = self._model(OpenRouterModel).send_request("Привет")
+        
+        self.assertFalse(result['success'])
+        self.assertIn('Превышен лимит', result['error'])
+        self.assertEqual(result['metadata']['status_code'], 429)
+    
+    def test_send_to_all_models(self):
+        """Тест параллельной отправки в несколько моделей"""
+        models = [self._model(name=f"Mock {i}") for i in range(4)]
+        results = NetworkManager(max_workers=4).send_to_all_models("Привет", models)
+        
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(r['success'] for r in results))
+    
+    def test_point_models_to_server(self):
+        """Тест направления моделей БД на тестовый сервер"""
+        temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        temp_db.close()
+        db = Database(db_name=temp_db.name)
+        try:
+            db.create_model("Real", "https://api.openai.com/v1/chat/completions",
+                            "gpt-4", "OPENAI_API_KEY", "openai", 1)
+            model_ids = point_models_to_server(db, self.server.url, create_models=2)
+            
+            self.assertEqual(len(model_ids), 3)
+            for model_data in db.get_all_models():
+                self.assertEqual(model_data['api_url'], self.server.url)
+                model = ModelFactory.create_model_from_db(model_data)
+                self.assertTrue(model.send_request("Привет")['success'])
+        finally:
+            db.close()
+            os.unlink(temp_db.name)
+    
+    def test_parse_latency(self):
+        """Тест разбора распределений задержки"""
+        import random
+        rng = random.Random(0)
+        self.assertEqual(parse_latency("fixed:0.5")(rng), 0.5)
+        self.assertTrue(0.1 <= parse_latency("uniform:0.1,0.2")(rng) <= 0.2)
+        self.assertGreater(parse_latency("lognormal:0.3,0.5")(rng), 0)
+        with self.assertRaises(ValueError):
+            parse_latency("unknown:1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,10 @@
 """Тесты для модуля моделей"""
+import os
+import tempfile
 import unittest
 from unittest.mock import Mock, patch
-from models import OpenAIModel, OpenRouterModel, ModelFactory
+from db import Database
+from models import OpenAIModel, OpenRouterModel, ModelFactory, ModelRegistry
 
 
 class TestModels(unittest.TestCase):
@@ -29,12 +32,13 @@ class TestModels(unittest.TestCase):
         self.assertEqual(model.name, "GPT-4 Turbo")
         self.assertEqual(model.api_id, "openai/gpt-4-turbo")
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     @patch('models.get_env_var')
     def test_openai_model_send_request_success(self, mock_get_env, mock_post):
         """Тест успешной отправки запроса к OpenAI"""
         mock_get_env.return_value = "test-key"
         mock_response = Mock()
+        mock_response.content = b'{}'
         mock_response.json.return_value = {
             'choices': [{'message': {'content': 'Тестовый ответ'}}]
         }
@@ -48,7 +52,88 @@ class TestModels(unittest.TestCase):
         self.assertTrue(result['success'])
         self.assertEqual(result['response'], 'Тестовый ответ')
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
+    @patch('models.get_env_var')
+    def test_send_request_captures_usage(self, mock_get_env, mock_post):
+        """Тест сохранения токенов, статуса и стоимости в метаданных"""
+        mock_get_env.return_value = "test-key"
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.content = b'{}'
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': 'Ответ'}}],
+            'usage': {'prompt_tokens': 1000, 'completion_tokens': 500, 'total_tokens': 1500}
+        }
+        mock_response.raise_for_status = Mock()
+        mock_post.return_value = mock_response
+        
+        model = OpenAIModel("GPT-4", "https://api.openai.com/v1/chat/completions",
+                           "gpt-4", "OPENAI_API_KEY",
+                           prompt_price=2.0, completion_price=10.0)
+        result = model.send_request("Тестовый промт")
+        
+        metadata = result['metadata']
+        self.assertEqual(metadata['provider'], 'openai')
+        self.assertEqual(metadata['status_code'], 200)
+        self.assertEqual(metadata['prompt_tokens'], 1000)
+        self.assertEqual(metadata['completion_tokens'], 500)
+        self.assertEqual(metadata['total_tokens'], 1500)
+        self.assertAlmostEqual(metadata['cost'], 0.007)
+        self.assertGreaterEqual(metadata['latency'], 0)
+        self.assertEqual(metadata['timing']['bytes_received'], 2)
+        self.assertGreater(metadata['timing']['bytes_sent'], 0)
+        self.assertIsNotNone(metadata['timing']['ttfb'])
+    
+    @patch('requests.Session.post')
+    @patch('models.get_env_var')
+    def test_send_request_stream(self, mock_get_env, mock_post):
+        """Тест потокового ответа: фрагменты, время до первого токена и токены"""
+        mock_get_env.return_value = "test-key"
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.iter_lines.return_value = [
+            b'data: {"choices": [{"delta": {"role": "assistant"}}]}',
+            b'',
+            'data: {"choices": [{"delta": {"content": "Привет"}}]}'.encode('utf-8'),
+            'data: {"choices": [{"delta": {"content": ", мир"}}]}'.encode('utf-8'),
+            b'data: {"choices": [], "usage": {"prompt_tokens": 3, "completion_tokens": 2}}',
+            b'data: [DONE]'
+        ]
+        mock_post.return_value = mock_response
+        
+        model = OpenAIModel("GPT-4", "https://api.openai.com/v1/chat/completions",
+                           "gpt-4", "OPENAI_API_KEY")
+        deltas = []
+        result = model.send_request("Тестовый промт", on_delta=deltas.append)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['response'], 'Привет, мир')
+        self.assertEqual(deltas, ['Привет', ', мир'])
+        self.assertEqual(result['metadata']['completion_tokens'], 2)
+        self.assertIsNotNone(result['metadata']['timing']['ttft'])
+    
+    @patch('requests.Session.post')
+    @patch('models.get_env_var')
+    def test_openrouter_reported_cost(self, mock_get_env, mock_post):
+        """Тест использования стоимости, которую сообщает OpenRouter"""
+        mock_get_env.return_value = "test-key"
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.content = b'{}'
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': 'Ответ'}}],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': 20, 'cost': 0.0012}
+        }
+        mock_post.return_value = mock_response
+        
+        model = OpenRouterModel("GPT-4 Turbo", "https://openrouter.ai/api/v1/chat/completions",
+                                "openai/gpt-4-turbo", "OPENROUTER_API_KEY")
+        result = model.send_request("Тестовый промт")
+        
+        self.assertEqual(result['metadata']['total_tokens'], 30)
+        self.assertAlmostEqual(result['metadata']['cost'], 0.0012)
+    
+    @patch('requests.Session.post')
     @patch('models.get_env_var')
     def test_openai_model_send_request_error(self, mock_get_env, mock_post):
         """Тест обработки ошибки при запросе к OpenAI"""
@@ -61,6 +146,26 @@ class TestModels(unittest.TestCase):
         
         self.assertFalse(result['success'])
         self.assertIsNotNone(result['error'])
+        self.assertEqual(result['metadata']['provider'], 'openai')
+        self.assertIsNotNone(result['metadata']['latency'])
+    
+    @patch('requests.Session.post')
+    @patch('models.get_env_var')
+    def test_openrouter_request_error_metadata(self, mock_get_env, mock_post):
+        """Тест: ошибка запроса к OpenRouter возвращает метаданные с HTTP-статусом"""
+        import requests
+        mock_get_env.return_value = "test-key"
+        error_response = Mock()
+        error_response.status_code = 429
+        mock_post.side_effect = requests.exceptions.ConnectionError("429", response=error_response)
+        
+        model = OpenRouterModel("GPT-4 Turbo", "https://openrouter.ai/api/v1/chat/completions",
+                                "openai/gpt-4-turbo", "OPENROUTER_API_KEY")
+        result = model.send_request("Тестовый промт")
+        
+        self.assertFalse(result['success'])
+        self.assertEqual(result['metadata']['status_code'], 429)
+        self.assertEqual(result['metadata']['provider'], 'openrouter')
     
     def test_model_factory_create_openai(self):
         """Тест создания OpenAI модели через фабрику"""
@@ -109,6 +214,67 @@ class TestModels(unittest.TestCase):
         self.assertIsNone(model)
 
 
+
+class TestModelRegistry(unittest.TestCase):
+    """Тесты для кэша моделей ModelRegistry"""
+    
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db = Database(db_name=self.temp_db.name)
+        self.ids = [
+            self.db.create_model(name, "https://api.test.com", name.lower(), "TEST_KEY", "openai")
+            for name in ("B", "A", "C")
+        ]
+        self.registry = ModelRegistry.for_database(self.db)
+    
+    def tearDown(self):
+        self.db.close()
+        os.unlink(self.temp_db.name)
+    
+    def test_models_cached_without_queries(self):
+        """Тест: повторное получение моделей не обращается к БД"""
+        first = self.registry.active_models()
+        self.assertEqual([m.name for m in first], ["A", "B", "C"])
+        
+        statements = []
+        self.db.conn.set_trace_callback(statements.append)
+        try:
+            second = self.registry.active_models()
+            by_ids = self.registry.models_by_ids([self.ids[2], self.ids[0]])
+        finally:
+            self.db.conn.set_trace_callback(None)
+        
+        self.assertEqual(statements, [])
+        self.assertTrue(all(a is b for a, b in zip(first, second)))
+        self.assertEqual([m.name for m in by_ids], ["C", "B"])
+        self.assertIs(ModelRegistry.for_database(self.db), self.registry)
+    
+    def test_invalidated_on_changes(self):
+        """Тест: изменения моделей в БД видны в реестре, неизмененные экземпляры сохраняются"""
+        before = {m.name: m for m in self.registry.active_models()}
+        
+        self.db.toggle_model_active(self.ids[0])  # B
+        self.db.update_model(self.ids[1], api_url="https://other.test.com")  # A
+        self.db.delete_model(self.ids[2])  # C
+        self.db.create_model("D", "https://api.test.com", "d", "TEST_KEY", "openai")
+        
+        after = {m.name: m for m in self.registry.active_models()}
+        self.assertEqual(sorted(after), ["A", "D"])
+        self.assertIsNot(after["A"], before["A"])
+        self.assertEqual(after["A"].api_url, "https://other.test.com")
+        
+        # Повторное включение возвращает прежний экземпляр модели
+        self.db.toggle_model_active(self.ids[0])
+        self.assertIs(self.registry.models_by_ids([self.ids[0]])[0], before["B"])
+    
+    def test_unsupported_types_counted(self):
+        """Тест: активные модели неподдерживаемого типа пропускаются и учитываются"""
+        self.db.create_model("X", "https://api.test.com", "x", "TEST_KEY", "unknown_type")
+        self.assertEqual(len(self.registry.active_models()), 3)
+        self.assertEqual(self.registry.unsupported_active_count(), 1)
+
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,166 @@
+"""Тесты для модуля сетевых запросов"""
+import threading
+import time
+import unittest
+from typing import Dict
+from models import Model
+from network import NetworkManager
+
+
+class SlowModel(Model):
+    """Тестовая модель с задержкой ответа и счетчиком вызовов"""
+    
+    def __init__(self, name: str, api_id: str = "slow-model", delay: float = 0.2):
+        super().__init__(name, "http://localhost/v1/chat/completions", api_id, "TEST_KEY")
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+    
+    def send_request(self, prompt: str) -> Dict:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return {'success': True, 'response': f"Ответ на: {prompt}", 'error': None}
+
+
+class TestRequestCoalescing(unittest.TestCase):
+    """Тесты объединения одинаковых запросов"""
+    
+    def _run_concurrently(self, target, count: int):
+        results = [None] * count
+        
+        def worker(index):
+            results[index] = target(index)
+        
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+    
+    def test_identical_requests_share_one_call(self):
+        """Одинаковые одновременные запросы выполняются один раз"""
+        model = SlowModel("Slow")
+        manager = NetworkManager()
+        
+        results = self._run_concurrently(lambda i: manager.send_to_model(model, "Промт"), 5)
+        
+        self.assertEqual(model.calls, 1)
+        for result in results:
+            self.assertTrue(result['success'])
+            self.assertEqual(result['response'], "Ответ на: Промт")
+    
+    def test_coalescing_across_managers(self):
+        """Запросы из разных менеджеров тоже объединяются"""
+        model = SlowModel("Slow")
+        managers = [NetworkManager() for _ in range(3)]
+        
+        self._run_concurrently(lambda i: managers[i].send_to_model(model, "Промт"), 3)
+        
+        self.assertEqual(model.calls, 1)
+    
+    def test_waiters_get_own_model_name(self):
+        """Ожидающий запрос получает результат со своим именем модели"""
+        leader = SlowModel("Leader")
+        follower = SlowModel("Follower")
+        manager = NetworkManager()
+        
+        results = self._run_concurrently(
+            lambda i: manager.send_to_model(leader if i == 0 else follower, "Промт"), 2
+        )
+        
+        self.assertEqual(leader.calls + follower.calls, 1)
+        self.assertEqual({r['model_name'] for r in results}, {"Leader", "Follower"})
+    
+    def test_different_prompts_not_coalesced(self):
+        """Разные промты отправляются отдельно"""
+        model = SlowModel("Slow")
+        manager = NetworkManager()
+        
+        self._run_concurrently(lambda i: manager.send_to_model(model, f"Промт {i}"), 3)
+        
+        self.assertEqual(model.calls, 3)
+    
+    def test_sequential_requests_not_cached(self):
+        """После завершения запроса следующий уходит в сеть заново"""
+        model = SlowModel("Slow", delay=0)
+        manager = NetworkManager()
+        
+        manager.send_to_model(model, "Промт")
+        manager.send_to_model(model, "Промт")
+        
+        self.assertEqual(model.calls, 2)
+
+
+    def test_listeners_get_each_network_request_once(self):
+        """Подписчики получают результат каждого запроса, ушедшего в сеть, один раз"""
+        model = SlowModel("Slow")
+        received = []
+        NetworkManager.add_request_listener(received.append)
+        self.addCleanup(NetworkManager.remove_request_listener, received.append)
+        
+        self._run_concurrently(lambda i: NetworkManager().send_to_model(model, "Промт"), 3)
+        
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0]['model_name'], "Slow")
+
+
+class TestSendToAllModels(unittest.TestCase):
+    """Тесты параллельной отправки в несколько моделей"""
+    
+    def test_results_reported_as_they_arrive(self):
+        """Каждый результат передается в on_result, не дожидаясь остальных"""
+        models = [SlowModel("Быстрая", api_id="fast", delay=0),
+                  SlowModel("Медленная", api_id="slow", delay=0.5)]
+        arrived = []
+        
+        def on_result(result):
+            arrived.append((result['model_name'], time.monotonic()))
+        
+        started = time.monotonic()
+        results = NetworkManager().send_to_all_models("Промт", models, on_result=on_result)
+        
+        self.assertEqual([name for name, _ in arrived], ["Быстрая", "Медленная"])
+        self.assertLess(arrived[0][1] - started, 0.4)
+        self.assertEqual(len(results), 2)
+
+
+class StreamingModel(SlowModel):
+    """Тестовая модель, отдающая ответ по частям"""
+    
+    def send_request(self, prompt: str, on_delta=None) -> Dict:
+        self.on_delta = on_delta
+        if on_delta:
+            for part in ("Отв", "ет"):
+                on_delta(part)
+        return {'success': True, 'response': "Ответ", 'error': None}
+
+
+class TestStreaming(unittest.TestCase):
+    """Тесты передачи фрагментов ответа"""
+    
+    def test_deltas_tagged_with_model_index(self):
+        """Фрагменты передаются вместе с индексом модели"""
+        models = [StreamingModel("A", api_id="a", delay=0), StreamingModel("B", api_id="b", delay=0)]
+        deltas = []
+        lock = threading.Lock()
+        
+        def on_delta(index, text):
+            with lock:
+                deltas.append((index, text))
+        
+        NetworkManager().send_to_all_models("Промт", models, on_delta=on_delta)
+        
+        self.assertEqual([t for i, t in deltas if i == 0], ["Отв", "ет"])
+        self.assertEqual([t for i, t in deltas if i == 1], ["Отв", "ет"])
+    
+    def test_no_callback_without_streaming(self):
+        """Без обработчика модель вызывается в обычном режиме"""
+        model = StreamingModel("A", delay=0)
+        NetworkManager().send_to_model(model, "Промт")
+        self.assertIsNone(model.on_delta)
+
+
+if __name__ == '__main__':
+    unittest.main()
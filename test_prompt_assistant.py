@@ -0,0 +1,276 @@
+"""Тесты для AI-ассистента улучшения промтов"""
+import threading
+import time
+import unittest
+from typing import Dict
+from models import Model
+from network import NetworkManager
+from prompt_assistant import PromptAssistant
+from prompt_cache import PromptCache
+
+
+class SlowAssistantModel(Model):
+    """Тестовая модель с задержкой, отвечающая в формате ассистента"""
+
+    def __init__(self, delay: float = 0.3):
+        super().__init__("Slow", "http://localhost/v1/chat/completions", "slow-assistant", "TEST_KEY")
+        self.delay = delay
+        self.threads = set()
+
+    def send_request(self, prompt: str) -> Dict:
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        if "вариант" in prompt:
+            response = "Вариант 1: первый\nВариант 2: второй"
+        else:
+            response = "Подробный текст задачи"
+        return {'success': True, 'response': response, 'error': None}
+
+
+class FailingModel(Model):
+    """Тестовая модель, возвращающая ошибку"""
+
+    def __init__(self):
+        super().__init__("Failing", "http://localhost/v1/chat/completions", "failing", "TEST_KEY")
+
+    def send_request(self, prompt: str) -> Dict:
+        return {'success': False, 'response': None, 'error': "Таймаут"}
+
+
+class TestImproveWithVariants(unittest.TestCase):
+    """Тесты комплексного улучшения промта"""
+
+    def test_parts_run_concurrently(self):
+        """Тест: улучшение, варианты и адаптация выполняются параллельно"""
+        model = SlowAssistantModel(delay=0.3)
+        assistant = PromptAssistant(NetworkManager(), PromptCache())
+        parts = []
+
+        started = time.monotonic()
+        result = assistant.improve_with_variants("Промт", model, True, "code",
+                                                 on_partial=lambda name, part: parts.append(name))
+        elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 0.6)
+        self.assertEqual(len(model.threads), 3)
+        self.assertEqual(sorted(parts), ['adapt', 'improve', 'variants'])
+        self.assertTrue(result['success'])
+        self.assertEqual(result['improved_prompt'], "Подробный текст задачи")
+        self.assertEqual(result['variants'], ["первый", "второй"])
+        self.assertEqual(result['adapted_prompt'], "Подробный текст задачи")
+
+    def test_only_requested_parts(self):
+        """Тест: без вариантов и адаптации выполняется только улучшение"""
+        assistant = PromptAssistant(NetworkManager(), PromptCache())
+        parts = []
+
+        result = assistant.improve_with_variants("Промт", SlowAssistantModel(delay=0), False, None,
+                                                 on_partial=lambda name, part: parts.append(name))
+
+        self.assertEqual(parts, ['improve'])
+        self.assertEqual(result['variants'], [])
+        self.assertIsNone(result['adapted_prompt'])
+
+    def test_improve_error_reported(self):
+        """Тест: ошибка улучшения возвращается как ошибка всего результата"""
+        assistant = PromptAssistant(NetworkManager(), PromptCache())
+
+        result = assistant.improve_with_variants("Промт", FailingModel())
+
+        self.assertFalse(result['success'])
+        self.assertEqual(result['error'], "Таймаут")
+
+
+class JsonModel(Model):
+    """Тестовая модель с JSON-режимом, запоминающая параметры запросов"""
+
+    supports_json_response = True
+
+    def __init__(self, response: str, reject_json: bool = False):
+        super().__init__("Json", "http://localhost/v1/chat/completions", "json-model", "TEST_KEY")
+        self.response = response
+        self.reject_json = reject_json
+        self.formats = []
+
+    def send_request(self, prompt: str, on_delta=None, response_format=None) -> Dict:
+        self.formats.append(response_format)
+        if response_format is not None and self.reject_json:
+            return {'success': False, 'response': None, 'error': "400 Bad Request",
+                    'metadata': {'status_code': 400}}
+        return {'success': True, 'response': self.response, 'error': None}
+
+
+class TestImproveCombined(unittest.TestCase):
+    """Тесты улучшения промта одним запросом"""
+
+    RESPONSE = ('{"improved": "Улучшенный", "variants": ["Первый", "Второй", "Третий"], '
+                '"adapted": "Для кода"}')
+
+    def _improve(self, model, **kwargs):
+        assistant = PromptAssistant(NetworkManager(), PromptCache())
+        return assistant.improve_combined("Промт", model, **kwargs)
+
+    def test_single_json_request(self):
+        """Тест: все части получаются одним запросом в JSON-режиме"""
+        model = JsonModel(self.RESPONSE)
+        parts = []
+
+        result = self._improve(model, adapt_for_type="code",
+                               on_partial=lambda name, part: parts.append(name))
+
+        self.assertEqual(model.formats, [{'type': 'json_object'}])
+        self.assertTrue(result['success'])
+        self.assertEqual(result['improved_prompt'], "Улучшенный")
+        self.assertEqual(result['variants'], ["Первый", "Второй", "Третий"])
+        self.assertEqual(result['adapted_prompt'], "Для кода")
+        self.assertEqual(parts, ['improve', 'variants', 'adapt'])
+
+    def test_json_in_code_block(self):
+        """Тест: JSON внутри блока кода тоже разбирается"""
+        result = self._improve(JsonModel("Вот ответ:\n```json\n" + self.RESPONSE + "\n```"))
+        self.assertEqual(result['improved_prompt'], "Улучшенный")
+        self.assertIsNone(result['adapted_prompt'])
+
+    def test_free_text_fallback(self):
+        """Тест: ответ не в JSON разбирается обычными парсерами"""
+        response = "Четкий промт\n\nВариант 1: первый\nВариант 2: второй"
+        result = self._improve(SlowAssistantModel(delay=0))
+        self.assertTrue(result['success'])
+
+        result = self._improve(JsonModel(response))
+        self.assertTrue(result['success'])
+        self.assertEqual(result['improved_prompt'], "Четкий промт")
+        self.assertEqual(result['variants'], ["первый", "второй"])
+
+    def test_json_mode_rejected(self):
+        """Тест: если модель отклоняет JSON-режим, запрос повторяется без него"""
+        model = JsonModel(self.RESPONSE, reject_json=True)
+        result = self._improve(model)
+        self.assertEqual(model.formats, [{'type': 'json_object'}, None])
+        self.assertTrue(result['success'])
+
+
+class ConcurrencyTrackingModel(Model):
+    """Тестовая модель, считающая одновременные запросы"""
+
+    def __init__(self, delay: float = 0.05):
+        super().__init__("Tracking", "http://localhost/v1/chat/completions", "tracking", "TEST_KEY")
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def send_request(self, prompt: str) -> Dict:
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return {'success': True, 'response': "Готово", 'error': None}
+
+
+class TestImproveBatch(unittest.TestCase):
+    """Тесты пакетного улучшения промтов"""
+
+    def test_bounded_concurrency(self):
+        """Тест: одновременно выполняется не больше заданного числа запросов"""
+        model = ConcurrencyTrackingModel()
+        assistant = PromptAssistant(NetworkManager(), PromptCache())
+        prompts = [{'id': i, 'prompt': f"Промт {i}"} for i in range(12)]
+        results = {}
+
+        processed = assistant.improve_batch(prompts, model, max_concurrency=3,
+                                            on_result=results.__setitem__)
+
+        self.assertEqual(processed, 12)
+        self.assertEqual(sorted(results), list(range(12)))
+        self.assertEqual(model.max_active, 3)
+        self.assertTrue(all(r['success'] for r in results.values()))
+
+    def test_stop_skips_remaining(self):
+        """Тест: после остановки новые запросы не отправляются"""
+        model = ConcurrencyTrackingModel()
+        assistant = PromptAssistant(NetworkManager(), PromptCache())
+        prompts = [{'id': i, 'prompt': f"Промт {i}"} for i in range(20)]
+        stop = threading.Event()
+        results = []
+
+        def on_result(prompt_id, result):
+            results.append(prompt_id)
+            stop.set()
+
+        processed = assistant.improve_batch(prompts, model, max_concurrency=2,
+                                            on_result=on_result, should_stop=stop.is_set)
+
+        self.assertEqual(processed, 2)
+        self.assertEqual(len(results), 2)
+
+
+class TestParsers(unittest.TestCase):
+    """Тесты разбора ответов модели"""
+
+    # Ответы длиной от 100 КБ, на которых разбор с возвратами (backtracking)
+    # работал бы квадратичное время
+    ADVERSARIAL = {
+        'newlines_between_variants': "Вариант 1: x" + "\n" * 200000 + "y",
+        'markers_without_numbers': "вариант " * 20000,
+        'spaces_after_markers': ("Вариант 1" + " " * 1000) * 150,
+        'unclosed_fence': "```prompt" + "\n" * 200000,
+        'unclosed_bold': "**" + "а" * 200000,
+        'bold_without_pair': "**а*" * 50000,
+        'labels_without_text': "Улучшенный :" * 20000,
+        'list_items_without_text': "1.\n" * 60000,
+        'blank_lines': "\n\n" * 100000,
+    }
+
+    def setUp(self):
+        self.assistant = PromptAssistant(NetworkManager(), PromptCache())
+
+    def test_improved_prompt_formats(self):
+        """Тест: улучшенный промт извлекается из разных форматов ответа"""
+        parse = self.assistant._parse_improved_prompt
+        self.assertEqual(parse("Улучшенный:\nОпиши задачу\n\nПояснение"), "Опиши задачу")
+        self.assertEqual(parse("Вот:\n```prompt\nОпиши задачу\n```"), "Опиши задачу")
+        self.assertEqual(parse("**Промпт:** Опиши задачу\n\nПояснение"), "Опиши задачу")
+        self.assertEqual(parse("  Опиши задачу  "), "Опиши задачу")
+        self.assertEqual(parse("Итог — улучшенный"), "Итог — улучшенный")
+
+    def test_variants_formats(self):
+        """Тест: варианты извлекаются из разных форматов ответа"""
+        parse = self.assistant._parse_variants
+        self.assertEqual(parse("Вариант 1: первый\n- второй строкой\nВариант 2:\nвторой\n", 3),
+                         ["первый\nвторой строкой", "второй"])
+        self.assertEqual(parse("1. Первый вариант промта\n2) Второй вариант промта\n3. коротко", 3),
+                         ["Первый вариант промта", "Второй вариант промта"])
+        self.assertEqual(parse("Первый абзац\n\nВторой абзац\n\nТретий\n\nЧетвертый", 3),
+                         ["Первый абзац", "Второй абзац", "Третий"])
+
+    def test_large_adversarial_inputs(self):
+        """Тест: разбор длинных ответов выполняется за линейное время"""
+        for name, response in self.ADVERSARIAL.items():
+            with self.subTest(name):
+                self.assertGreaterEqual(len(response), 100000)
+                started = time.monotonic()
+                self.assistant._parse_improved_prompt(response)
+                self.assistant._parse_variants(response, 3)
+                self.assistant._parse_combined_response(response, 3, True)
+                self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_random_inputs(self):
+        """Тест: разбор случайной смеси маркеров не падает и не зависает"""
+        random = __import__('random').Random(0)
+        atoms = ["Вариант 1:", "вариант", "\n", "\n\n", " ", "1. ", "- ", "**", "*",
+                 "```", "```prompt\n", "Улучшенный:", "{", "}", "текст", ":", "12"]
+        response = "".join(random.choice(atoms) for _ in range(40000))
+        self.assertGreaterEqual(len(response), 100000)
+
+        started = time.monotonic()
+        self.assertIsInstance(self.assistant._parse_improved_prompt(response), str)
+        self.assertLessEqual(len(self.assistant._parse_variants(response, 3)), 3)
+        self.assistant._parse_combined_response(response, 3, True)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""Тесты для кэша AI-ассистента"""
+import os
+import tempfile
+import threading
+import unittest
+from typing import Dict
+from db import Database
+from models import Model
+from prompt_assistant import PromptAssistant
+from prompt_cache import PromptCache
+
+
+class EchoModel(Model):
+    """Тестовая модель, которая не отправляет запросы"""
+
+    def __init__(self, api_id: str = "echo"):
+        super().__init__("Echo", "http://localhost/v1/chat/completions", api_id, "TEST_KEY")
+
+    def send_request(self, prompt: str) -> Dict:
+        raise AssertionError("Запрос не должен уходить в сеть")
+
+
+class CountingNetworkManager:
+    """Подмена NetworkManager, считающая отправленные запросы"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def send_to_model(self, model: Model, prompt: str) -> Dict:
+        self.calls += 1
+        if "вариант" in prompt:
+            response = "Вариант 1: первый\nВариант 2: второй\nВариант 3: третий"
+        else:
+            response = f"Ответ {self.calls}"
+        return {'model_name': model.name, 'success': True, 'response': response, 'error': None}
+
+
+class TestPromptCache(unittest.TestCase):
+    """Тесты для класса PromptCache"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db = Database(db_name=self.temp_db.name)
+
+    def tearDown(self):
+        self.db.close()
+        os.unlink(self.temp_db.name)
+
+    def test_key_uses_full_prompt_and_params(self):
+        """Тест: ключ учитывает весь текст промта, модель и параметры"""
+        prefix = "А" * 100
+        keys = {
+            PromptCache.make_key("improve", "m", prefix + "один"),
+            PromptCache.make_key("improve", "m", prefix + "два"),
+            PromptCache.make_key("improve", "other", prefix + "один"),
+            PromptCache.make_key("variants", "m", prefix + "один", {'count': 3}),
+            PromptCache.make_key("variants", "m", prefix + "один", {'count': 2}),
+        }
+        self.assertEqual(len(keys), 5)
+
+    def test_memory_lru_bounded(self):
+        """Тест: кэш в памяти ограничен и вытесняет давно не использованные записи"""
+        cache = PromptCache(max_entries=2)
+        cache.put("a", {'value': 1})
+        cache.put("b", {'value': 2})
+        cache.get("a")
+        cache.put("c", {'value': 3})
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), {'value': 1})
+
+    def test_persisted_between_instances(self):
+        """Тест: ответы сохраняются в БД и доступны после перезапуска"""
+        PromptCache(self.temp_db.name).put("key", {'success': True, 'improved_prompt': "Тест"},
+                                           "improve", "m")
+
+        restarted = PromptCache(self.temp_db.name)
+        self.assertEqual(restarted.get("key"), {'success': True, 'improved_prompt': "Тест"})
+        self.assertEqual(len(restarted), 1)
+
+    def test_usable_from_worker_threads(self):
+        """Тест: второй уровень кэша работает из рабочих потоков"""
+        cache = PromptCache(self.temp_db.name)
+        errors = []
+
+        def worker(index):
+            try:
+                cache.put(f"key{index}", {'value': index})
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(PromptCache(self.temp_db.name).get("key3"), {'value': 3})
+
+    def test_assistant_caches_all_operations(self):
+        """Тест: улучшение, варианты и адаптация кэшируются, ошибки — нет"""
+        network = CountingNetworkManager()
+        assistant = PromptAssistant(network, PromptCache.for_database(self.db))
+        model = EchoModel()
+
+        for _ in range(2):
+            improved = assistant.improve_prompt("Промт", model)
+            variants = assistant.generate_variants("Промт", model)
+            adapted = assistant.adapt_for_model_type("Промт", "code", model)
+
+        self.assertEqual(network.calls, 3)
+        self.assertEqual(improved['improved_prompt'], "Ответ 1")
+        self.assertEqual(variants['variants'], ["первый", "второй", "третий"])
+        self.assertTrue(adapted['success'])
+
+        assistant.adapt_for_model_type("Промт", "creative", model)
+        self.assertEqual(network.calls, 4)
+
+        # Новый ассистент с той же БД берет ответы из второго уровня кэша
+        fresh = PromptAssistant(network, PromptCache(self.temp_db.name))
+        self.assertEqual(fresh.improve_prompt("Промт", model)['improved_prompt'], "Ответ 1")
+        self.assertEqual(network.calls, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+"""Тесты для фоновой записи результатов"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+import db as db_module
+from db import Database
+from result_writer import ResultWriter
+
+
+def make_result(index: int) -> dict:
+    return {
+        'prompt_id': None,
+        'model_id': None,
+        'prompt_text': "Промт",
+        'model_name': "Модель",
+        'response_text': f"Ответ {index}",
+        'metadata': None
+    }
+
+
+class TestResultWriter(unittest.TestCase):
+    """Тесты для класса ResultWriter"""
+
+    def setUp(self):
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db = Database(db_name=self.temp_db.name)
+        self.writers = []
+
+    def tearDown(self):
+        for writer in self.writers:
+            writer.close()
+        self.db.close()
+        os.unlink(self.temp_db.name)
+
+    def make_writer(self, **kwargs) -> ResultWriter:
+        writer = ResultWriter(self.db, **kwargs)
+        self.writers.append(writer)
+        return writer
+
+    def test_writes_visible_after_flush(self):
+        """Тест: после flush() записанные результаты видны другому соединению"""
+        writer = self.make_writer()
+        writer.save_results([make_result(1), make_result(2)])
+        writer.record_usage([{'model_name': "Модель", 'success': True, 'metadata': {}}])
+        writer.flush()
+
+        self.assertEqual(len(self.db.get_results()), 2)
+        self.assertEqual(self.db.get_usage_stats()[0]['requests'], 1)
+
+    def test_writes_coalesced_into_batches(self):
+        """Тест: операции, поставленные подряд, записываются одной транзакцией"""
+        writer = self.make_writer(batch_delay=0.5)
+        for index in range(20):
+            writer.save_results([make_result(index)])
+        writer.flush()
+
+        self.assertEqual(len(self.db.get_results()), 20)
+        self.assertLess(writer.transactions, 20)
+
+    def test_runs_in_own_thread(self):
+        """Тест: запись выполняется не в потоке, поставившем операцию"""
+        writer = self.make_writer()
+        threads = []
+        writer.submit(lambda db: threads.append(threading.current_thread()))
+        writer.flush()
+
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_failed_job_does_not_lose_others(self):
+        """Тест: ошибка одной операции не отменяет остальные операции пакета"""
+        errors = []
+        writer = self.make_writer(batch_delay=0.5, on_error=errors.append)
+        writer.save_results([make_result(1)])
+        writer.save_results([{'model_name': "Без текста ответа"}])
+        writer.save_results([make_result(2)])
+        writer.flush()
+
+        self.assertEqual(len(self.db.get_results()), 2)
+        self.assertEqual(len(errors), 1)
+
+    def test_retries_while_database_locked(self):
+        """Тест: запись, заблокированная другим соединением, выполняется после снятия блокировки"""
+        errors = []
+        with mock.patch.object(db_module, 'CONNECTION_TIMEOUT', 0.05):
+            writer = self.make_writer(on_error=errors.append, retry_delay=0.05)
+            writer.submit(lambda db: None)
+            writer.flush()  # Соединение потока записи открыто с коротким таймаутом
+
+        locker = sqlite3.connect(self.temp_db.name, check_same_thread=False)
+        locker.execute("BEGIN EXCLUSIVE")
+        release = threading.Timer(0.4, locker.rollback)
+        release.start()
+        try:
+            writer.save_results([make_result(1)])
+            writer.submit(lambda db: db.set_setting("after_lock", "1"), batched=False)
+            writer.flush()
+        finally:
+            release.join()
+            locker.close()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.db.get_results()), 1)
+        self.assertEqual(self.db.get_setting("after_lock"), "1")
+
+    def test_permanent_error_not_retried(self):
+        """Тест: постоянная ошибка сообщается сразу, без повторов"""
+        errors = []
+        calls = []
+
+        def failing_job(db):
+            calls.append(1)
+            raise sqlite3.OperationalError("no such table: missing")
+
+        writer = self.make_writer(on_error=errors.append, retry_delay=0.05)
+        writer.submit(failing_job)
+        writer.flush()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(errors), 1)
+
+    def test_paused_holds_writes(self):
+        """Тест: во время paused() запись не выполняется и flush() не ждет"""
+        writer = self.make_writer(batch_delay=0.01)
+        with writer.paused():
+            writer.save_results([make_result(1)])
+            writer.flush()
+            time.sleep(0.1)
+            self.assertEqual(self.db.get_results(), [])
+        writer.flush()
+
+        self.assertEqual(len(self.db.get_results()), 1)
+
+    def test_close_flushes_queue(self):
+        """Тест: close() дописывает очередь и запрещает новые операции"""
+        writer = self.make_writer(batch_delay=1)
+        writer.save_results([make_result(1)])
+        writer.close()
+
+        self.assertEqual(len(self.db.get_results()), 1)
+        with self.assertRaises(RuntimeError):
+            writer.save_results([make_result(2)])
+
+    def test_unbatched_job_runs_outside_batch(self):
+        """Тест: операция с batched=False выполняется вне пакетной транзакции"""
+        writer = self.make_writer(batch_delay=0.5)
+        depths = []
+        writer.save_results([make_result(1)])
+        writer.submit(lambda db: depths.append(db._batch_depth), batched=False)
+        writer.save_results([make_result(2)])
+        writer.flush()
+        
+        self.assertEqual(depths, [0])
+        self.assertEqual(len(self.db.get_results()), 2)
+    
+    def test_durability_applied_to_writer_connection(self):
+        """Тест: уровень надежности задает PRAGMA synchronous соединения записи"""
+        writer = self.make_writer(durability='full')
+        levels = []
+        writer.submit(lambda db: levels.append(db.conn.execute("PRAGMA synchronous").fetchone()[0]))
+        writer.flush()
+        writer.set_durability('fast')
+        writer.submit(lambda db: levels.append(db.conn.execute("PRAGMA synchronous").fetchone()[0]))
+        writer.flush()
+
+        self.assertEqual(levels, [2, 0])
+        with self.assertRaises(ValueError):
+            writer.set_durability('unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
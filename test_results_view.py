@@ -0,0 +1,169 @@
+"""Тесты для модели и делегата таблицы результатов"""
+import os
+import unittest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import Qt, QRect
+from PyQt5.QtGui import QColor, QFont, QFontMetrics, QImage, QPainter
+from PyQt5.QtWidgets import QApplication, QTableView
+from results_view import (
+    COLUMN_CHECK, COLUMN_RESPONSE, MAX_ROW_HEIGHT, MIN_ROW_HEIGHT,
+    ResponseDelegate, ResultsTableModel, RowHeightFitter
+)
+
+
+def make_results(count: int):
+    return [
+        {'model_name': f"Модель {i}", 'success': i % 2 == 0,
+         'response': f"Ответ {i}", 'error': "Таймаут"}
+        for i in range(count)
+    ]
+
+
+class TestResultsTableModel(unittest.TestCase):
+    """Тесты для класса ResultsTableModel"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def test_results_displayed(self):
+        """Тест отображения ответов и ошибок"""
+        model = ResultsTableModel()
+        model.set_results(make_results(2))
+
+        self.assertEqual(model.rowCount(), 2)
+        self.assertEqual(model.data(model.index(0, COLUMN_RESPONSE)), "Ответ 0")
+        self.assertEqual(model.data(model.index(1, COLUMN_RESPONSE)), "❌ Таймаут")
+        self.assertEqual(model.data(model.index(0, COLUMN_CHECK), Qt.CheckStateRole), Qt.Unchecked)
+
+    def test_check_state_kept_in_model(self):
+        """Тест отметки строк и подсчета отмеченных"""
+        model = ResultsTableModel()
+        model.set_results(make_results(5))
+        counts = []
+        model.checked_changed.connect(counts.append)
+
+        self.assertTrue(model.setData(model.index(3, COLUMN_CHECK), Qt.Checked, Qt.CheckStateRole))
+        self.assertTrue(model.setData(model.index(1, COLUMN_CHECK), Qt.Checked, Qt.CheckStateRole))
+        model.setData(model.index(3, COLUMN_CHECK), Qt.Unchecked, Qt.CheckStateRole)
+
+        self.assertEqual(model.checked_rows(), [1])
+        self.assertEqual(counts, [1, 2, 1])
+
+        model.set_all_checked(True)
+        self.assertEqual(model.checked_count, 5)
+        model.set_results(make_results(2))
+        self.assertEqual(model.checked_count, 0)
+
+    def test_streaming_rows_not_checkable(self):
+        """Тест: строки потокового вывода обновляются, но не отмечаются"""
+        model = ResultsTableModel()
+        model.start_streaming(["A", "B"])
+        changed = []
+        model.dataChanged.connect(lambda top, bottom, roles: changed.append(top.row()))
+
+        model.set_response_text(1, "Частичный ответ")
+
+        self.assertEqual(changed, [1])
+        self.assertEqual(model.data(model.index(1, COLUMN_RESPONSE)), "Частичный ответ")
+        self.assertFalse(model.flags(model.index(0, COLUMN_CHECK)) & Qt.ItemIsUserCheckable)
+        self.assertFalse(model.setData(model.index(0, COLUMN_CHECK), Qt.Checked, Qt.CheckStateRole))
+
+
+class TestResponseDelegate(unittest.TestCase):
+    """Тесты для класса ResponseDelegate"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def test_visible_prefix_bounded(self):
+        """Тест: для отрисовки берется только начало длинного ответа"""
+        metrics = QFontMetrics(QFont())
+        rect = QRect(0, 0, 400, 100)
+        text = ("Строка ответа " * 20 + "\n") * 5000
+
+        prefix = ResponseDelegate.visible_prefix(text, metrics, rect)
+
+        self.assertTrue(text.startswith(prefix))
+        max_lines = rect.height() // metrics.lineSpacing() + 1
+        self.assertLessEqual(prefix.count("\n"), max_lines)
+        self.assertLess(len(prefix), 10000)
+
+    def test_short_text_not_cut(self):
+        """Тест: короткий ответ передается целиком"""
+        metrics = QFontMetrics(QFont())
+        self.assertEqual(ResponseDelegate.visible_prefix("Ответ", metrics, QRect(0, 0, 400, 100)),
+                         "Ответ")
+
+    def test_draw_long_text(self):
+        """Тест отрисовки длинного ответа в ячейку"""
+        image = QImage(400, 100, QImage.Format_ARGB32)
+        image.fill(Qt.white)
+        painter = QPainter(image)
+        try:
+            ResponseDelegate().draw_text(painter, "Ответ модели " * 50000, QFont(),
+                                         QRect(0, 0, 400, 100))
+        finally:
+            painter.end()
+        white = QColor(Qt.white).rgba()
+        painted = any(image.pixel(x, y) != white for x in range(0, 400, 2) for y in range(0, 20))
+        self.assertTrue(painted)
+
+
+    def test_row_height_clamped_and_cached(self):
+        """Тест: высота строки ограничена пределами и запоминается"""
+        delegate = ResponseDelegate()
+        font = QFont()
+        long_text = "Ответ модели\n" * 1000
+
+        self.assertEqual(delegate.row_height("Коротко", font, 400), MIN_ROW_HEIGHT)
+        self.assertEqual(delegate.row_height(long_text, font, 400), MAX_ROW_HEIGHT)
+        medium = delegate.row_height("Строка\n" * 8, font, 400)
+        self.assertTrue(MIN_ROW_HEIGHT < medium < MAX_ROW_HEIGHT)
+
+        self.assertEqual(len(delegate._heights), 3)
+        delegate.row_height(long_text, font, 400)
+        self.assertEqual(len(delegate._heights), 3)
+        delegate.row_height(long_text, font, 200)
+        self.assertEqual(len(delegate._heights), 4)
+
+
+class TestRowHeightFitter(unittest.TestCase):
+    """Тесты для класса RowHeightFitter"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def test_only_visible_rows_measured(self):
+        """Тест: подгоняется высота только видимых строк"""
+        model = ResultsTableModel()
+        view = QTableView()
+        view.setModel(model)
+        view.verticalHeader().setDefaultSectionSize(MIN_ROW_HEIGHT)
+        delegate = ResponseDelegate(view)
+        view.setItemDelegateForColumn(COLUMN_RESPONSE, delegate)
+        fitter = RowHeightFitter(view, COLUMN_RESPONSE, delegate)
+        view.resize(600, 500)
+        view.show()
+
+        model.set_results([
+            {'model_name': "M", 'success': True, 'response': f"Ответ {i}\n" * 50}
+            for i in range(1000)
+        ])
+        fitter.fit_visible_rows()
+
+        self.assertEqual(view.rowHeight(0), MAX_ROW_HEIGHT)
+        self.assertEqual(view.rowHeight(999), MIN_ROW_HEIGHT)
+        self.assertLess(len(delegate._heights), 10)
+
+        view.setColumnWidth(COLUMN_RESPONSE, 200)
+        self.assertEqual(len(delegate._heights), 0)
+        view.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
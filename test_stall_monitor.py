@@ -0,0 +1,65 @@
+"""Тесты для мониторинга зависаний цикла событий"""
+import os
+import time
+import unittest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication
+from stall_monitor import StallMonitor, stall_monitor_enabled, STALL_MONITOR_ENV_VAR
+
+
+def blocking_handler():
+    """Обработчик, блокирующий главный поток"""
+    time.sleep(0.2)
+
+
+class TestStallMonitor(unittest.TestCase):
+    """Тесты для класса StallMonitor"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def _run_loop(self, monitor: StallMonitor, handler, duration_ms: int = 400):
+        monitor.start()
+        QTimer.singleShot(50, handler)
+        QTimer.singleShot(duration_ms, self.app.quit)
+        self.app.exec_()
+        monitor.stop()
+
+    def test_stall_attributed_to_slot(self):
+        """Тест обнаружения зависания и определения вызвавшего его слота"""
+        monitor = StallMonitor(threshold_ms=50)
+        self._run_loop(monitor, blocking_handler)
+
+        self.assertEqual(len(monitor.stalls), 1)
+        stall = monitor.stalls[0]
+        self.assertGreaterEqual(stall['duration_ms'], 150)
+        self.assertEqual(stall['slot'], "test_stall_monitor.py:blocking_handler")
+
+        summary = monitor.summary()
+        self.assertEqual(summary[0]['slot'], stall['slot'])
+        self.assertEqual(summary[0]['count'], 1)
+
+    def test_short_handlers_not_reported(self):
+        """Тест: обработчики короче порога не считаются зависаниями"""
+        monitor = StallMonitor(threshold_ms=100)
+        self._run_loop(monitor, lambda: time.sleep(0.01))
+        self.assertEqual(monitor.stalls, [])
+
+    def test_enabled_flag(self):
+        """Тест включения мониторинга флагом и переменной окружения"""
+        self.assertTrue(stall_monitor_enabled(['main.py', '--monitor-stalls']))
+        os.environ.pop(STALL_MONITOR_ENV_VAR, None)
+        self.assertFalse(stall_monitor_enabled(['main.py']))
+        os.environ[STALL_MONITOR_ENV_VAR] = "1"
+        try:
+            self.assertTrue(stall_monitor_enabled(['main.py']))
+        finally:
+            del os.environ[STALL_MONITOR_ENV_VAR]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+"""Тесты для профилирования запуска"""
+import io
+import sys
+import unittest
+from startup_profile import StartupProfiler
+
+
+class TestStartupProfiler(unittest.TestCase):
+    """Тесты для класса StartupProfiler"""
+
+    def test_records_imports_and_marks(self):
+        """Тест записи первых импортов и этапов инициализации"""
+        sys.modules.pop('colorsys', None)
+        profiler = StartupProfiler()
+        profiler.install()
+        try:
+            import colorsys  # noqa: F401
+            import sys as already_loaded  # noqa: F401
+        finally:
+            profiler.uninstall()
+        profiler.mark("Готово")
+
+        names = [name for _, _, _, name in profiler.imports]
+        self.assertIn('colorsys', names)
+        self.assertNotIn('sys', names)
+        self.assertEqual(profiler.marks[-1][1], "Готово")
+
+        output = io.StringIO()
+        profiler.report(output)
+        self.assertIn("== Готово", output.getvalue())
+
+    def test_uninstall_restores_import(self):
+        """Тест восстановления стандартного импорта"""
+        import builtins
+        original = builtins.__import__
+        profiler = StartupProfiler()
+        profiler.install()
+        profiler.uninstall()
+        self.assertIs(builtins.__import__, original)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+"""Модуль замеров времени сетевых запросов к API моделей"""
+import threading
+import time
+from typing import Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Замер, выполняющийся в текущем потоке (его заполняют соединения urllib3)
+_local = threading.local()
+
+
+class TimingProbe:
+    """
+    Замер одного запроса: установка соединения, TLS, первый байт,
+    первый токен (при потоковой передаче), общее время и объем данных
+
+    Используется как контекстный менеджер: пока замер активен, новые
+    соединения, открытые в этом потоке, записывают в него свое время.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.connect_time: Optional[float] = None  # DNS + TCP
+        self.tls_time: Optional[float] = None
+        self.ttfb: Optional[float] = None
+        self.ttft: Optional[float] = None
+        self.total_time: Optional[float] = None
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def __enter__(self):
+        _local.probe = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.probe = None
+        return False
+
+    def elapsed(self) -> float:
+        """Время с начала замера в секундах"""
+        return time.perf_counter() - self.started
+
+    def mark_first_byte(self):
+        """Отметить получение заголовков ответа"""
+        if self.ttfb is None:
+            self.ttfb = self.elapsed()
+
+    def mark_first_token(self):
+        """Отметить получение первого фрагмента текста в потоковом ответе"""
+        if self.ttft is None:
+            self.ttft = self.elapsed()
+
+    def finish(self):
+        """Зафиксировать общее время запроса"""
+        if self.total_time is None:
+            self.total_time = self.elapsed()
+
+    def to_dict(self) -> Dict:
+        """Преобразовать замер в словарь (время в секундах)"""
+        def rounded(value):
+            return round(value, 4) if value is not None else None
+
+        return {
+            'connect_time': rounded(self.connect_time),
+            'tls_time': rounded(self.tls_time),
+            'ttfb': rounded(self.ttfb),
+            'ttft': rounded(self.ttft),
+            'total_time': rounded(self.total_time),
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            # Если соединение не открывалось, использовано соединение из пула
+            'reused_connection': self.connect_time is None
+        }
+
+
+def _current_probe() -> Optional[TimingProbe]:
+    return getattr(_local, 'probe', None)
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    """HTTP-соединение, записывающее время подключения в текущий замер"""
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        sock = super()._new_conn()
+        probe = _current_probe()
+        if probe is not None:
+            probe.connect_time = time.perf_counter() - started
+        return sock
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    """HTTPS-соединение, записывающее время подключения и TLS в текущий замер"""
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        sock = super()._new_conn()
+        probe = _current_probe()
+        if probe is not None:
+            probe.connect_time = time.perf_counter() - started
+        return sock
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        probe = _current_probe()
+        if probe is not None and probe.connect_time is not None:
+            probe.tls_time = max(0.0, time.perf_counter() - started - probe.connect_time)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """Адаптер requests, чьи соединения сообщают время установки в TimingProbe"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool
+        }
+
+
+def create_session() -> requests.Session:
+    """Создать сессию с пулом соединений и замером времени подключения"""
+    session = requests.Session()
+    adapter = TimedHTTPAdapter()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session